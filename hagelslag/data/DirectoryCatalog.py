@@ -0,0 +1,74 @@
+import os
+from os.path import join, split, getmtime
+from fnmatch import fnmatch
+
+
+class DirectoryCatalog(object):
+    """
+    In-memory catalog of the files in model run directories. Each directory is listed again only when its
+    modification time changes, and file name patterns are matched against the cached listing instead of the file
+    system. One catalog can be shared by every variable and member loaded from the same run, and by every task run
+    in the same process.
+
+    Attributes:
+        listings (dict): Maps each directory to its modification time when it was listed and the list of file names
+            in it
+        matches (dict): Maps each file name pattern to the modification time of its directory when it was matched
+            and the list of matching paths
+    """
+    def __init__(self):
+        self.listings = {}
+        self.matches = {}
+
+    def list_directory(self, directory):
+        """
+        List the files in a directory, reusing the cached listing if the directory has not changed since it was
+        listed. Missing directories are treated as empty.
+
+        Args:
+            directory (str): Path to the directory
+
+        Returns:
+            list of file names in the directory
+        """
+        try:
+            directory_mtime = getmtime(directory)
+        except OSError:
+            directory_mtime = None
+        if directory not in self.listings.keys() or self.listings[directory][0] != directory_mtime:
+            try:
+                self.listings[directory] = (directory_mtime, os.listdir(directory))
+            except OSError:
+                self.listings[directory] = (directory_mtime, [])
+        return self.listings[directory][1]
+
+    def glob(self, pattern):
+        """
+        Find the files matching a pattern with wildcards in the file name only. Results match glob.glob for the
+        same pattern.
+
+        Args:
+            pattern (str): Path with shell-style wildcards in the file name
+
+        Returns:
+            list of matching paths
+        """
+        directory, file_pattern = split(pattern)
+        file_names = self.list_directory(directory)
+        directory_mtime = self.listings[directory][0]
+        if pattern not in self.matches.keys() or self.matches[pattern][0] != directory_mtime:
+            self.matches[pattern] = (directory_mtime,
+                                     [join(directory, file_name) for file_name in file_names
+                                      if fnmatch(file_name, file_pattern) and
+                                      (file_pattern.startswith(".") or not file_name.startswith("."))])
+        return self.matches[pattern][1]
+
+    def clear(self):
+        """
+        Remove all cached listings so that directories are listed again on the next lookup.
+        """
+        self.listings.clear()
+        self.matches.clear()
+
+
+run_catalog = DirectoryCatalog()
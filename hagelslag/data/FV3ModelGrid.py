@@ -44,3 +44,16 @@ class FV3ModelGrid(GribModelGrid):
         else:
             return GribModelGrid.load_data(self)
 
+    def load_variables(self, variables):
+        loaded = GribModelGrid.load_variables(self, [v for v in variables if v not in self.netcdf_variables])
+        netcdf_variables = [v for v in variables if v in self.netcdf_variables]
+        if len(netcdf_variables) > 0:
+            loaded.update(ModelGrid.load_variables(self, netcdf_variables))
+        return loaded
+
+    def load_windows(self, variables, windows):
+        loaded = GribModelGrid.load_windows(self, [v for v in variables if v not in self.netcdf_variables], windows)
+        netcdf_variables = [v for v in variables if v in self.netcdf_variables]
+        if len(netcdf_variables) > 0:
+            loaded.update(ModelGrid.load_windows(self, netcdf_variables, windows))
+        return loaded
@@ -2,9 +2,97 @@
 import pandas as pd
 import pygrib
 import numpy as np
-from os.path import exists
+import os
+from os.path import exists, join, getmtime, getsize, dirname
 import datetime
+import json
 from netCDF4 import Dataset
+from hagelslag.util.cache import cache_path
+
+
+grib_index_columns = ["name", "shortName", "level", "typeOfLevel", "stepRange", "parameterNumber", "offset",
+                      "length"]
+
+
+def build_grib_index(g_file):
+    """
+    Scan a grib2 file for the location and description of each message. Only the message headers are decoded.
+
+    Args:
+        g_file (str): Name of the grib file
+
+    Returns:
+        list of [name, shortName, level, typeOfLevel, stepRange, parameterNumber, offset, length] for each message,
+        with all values except the offset and length stored as strings.
+    """
+    messages = []
+    with open(g_file, "rb") as grib_obj:
+        offset = 0
+        header = grib_obj.read(16)
+        while len(header) == 16:
+            if header[:4] != b"GRIB":
+                next_start = header.find(b"GRIB", 1)
+                offset += next_start if next_start > 0 else 13
+                grib_obj.seek(offset)
+                header = grib_obj.read(16)
+                continue
+            if header[7] == 1:
+                length = int.from_bytes(header[4:7], "big")
+            else:
+                length = int.from_bytes(header[8:16], "big")
+            grib_obj.seek(offset)
+            message = pygrib.fromstring(grib_obj.read(length))
+            parameter_number = str(message["parameterNumber"]) if message.has_key("parameterNumber") else ""
+            messages.append([message.name, message.shortName, str(message.level), message.typeOfLevel,
+                             str(message.stepRange), parameter_number, offset, length])
+            offset += length
+            grib_obj.seek(offset)
+            header = grib_obj.read(16)
+    return messages
+
+
+def load_grib_index(g_file, index_path=None):
+    """
+    Load the message index of a grib2 file from its sidecar index file, or build the index and save it if the
+    sidecar is missing or the grib file has changed since the index was built. Indices are saved with a .hsidx
+    extension in index_path, so the directories of the grib files are not written to. If the index cannot be saved,
+    it is still returned.
+
+    Args:
+        g_file (str): Name of the grib file
+        index_path (str): Directory where index files are stored. If None, they are stored in the
+            hagelslag/grib_indices directory of the user cache directory given by XDG_CACHE_HOME, or ~/.cache.
+
+    Returns:
+        Array of message information with one row per message and the columns in grib_index_columns.
+    """
+    if index_path is None:
+        index_path = cache_path("grib_indices")
+    index_file = join(index_path, os.path.abspath(g_file).strip(os.sep).replace(os.sep, "_") + ".hsidx")
+    mtime = getmtime(g_file)
+    size = getsize(g_file)
+    messages = None
+    if exists(index_file):
+        try:
+            with open(index_file) as index_obj:
+                index = json.load(index_obj)
+            if index["mtime"] == mtime and index["size"] == size and index["columns"] == grib_index_columns:
+                messages = index["messages"]
+        except (IOError, OSError, ValueError, KeyError):
+            messages = None
+    if messages is None:
+        messages = build_grib_index(g_file)
+        temp_file = index_file + ".{0:d}".format(os.getpid())
+        try:
+            os.makedirs(dirname(index_file), exist_ok=True)
+            with open(temp_file, "w") as index_obj:
+                json.dump({"mtime": mtime, "size": size, "columns": grib_index_columns, "messages": messages},
+                          index_obj)
+            os.replace(temp_file, index_file)
+        except (IOError, OSError):
+            print("Could not save grib index {0}".format(index_file))
+    return np.array([[str(v) for v in message] for message in messages], dtype=object).reshape(-1,
+                                                                                               len(grib_index_columns))
 
 
 class GribModelGrid(object):
@@ -13,14 +101,20 @@ class GribModelGrid(object):
     Given a list of file names, loads the values of a single variable from a model run. Supports model output in
     grib2 format
     Attributes:
-            filenames (list of str): List of grib2 files containing model output
+            filenames (list of str): List of grib2 files containing model output, one per time step. Missing time
+                steps may be None.
             run_date (ISO date string or datetime.datetime object): Date of the initialization time of the model run.
             start_date (ISO date string or datetime.datetime object): Date of the first timestep extracted.
             end_date (ISO date string or datetime.datetime object): Date of the last timestep extracted.
             variable (str): Grib2 variable
             member (str): Individual ensemble member.
             frequency (str): Spacing between model time steps.
+            index_path (str): Directory where grib message index files are stored. If None, they are stored in the
+                user cache directory.
+            dtype: Data type of the loaded arrays.
     """
+    index_path = None
+    dtype = np.float32
 
     def __init__(self,
                  filenames,
@@ -50,11 +144,14 @@ class GribModelGrid(object):
 
     def __enter__(self):
         """
-        Open each file for reading.
+        Find the file for each time step. Time steps without a file are kept as None so that file_objects stays
+        aligned with valid_dates.
         """
         for filename in self.filenames:
-            if exists(filename):
+            if filename is not None and exists(filename):
                 self.file_objects.append(filename)
+            else:
+                self.file_objects.append(None)
 
     def format_grib_name(self, selected_variable):
         """
@@ -87,13 +184,18 @@ class GribModelGrid(object):
                 Id = key
         return Id, None
 
-    def load_lightning_data(self):
+    def load_lightning_data(self, variable=None):
         """
             Loads data from netCDF4 file objects.
 
+            Args:
+                variable (str): Lightning variable being loaded. Defaults to the variable of the object.
+
             Returns:
                 Array of data loaded from files in (time, y, x) dimensions, Units
         """
+        if variable is None:
+            variable = self.variable
         data = None
         path = '/ai-hail/aburke/classes/METR5243/lightning_data/'
         run_date = self.run_date.astype(datetime.datetime)
@@ -101,15 +203,16 @@ class GribModelGrid(object):
         for f, f_hour in enumerate(self.forecast_hours):
             if f_hour < 24:
                 file_path = path + '{0}/{0}T{1:02}_counts_{2}.nc'.format(run_date.strftime('%Y%m%d'),
-                                                                         f_hour, self.variable)
+                                                                         f_hour, variable)
             else:
                 file_path = path + '{0}/{0}T{1:02}_counts_{2}.nc'.format(next_day.strftime('%Y%m%d'),
-                                                                         (f_hour - 24), self.variable)
+                                                                         (f_hour - 24), variable)
             if not exists(file_path):
                 return None, None
             data_values = Dataset(file_path).variables['counts'][:]
             if data is None:
-                data = np.empty((len(self.valid_dates), data_values.shape[0], data_values.shape[1]), dtype=float)
+                data = np.empty((len(self.valid_dates), data_values.shape[0], data_values.shape[1]),
+                                dtype=self.dtype)
             data[f] = data_values
         return data, 'counts'
     
@@ -121,107 +224,191 @@ class GribModelGrid(object):
             Returns:
                     Array of data loaded from files in (time, y, x) dimensions, Units
         """
-        u_v_variables = ['U component of wind','V component of wind',
-            '10 metre U wind component','10 metre V wind component',
-            'u','v','10u','10v']
-
         if self.variable in ['nldn', 'entln']:
             data, units = self.load_lightning_data()
             return data, units
+        self.data, units = self.load_variables([self.variable])[self.variable]
+        return self.data, units
 
-        if not self.file_objects:
+    def load_variables(self, variables):
+        """
+            Loads several variables from the same grib2 files. Each file is opened and its message keys are scanned
+            once, and every requested variable is decoded from a file before moving on to the next one. Time steps
+            without a file are filled with zeros.
+
+            Args:
+                variables (list): grib2 variable names (str) or message numbers (int) being loaded
+            Returns:
+                dict mapping each variable to a tuple of its array in (time, y, x) dimensions and its units.
+        """
+        loaded = {}
+        grib_variables = []
+        for variable in variables:
+            if variable in ['nldn', 'entln']:
+                loaded[variable] = self.load_lightning_data(variable)
+            else:
+                grib_variables.append(variable)
+        if len(grib_variables) == 0:
+            return loaded
+        if all([g_file is None for g_file in self.file_objects]):
             print("No {0} model runs on {1}".format(self.member, self.run_date))
-            units = None
-            return self.data, units
+            for variable in grib_variables:
+                loaded[variable] = (None, None)
+            return loaded
+        data = dict([(variable, None) for variable in grib_variables])
         for f, g_file in enumerate(self.file_objects):
-            grib = pygrib.open(g_file)
-            
-            if type(self.variable) is int:
-                data_values = grib[self.variable].values
-                print(grib[self.variable])
-                if grib[self.variable].units == 'unknown':
-                    Id = grib[self.variable].parameterNumber
-            elif type(self.variable) is str:
-                if '_' in self.variable:
-                    #Multiple levels
-                    variable = self.variable.split('_')[0]
-                    level = self.variable.split('_')[1]
-                else:
-                    #Only single level 
-                    variable=self.variable
-                    level=None
-                message_keys = np.array([[message.name,message.shortName,
-                    message.level,message.typeOfLevel] for message in grib])
-                
-                ##################################
-                # U/V wind string variables
-                ##################################
-                
-                if variable in u_v_variables:
-                    u_v_ind = np.where(
-                        (message_keys[:,0] == variable) | (message_keys[:,1] == variable) &
-                        (message_keys[:,2] == level) | (message_keys[:,3] == level))[0]
-                    #Grib messages begin at one
-                    grib_u_v_ind = int(u_v_ind[0]+1)
-                    u_v_grib_data = grib[grib_u_v_ind].values
-                
-                ##################################
-                # Unknown string variables
-                ##################################
-
-                elif variable in self.unknown_names.values(): 
-                    Id, units = self.format_grib_name(variable)
-                    if level is None: grib_data = pygrib.index(g_file,'parameterNumber')(parameterNumber=Id)
-                    elif level in message_keys[:,2]: grib_data = pygrib.index(g_file,
-                        'parameterNumber','level')(parameterNumber=Id,level=level)
-                    elif level in message_keys[:,3]: grib_data = pygrib.index(g_file,
-                        'parameterNumber','typeofLevel')(parameterNumber=Id,typeOfLevel=level)
-                    else: 
-                        print('No {0} {1} grib message found for {2} {3}'.format(
-                        self.run_date,self.member,variable,level))
-                        continue
-                
-                ##################################
-                # Known string variables
-                ##################################
-
-                elif variable in message_keys[:,0]:
-                    if level is None: grib_data = pygrib.index(g_file,'name')(name=variable)
-                    elif level in message_keys[:,2]: grib_data = pygrib.index(g_file,
-                        'name','level')(name=variable,level=level)
-                    elif level in message_keys[:,3]: grib_data = pygrib.index(g_file,
-                        'name','typeOfLevel')(name=variable, typeOfLevel=level)
-                    else: 
-                        print('No {0} {1} grib message found for {2} {3}'.format(
-                        self.run_date,self.member,variable,level))
+            if g_file is None:
+                continue
+            grib_index = load_grib_index(g_file, self.index_path)
+            with open(g_file, "rb") as grib_obj:
+                for variable in grib_variables:
+                    data_values = self.read_grib_values(grib_obj, grib_index, variable)
+                    if data_values is None:
                         continue
-                    
-                elif variable in message_keys[:,1]:
-                    if level is None: grib_data = pygrib.index(g_file,'shortName')(shortName=variable)
-                    elif level in message_keys[:,2]: grib_data = pygrib.index(g_file,
-                        'shortName','level')(shortName=variable,level=level)
-                    elif level in message_keys[:,3]: grib_data = pygrib.index(g_file,
-                        'shortName','typeOfLevel')(shortName=variable,typeOfLevel=level)
-                    else: 
-                        print('No {0} {1} grib message found for {2} {3}'.format(
-                        self.run_date,self.member,variable,level))
+                    if data[variable] is None:
+                        data[variable] = np.zeros((
+                            len(self.valid_dates), data_values.shape[0], data_values.shape[1]),
+                            dtype=self.dtype)
+                    data[variable][f] = data_values[:]
+        for variable in grib_variables:
+            loaded[variable] = (data[variable], None)
+        return loaded
+
+    def load_windows(self, variables, windows):
+        """
+            Loads several variables only within rectangular windows of the grid. Only the files for time steps with
+            windows are opened, and only the messages for the requested variables are decoded. Time steps without a
+            file are skipped.
+
+            Args:
+                variables (list): grib2 variable names (str) or message numbers (int) being loaded
+                windows (dict): Maps each time index to a list of (row start, row end, column start, column end)
+                    tuples.
+            Returns:
+                dict mapping each variable to a tuple of a dict of {time index: [(row start, column start, array)]}
+                and its units.
+        """
+        loaded = dict([(variable, ({}, None)) for variable in variables])
+        for variable in variables:
+            if variable in ['nldn', 'entln']:
+                data, units = self.load_lightning_data(variable)
+                for t in windows.keys():
+                    loaded[variable][0][t] = [(i_start, j_start, data[t, i_start:i_end, j_start:j_end])
+                                              for i_start, i_end, j_start, j_end in windows[t]]
+                loaded[variable] = (loaded[variable][0], units)
+        grib_variables = [variable for variable in variables if variable not in ['nldn', 'entln']]
+        if len(grib_variables) > 0 and all([g_file is None for g_file in self.file_objects]):
+            print("No {0} model runs on {1}".format(self.member, self.run_date))
+            return loaded
+        for t in sorted(windows.keys()):
+            if len(grib_variables) == 0 or t >= len(self.file_objects) or self.file_objects[t] is None:
+                continue
+            g_file = self.file_objects[t]
+            grib_index = load_grib_index(g_file, self.index_path)
+            with open(g_file, "rb") as grib_obj:
+                for variable in grib_variables:
+                    data_values = self.read_grib_values(grib_obj, grib_index, variable)
+                    if data_values is None:
                         continue
-            
-            if variable in u_v_variables: data_values = u_v_grib_data
-            elif len(grib_data) > 1: raise NameError(
-                "Multiple '{0}' records found for {1} {2}.\n Please rename with more description'".format(
-                model_variable,self.run_date,self.member))
-            else: data_values = grib_data[0].values
-        
-            grib.close()
-            if self.data is None:
-                self.data = np.empty((
-                    len(self.valid_dates),data_values.shape[0],data_values.shape[1]),
-                    dtype=float)
-                self.data[f]=data_values[:]
+                    loaded[variable][0][t] = [(i_start, j_start,
+                                               np.array(data_values[i_start:i_end, j_start:j_end], dtype=self.dtype))
+                                              for i_start, i_end, j_start, j_end in windows[t]]
+        return loaded
+
+    def find_grib_message(self, grib_index, selected_variable):
+        """
+            Finds the message containing one variable in the index of a grib2 file.
+
+            Args:
+                grib_index: Array of message information from load_grib_index
+                selected_variable (int or str): grib2 variable name or message number
+            Returns:
+                Row of the message in the index, or None if no matching message is found.
+        """
+        u_v_variables = ['U component of wind','V component of wind',
+            '10 metre U wind component','10 metre V wind component',
+            'u','v','10u','10v']
+        if type(selected_variable) is int:
+            #Grib messages begin at one
+            return selected_variable - 1
+        if '_' in selected_variable:
+            #Multiple levels
+            variable = selected_variable.split('_')[0]
+            level = selected_variable.split('_')[1]
+        else:
+            #Only single level 
+            variable = selected_variable
+            level = None
+        names, short_names, levels, level_types, parameter_numbers = (grib_index[:, 0], grib_index[:, 1],
+                                                                      grib_index[:, 2], grib_index[:, 3],
+                                                                      grib_index[:, 5])
+
+        ##################################
+        # U/V wind string variables
+        ##################################
+
+        if variable in u_v_variables:
+            u_v_ind = np.where(
+                (names == variable) | (short_names == variable) &
+                (levels == level) | (level_types == level))[0]
+            return u_v_ind[0]
+
+        ##################################
+        # Unknown string variables
+        ##################################
+
+        elif variable in self.unknown_names.values(): 
+            Id, units = self.format_grib_name(variable)
+            matches = parameter_numbers == str(Id)
+
+        ##################################
+        # Known string variables
+        ##################################
+
+        elif variable in names:
+            matches = names == variable
+        elif variable in short_names:
+            matches = short_names == variable
+        else:
+            print('No {0} {1} grib message found for {2} {3}'.format(
+                self.run_date,self.member,variable,level))
+            return None
+
+        if level is not None:
+            if level in levels:
+                matches &= levels == level
+            elif level in level_types:
+                matches &= level_types == level
             else:
-                self.data[f]=data_values[:]
-        return self.data, None
+                print('No {0} {1} grib message found for {2} {3}'.format(
+                    self.run_date,self.member,variable,level))
+                return None
+        message_ind = np.where(matches)[0]
+        if len(message_ind) == 0:
+            print('No {0} {1} grib message found for {2} {3}'.format(
+                self.run_date,self.member,variable,level))
+            return None
+        if len(message_ind) > 1: raise NameError(
+            "Multiple '{0}' records found for {1} {2}.\n Please rename with more description'".format(
+            selected_variable,self.run_date,self.member))
+        return message_ind[0]
+
+    def read_grib_values(self, grib_obj, grib_index, selected_variable):
+        """
+            Decodes the values of one variable from a grib2 file by reading only the bytes of its message.
+
+            Args:
+                grib_obj: grib2 file opened in binary mode
+                grib_index: Array of message information from load_grib_index
+                selected_variable (int or str): grib2 variable name or message number
+            Returns:
+                2D array of values, or None if no matching message is found.
+        """
+        message_ind = self.find_grib_message(grib_index, selected_variable)
+        if message_ind is None:
+            return None
+        grib_obj.seek(int(grib_index[message_ind, 6]))
+        return pygrib.fromstring(grib_obj.read(int(grib_index[message_ind, 7]))).values
 
     def load_grib_data(self):
         """
@@ -232,12 +419,10 @@ class GribModelGrid(object):
         """
         return self.load_data()
 
-    def __exit__(self):
+    def __exit__(self, *args):
         """
-        Close links to all open file objects and delete the objects.
+        Delete the list of file names. Grib files are opened and closed as data are loaded.
         """
-        for file_object in self.file_objects:
-            file_object.close()
         del self.file_objects[:]
 
     def close(self):
@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 from .GribModelGrid import GribModelGrid
+from .DirectoryCatalog import run_catalog
 from datetime import timedelta 
 import numpy as np
-from glob import glob
 
 
 class HREFv2ModelGrid(GribModelGrid):
@@ -15,10 +15,14 @@ class HREFv2ModelGrid(GribModelGrid):
         start_date (datetime.datetime object): First time step extracted.
         end_date (datetime.datetime object): Last time step extracted.
         path (str): Path to model output files
+        catalog (DirectoryCatalog): Cached listing of the run directories. Defaults to the catalog shared by all
+            HREFv2 grids.
     """
 
     def __init__(self, member, run_date, variable, start_date, 
-                end_date, path):
+                end_date, path, catalog=None):
+        if catalog is None:
+            catalog = run_catalog
         self.path = path
         self.member = member
         filenames = []
@@ -37,15 +41,17 @@ class HREFv2ModelGrid(GribModelGrid):
             date = day_before_date
         for forecast_hr in hours:
             if 'nam' in self.member:
-                files = glob('{0}/{1}/nam*conusnest*{2}f*{3}*'.format(self.path,
+                files = catalog.glob('{0}/{1}/nam*conusnest*{2}f*{3}*'.format(self.path,
                         date,inilization,forecast_hr))
                 if not files:
-                    files = glob('{0}/{1}/nam*t{2}z*conusnest*{3}*'.format(self.path,
+                    files = catalog.glob('{0}/{1}/nam*t{2}z*conusnest*{3}*'.format(self.path,
                             date,inilization,forecast_hr))
             else:
-                files = glob('{0}/{1}/*hiresw*conus{2}*{3}f*{4}*'.format(self.path,
+                files = catalog.glob('{0}/{1}/*hiresw*conus{2}*{3}f*{4}*'.format(self.path,
                         date,member_name,inilization,forecast_hr))
             if len(files) >=1:
                 filenames.append(files[0])
+            else:
+                filenames.append(None)
         super(HREFv2ModelGrid, self).__init__(filenames,run_date,start_date,end_date,variable,member)
         return 
@@ -2,8 +2,171 @@ from netCDF4 import Dataset, num2date
 import pandas as pd
 import numpy as np
 import os
+import json
+from os.path import exists, join, getmtime, getsize, dirname, abspath
+from collections import OrderedDict
 from scipy.spatial import cKDTree
 from scipy.ndimage import gaussian_filter
+from hagelslag.util.cache import cache_path
+
+
+class MRMSCatalog(object):
+    """
+    Catalog of the daily MRMS files in a directory and the valid times in each file. The directory is only listed
+    again when it changes, and the valid times of a file are only read again when its modification time or size
+    changes. The catalog is saved to a JSON file so it can be reused by other jobs. Catalogs are normally saved in a
+    cache directory, so the MRMS directory is not written to.
+
+    Attributes:
+        directory (str): Directory containing the MRMS files
+        catalog_file (str): JSON file where the catalog is saved
+        directory_mtime (float): Modification time of the directory when it was listed
+        file_names (list): Sorted names of the MRMS files
+        file_times (dict): Maps each file name to a dict with its mtime, size, and valid times
+        modified (bool): Whether the catalog has changed since it was loaded or saved
+    """
+    def __init__(self, directory, catalog_file):
+        self.directory = directory
+        self.catalog_file = catalog_file
+        self.directory_mtime = None
+        self.file_names = []
+        self.file_times = {}
+        self.modified = False
+        if exists(self.catalog_file):
+            try:
+                with open(self.catalog_file) as catalog_obj:
+                    catalog = json.load(catalog_obj)
+                self.directory_mtime = catalog["directory_mtime"]
+                self.file_names = catalog["file_names"]
+                self.file_times = catalog["file_times"]
+            except (IOError, OSError, ValueError, KeyError):
+                self.directory_mtime = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        List the directory again if it has changed since it was last listed.
+        """
+        directory_mtime = getmtime(self.directory)
+        if directory_mtime != self.directory_mtime:
+            file_names = self.list_files()
+            if file_names != self.file_names:
+                self.file_names = file_names
+                self.modified = True
+            self.directory_mtime = directory_mtime
+
+    def list_files(self):
+        """
+        List the MRMS files in the directory. Hidden files and a catalog saved in the directory are left out.
+
+        Returns:
+            Sorted list of file names
+        """
+        catalog_name = os.path.basename(self.catalog_file)
+        return sorted([f for f in os.listdir(self.directory) if not f.startswith(".") and f != catalog_name])
+
+    def file_on(self, date_str):
+        """
+        Find the MRMS file for a day.
+
+        Args:
+            date_str (str): Day in YYYYMMDD format
+
+        Returns:
+            Name of the first file for the day, or None if there is no file.
+        """
+        for file_name in self.file_names:
+            if file_name.split("_")[-2].split("-")[0] == date_str:
+                return file_name
+        return None
+
+    def valid_times(self, file_name):
+        """
+        Get the valid times of the grids in an MRMS file, reading them from the file if they are not in the catalog.
+
+        Args:
+            file_name (str): Name of the MRMS file
+
+        Returns:
+            pandas.DatetimeIndex of valid times
+        """
+        full_name = join(self.directory, file_name)
+        mtime = getmtime(full_name)
+        size = getsize(full_name)
+        entry = self.file_times.get(file_name, None)
+        if entry is None or entry["mtime"] != mtime or entry["size"] != size:
+            with Dataset(full_name) as file_obj:
+                if "time" in file_obj.variables.keys():
+                    time_var = "time"
+                else:
+                    time_var = "date"
+                file_valid_dates = pd.DatetimeIndex(num2date(file_obj.variables[time_var][:],
+                                                             file_obj.variables[time_var].units,
+                                                             only_use_cftime_datetimes=False))
+            entry = {"mtime": mtime, "size": size, "times": [d.isoformat() for d in file_valid_dates]}
+            self.file_times[file_name] = entry
+            self.modified = True
+        return pd.DatetimeIndex(entry["times"])
+
+    def save(self):
+        """
+        Save the catalog if it has changed. If the catalog file cannot be written, the catalog is only kept in
+        memory.
+        """
+        if not self.modified:
+            return
+        temp_file = self.catalog_file + ".{0:d}".format(os.getpid())
+        try:
+            os.makedirs(dirname(self.catalog_file), exist_ok=True)
+            self.write(temp_file)
+            os.replace(temp_file, self.catalog_file)
+            if dirname(abspath(self.catalog_file)) == abspath(self.directory):
+                # Moving the catalog into the directory changed the directory mtime. The new mtime is saved if no
+                # MRMS files were added or removed in the meantime, by rewriting the catalog in place, which does not
+                # change the directory mtime again.
+                directory_mtime = getmtime(self.directory)
+                if self.list_files() == self.file_names:
+                    self.directory_mtime = directory_mtime
+                    self.write(self.catalog_file)
+            self.modified = False
+        except (IOError, OSError):
+            print("Could not save MRMS catalog {0}".format(self.catalog_file))
+
+    def write(self, filename):
+        """
+        Write the catalog to a JSON file.
+
+        Args:
+            filename (str): Name of the file
+        """
+        with open(filename, "w") as catalog_obj:
+            json.dump({"directory_mtime": self.directory_mtime, "file_names": self.file_names,
+                       "file_times": self.file_times}, catalog_obj)
+
+
+mrms_catalogs = {}
+
+
+def get_mrms_catalog(directory, catalog_path=None):
+    """
+    Get the catalog of an MRMS directory, reusing catalogs already loaded by this process.
+
+    Args:
+        directory (str): Directory containing the MRMS files
+        catalog_path (str): Directory where catalog files are saved. If None, catalogs are saved in the
+            hagelslag/mrms_catalogs directory of the user cache directory given by XDG_CACHE_HOME, or ~/.cache.
+
+    Returns:
+        MRMSCatalog
+    """
+    if catalog_path is None:
+        catalog_path = cache_path("mrms_catalogs")
+    catalog_file = join(catalog_path, abspath(directory).strip(os.sep).replace(os.sep, "_") + ".mrms_catalog.json")
+    if catalog_file in mrms_catalogs.keys():
+        mrms_catalogs[catalog_file].refresh()
+    else:
+        mrms_catalogs[catalog_file] = MRMSCatalog(directory, catalog_file)
+    return mrms_catalogs[catalog_file]
 
 
 class MRMSGrid(object):
@@ -30,7 +193,12 @@ class MRMSGrid(object):
         List of dates being loaded
         data (ndarray or None): Array of gridded observations after load_data is called. None otherwise.
         valid_dates (ndarray): Contains the dates where data loaded successfully.
+        files_read (list): Names of the MRMS files read by load_data.
+        catalog_path (str): Directory where MRMS catalogs are saved. If None, catalogs are saved in the user cache
+            directory.
     """
+    catalog_path = None
+
     def __init__(self, start_date, end_date, variable, path, freq="1H"):
         self.start_date = start_date
         self.end_date = end_date
@@ -40,43 +208,35 @@ class MRMSGrid(object):
         self.all_dates = pd.date_range(start=start_date, end=end_date, freq=freq)
         self.data = None
         self.valid_dates = None
+        self.files_read = []
 
     def load_data(self):
         """
-        Loads data files and stores the output in the data attribute.
+        Loads data files and stores the output in the data attribute. The times needed from each daily file are
+        found in the MRMS catalog and read in one contiguous slice.
         """
-        data = []
-        valid_dates = []
-        mrms_files = np.array(sorted(os.listdir(self.path + self.variable + "/")))
-        mrms_file_dates = np.array([m_file.split("_")[-2].split("-")[0]
-            for m_file in mrms_files])
-        old_mrms_file = None
-        file_obj = None
+        catalog = get_mrms_catalog(self.path + self.variable + "/", self.catalog_path)
+        file_steps = OrderedDict()
         for t in range(self.all_dates.shape[0]):
-            file_index = np.where(mrms_file_dates == self.all_dates[t].strftime("%Y%m%d"))[0]
-            if len(file_index) > 0:
-                mrms_file = mrms_files[file_index][0]
-                if mrms_file is not None:
-                    if file_obj is not None:
-                        file_obj.close()
-                    file_obj = Dataset(self.path + self.variable + "/" + mrms_file)
-                    #old_mrms_file = mrms_file
-                    
-                    if "time" in file_obj.variables.keys():
-                        time_var = "time"
-                    else:
-                        time_var = "date"
-                    file_valid_dates = pd.DatetimeIndex(num2date(file_obj.variables[time_var][:],
-                        file_obj.variables[time_var].units,only_use_cftime_datetimes=False))
-                else:
-                    file_valid_dates = pd.DatetimeIndex([])
-                time_index = np.where(file_valid_dates.values == self.all_dates.values[t])[0]
+            mrms_file = catalog.file_on(self.all_dates[t].strftime("%Y%m%d"))
+            if mrms_file is not None:
+                time_index = np.where(catalog.valid_times(mrms_file).values == self.all_dates.values[t])[0]
                 if len(time_index) > 0:
-                    data.append(file_obj.variables[self.variable][time_index[0]])
-                    valid_dates.append(self.all_dates[t])
-        if file_obj is not None:
-            file_obj.close()
-        
+                    if mrms_file not in file_steps.keys():
+                        file_steps[mrms_file] = []
+                    file_steps[mrms_file].append((t, time_index[0]))
+        catalog.save()
+        step_data = {}
+        self.files_read = list(file_steps.keys())
+        for mrms_file, steps in file_steps.items():
+            start_index = min([step[1] for step in steps])
+            end_index = max([step[1] for step in steps]) + 1
+            with Dataset(self.path + self.variable + "/" + mrms_file) as file_obj:
+                file_data = file_obj.variables[self.variable][start_index:end_index]
+            for t, time_index in steps:
+                step_data[t] = file_data[time_index - start_index]
+        data = [step_data[t] for t in sorted(step_data.keys())]
+        valid_dates = [self.all_dates[t] for t in sorted(step_data.keys())]
         self.data = np.array(data)
         self.data[self.data < 0] = 0
         self.data[self.data > 150] = 150
@@ -1,7 +1,68 @@
 from netCDF4 import Dataset
 import numpy as np
 from pandas import date_range
-from os.path import exists
+from os.path import exists, getsize
+from collections import OrderedDict, deque
+from multiprocessing.pool import ThreadPool
+
+
+class FileHandlePool(object):
+    """
+    Sequence of netCDF files that are opened on demand. At most max_open files are kept open at once, and the least
+    recently used file is closed when another one has to be opened. Missing files are returned as None.
+
+    Attributes:
+        filenames (list of str): List of netCDF files in the sequence
+        max_open (int): Maximum number of files open at the same time
+        open_files (OrderedDict): Open file objects keyed by index, ordered from least to most recently used
+    """
+    def __init__(self, filenames, max_open=8):
+        self.filenames = filenames
+        self.max_open = max(1, max_open)
+        self.open_files = OrderedDict()
+        self.file_exists = [exists(filename) for filename in filenames]
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.filenames)
+        if not self.file_exists[index]:
+            return None
+        if index in self.open_files.keys():
+            file_object = self.open_files.pop(index)
+        else:
+            while len(self.open_files) >= self.max_open:
+                self.open_files.popitem(last=False)[1].close()
+            file_object = Dataset(self.filenames[index])
+        self.open_files[index] = file_object
+        return file_object
+
+    def __iter__(self):
+        for index in range(len(self.filenames)):
+            yield self[index]
+
+    def close(self):
+        """
+        Close all open files.
+        """
+        while len(self.open_files) > 0:
+            self.open_files.popitem(last=False)[1].close()
+
+
+def read_file_bytes(filename):
+    """
+    Read the full contents of a file.
+
+    Args:
+        filename (str): Name of the file
+
+    Returns:
+        bytes in the file
+    """
+    with open(filename, "rb") as file_obj:
+        return file_obj.read()
 
 
 class ModelGrid(object):
@@ -19,8 +80,27 @@ class ModelGrid(object):
         freqency (str): spacing between model time steps.
         valid_dates: DatetimeIndex of all model timesteps
         forecast_hours: array of all hours in the forecast
-        file_objects (list): List of the file objects for each model time step
+        file_objects (FileHandlePool): File objects for each model time step, opened on demand
+        max_open_files (int): Maximum number of files each grid keeps open at the same time
+        read_threads (int): Number of threads reading single time step files at the same time. If 1 (the
+            default), files are read serially. The threads read each file whole, so they are only used when the
+            requested variables make up at least min_read_fraction of the data in the files. Otherwise only the
+            requested variables are read, serially.
+        min_read_fraction (float): Smallest share of the uncompressed variable data in a file that has to be
+            requested before whole files are read with threads. Files with many variables rarely reach the default
+            of 0.5, so it can be lowered for file systems with high latency. If 0, whole files are always read
+            with threads when read_threads is above 1.
+        max_read_bytes (int): Largest number of bytes of whole files read ahead and held in memory at once. One
+            file is always read, even if it is larger.
+        dtype: Data type of the loaded arrays.
     """
+    max_open_files = 8
+    read_threads = 1
+    min_read_fraction = 0.5
+    max_read_bytes = 2 ** 29
+    dtype = np.float32
+
+
     def __init__(self, 
                  filenames, 
                  run_date, 
@@ -39,18 +119,16 @@ class ModelGrid(object):
                                          freq=self.frequency)
         self.forecast_hours = (self.valid_dates.values - self.run_date).astype("timedelta64[h]").astype(int)
         self.file_objects = []
-        self.__enter__()
 
     def __enter__(self):
         """
-        Open each file for reading.
+        Prepare the files for reading. Files are opened when they are first accessed through file_objects, and only
+        max_open_files of them are kept open at once.
 
         """
-        for filename in self.filenames:
-            if exists(filename):
-                self.file_objects.append(Dataset(filename))
-            else:
-                self.file_objects.append(None)
+        if len(self.file_objects) == 0:
+            self.file_objects = FileHandlePool(self.filenames, self.max_open_files)
+        return self
 
     def load_data_old(self):
         """
@@ -58,6 +136,7 @@ class ModelGrid(object):
         handles loading a full time series from one file or individual time steps
         from multiple files. Missing files are supported.
         """
+        self.__enter__()
         units = ""
         if len(self.file_objects) == 1 and self.file_objects[0] is not None:
             data = self.file_objects[0].variables[self.variable][self.forecast_hours]
@@ -76,7 +155,7 @@ class ModelGrid(object):
                         print("{0} not found".format(self.variable))
                         raise KeyError
                     break
-            data = np.zeros((len(self.file_objects), grid_shape[1], grid_shape[2]))
+            data = np.zeros((len(self.file_objects), grid_shape[1], grid_shape[2]), dtype=self.dtype)
             for f, file_object in enumerate(self.file_objects):
                 if file_object is not None:
                     if self.variable in file_object.variables.keys():
@@ -100,31 +179,176 @@ class ModelGrid(object):
         Returns:
             Array of data loaded from files in (time, y, x) dimensions, Units
         """
-        units = ""
-        if self.file_objects[0] is None:
+        return self.load_variables([self.variable])[self.variable]
+
+    def load_variables(self, variables):
+        """
+        Load several variables from the same netCDF files. Each file is opened once, and every requested variable
+        is read from a file before moving on to the next one. Time steps without a file are filled with zeros.
+
+        Args:
+            variables (list of str): Names of the variables being loaded.
+
+        Returns:
+            dict mapping each variable to a tuple of its array in (time, y, x) dimensions and its units.
+        """
+        self.__enter__()
+        first_file = self.first_file()
+        if first_file is None:
             raise IOError()
-        var_name, z_index = self.format_var_name(self.variable, list(self.file_objects[0].variables.keys()))
-        ntimes = 0
-        if 'time' in self.file_objects[0].variables[var_name].dimensions:
-            ntimes = len(self.file_objects[0].dimensions['time'])
-
-        if ntimes > 1:
-            if z_index is None:
-                data = self.file_objects[0].variables[var_name][self.forecast_hours].astype(np.float32)
+        var_list = list(first_file.variables.keys())
+        var_info = {}
+        data = {}
+        step_variables = []
+        for variable in variables:
+            var_name, z_index = self.format_var_name(variable, var_list)
+            units = ""
+            if hasattr(first_file.variables[var_name], "units"):
+                units = first_file.variables[var_name].units
+            var_info[variable] = (var_name, z_index, units)
+            ntimes = 0
+            if 'time' in first_file.variables[var_name].dimensions:
+                ntimes = len(first_file.dimensions['time'])
+            if ntimes > 1:
+                if z_index is None:
+                    data[variable] = first_file.variables[var_name][self.forecast_hours].astype(self.dtype)
+                else:
+                    data[variable] = first_file.variables[var_name][self.forecast_hours,
+                                                                    z_index].astype(self.dtype)
             else:
-                data = self.file_objects[0].variables[var_name][self.forecast_hours, z_index].astype(np.float32)
-        else:
-            y_dim, x_dim = self.file_objects[0].variables[var_name].shape[-2:]
-            data = np.zeros((len(self.valid_dates), y_dim, x_dim), dtype=np.float32)
-            for f, file_object in enumerate(self.file_objects):
+                y_dim, x_dim = first_file.variables[var_name].shape[-2:]
+                data[variable] = np.zeros((len(self.valid_dates), y_dim, x_dim), dtype=self.dtype)
+                step_variables.append(variable)
+        if len(step_variables) > 0:
+            step_files = enumerate(self.file_objects)
+            if self.read_threads > 1:
+                step_names = [var_info[variable][0] for variable in step_variables]
+                if self.read_fraction(first_file, step_names) >= self.min_read_fraction:
+                    step_files = self.read_step_files()
+            for f, file_object in step_files:
                 if file_object is not None:
-                    if z_index is None:
-                        data[f] = file_object.variables[var_name][0]
+                    for variable in step_variables:
+                        var_name, z_index = var_info[variable][:2]
+                        if z_index is None:
+                            data[variable][f] = file_object.variables[var_name][0]
+                        else:
+                            data[variable][f] = file_object.variables[var_name][0, z_index]
+        return dict([(variable, (data[variable], var_info[variable][2])) for variable in variables])
+
+    def first_file(self):
+        """
+        Find the first time step with a file.
+
+        Returns:
+            netCDF Dataset of the first existing file, or None if no files exist.
+        """
+        for file_object in self.file_objects:
+            if file_object is not None:
+                return file_object
+        return None
+
+    @staticmethod
+    def read_fraction(file_object, var_names):
+        """
+        Share of the uncompressed variable data in a file taken up by some of its variables. Compression is assumed
+        to be similar for every variable.
+
+        Args:
+            file_object: netCDF Dataset
+            var_names (list of str): Names of the variables
+
+        Returns:
+            float between 0 and 1
+        """
+        var_bytes = dict([(name, var.size * var.dtype.itemsize) for name, var in file_object.variables.items()
+                          if hasattr(var.dtype, "itemsize")])
+        total_bytes = sum(var_bytes.values())
+        if total_bytes == 0:
+            return 1.0
+        return sum([var_bytes.get(name, 0) for name in set(var_names)]) / float(total_bytes)
+
+    def read_step_files(self):
+        """
+        Read the single time step files with a pool of read_threads threads. The threads read the raw bytes of
+        each whole file, so the time spent waiting on the file system overlaps, while the files are decoded one at a
+        time because the netCDF library is not thread safe. Files are read ahead until max_read_bytes are held in
+        memory.
+
+        Yields:
+            Index of each existing file and the file object opened from memory. The file object is closed when the
+            next one is requested.
+        """
+        pool = ThreadPool(self.read_threads)
+        pending = deque()
+        pending_bytes = 0
+        indices = deque([f for f, filename in enumerate(self.filenames) if exists(filename)])
+        try:
+            while len(indices) > 0 or len(pending) > 0:
+                while len(indices) > 0 and (len(pending) == 0 or
+                                            pending_bytes + getsize(self.filenames[indices[0]]) <= self.max_read_bytes):
+                    f = indices.popleft()
+                    file_bytes = getsize(self.filenames[f])
+                    pending.append((f, file_bytes, pool.apply_async(read_file_bytes, (self.filenames[f],))))
+                    pending_bytes += file_bytes
+                f, file_bytes, result = pending.popleft()
+                file_object = Dataset(self.filenames[f], memory=result.get())
+                try:
+                    yield f, file_object
+                finally:
+                    file_object.close()
+                    pending_bytes -= file_bytes
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def load_windows(self, variables, windows):
+        """
+        Load several variables only within rectangular windows of the grid. Each file is opened once, and files
+        for time steps without any windows are not read.
+
+        Args:
+            variables (list of str): Names of the variables being loaded.
+            windows (dict): Maps each time index to a list of (row start, row end, column start, column end) tuples.
+
+        Returns:
+            dict mapping each variable to a tuple of a dict of {time index: [(row start, column start, array)]} and
+            its units.
+        """
+        self.__enter__()
+        if len(self.file_objects) == 0 or self.file_objects[0] is None:
+            raise IOError()
+        var_list = list(self.file_objects[0].variables.keys())
+        loaded = {}
+        for variable in variables:
+            var_name, z_index = self.format_var_name(variable, var_list)
+            ntimes = 0
+            if 'time' in self.file_objects[0].variables[var_name].dimensions:
+                ntimes = len(self.file_objects[0].dimensions['time'])
+            units = ""
+            if hasattr(self.file_objects[0].variables[var_name], "units"):
+                units = self.file_objects[0].variables[var_name].units
+            loaded[variable] = ({}, units, var_name, z_index, ntimes)
+        for t in sorted(windows.keys()):
+            for variable in variables:
+                window_data, units, var_name, z_index, ntimes = loaded[variable]
+                window_data[t] = []
+                if ntimes > 1:
+                    file_object = self.file_objects[0]
+                    time_index = self.forecast_hours[t]
+                elif t < len(self.file_objects) and self.file_objects[t] is not None:
+                    file_object = self.file_objects[t]
+                    time_index = 0
+                else:
+                    file_object = None
+                for i_start, i_end, j_start, j_end in windows[t]:
+                    if file_object is None:
+                        values = np.zeros((i_end - i_start, j_end - j_start), dtype=self.dtype)
+                    elif z_index is None:
+                        values = file_object.variables[var_name][time_index, i_start:i_end, j_start:j_end]
                     else:
-                        data[f] = file_object.variables[var_name][0, z_index]
-        if hasattr(self.file_objects[0].variables[var_name], "units"):
-            units = self.file_objects[0].variables[var_name].units
-        return data, units
+                        values = file_object.variables[var_name][time_index, z_index, i_start:i_end, j_start:j_end]
+                    window_data[t].append((i_start, j_start, np.asarray(values, dtype=self.dtype)))
+        return dict([(variable, loaded[variable][:2]) for variable in variables])
 
     @staticmethod
     def format_var_name(variable, var_list):
@@ -151,13 +375,13 @@ class ModelGrid(object):
             raise KeyError("{0} not found in {1}".format(variable, var_list))
         return var_name, z_index
 
-    def __exit__(self):
+    def __exit__(self, *args):
         """
         Close links to all open file objects and delete the objects.
         """
-        for file_object in self.file_objects:
-            file_object.close()
-        del self.file_objects[:]
+        if isinstance(self.file_objects, FileHandlePool):
+            self.file_objects.close()
+        self.file_objects = []
 
     def close(self):
         """
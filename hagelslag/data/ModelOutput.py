@@ -7,9 +7,13 @@ from .HRRRModelGrid import HRRRModelGrid
 from .HRRREModelGrid import HRRREModelGrid
 from .HREFv2ModelGrid import HREFv2ModelGrid
 from .NCARStormEventModelGrid import NCARStormEventModelGrid
+from .ModelGrid import ModelGrid
 from hagelslag.util.make_proj_grids import make_proj_grids, read_arps_map_file, read_ncar_map_file, get_proj_obj
+from hagelslag.util.shared_grids import shared_proj_grids
 from hagelslag.util.derived_vars import relative_humidity_pressure_level, melting_layer_height
 import numpy as np
+from collections import OrderedDict
+from datetime import timedelta
 from scipy.spatial import cKDTree
 from scipy.ndimage import gaussian_filter
 from pyproj import Proj
@@ -30,6 +34,11 @@ class ModelOutput(object):
             If false, all timesteps are together in the same file.
 
         map_file (str): path to data map file
+        read_threads (int): Number of threads reading single time step netCDF files at the same time.
+        dtype: Data type of the loaded and derived arrays.
+        chunk_hours (int): If set, data are loaded lazily in chunks of this many time steps, and data is a
+            ChunkedData object instead of an array.
+        files_read (list): Names of the model files read when the data were loaded.
     """
     def __init__(self, 
                  ensemble_name, 
@@ -40,7 +49,10 @@ class ModelOutput(object):
                  end_date,
                  path,
                  map_file,
-                 single_step=True):
+                 single_step=True,
+                 read_threads=1,
+                 dtype=np.float32,
+                 chunk_hours=None):
         self.ensemble_name = ensemble_name
         self.member_name = member_name
         self.run_date = run_date
@@ -63,49 +75,71 @@ class ModelOutput(object):
         self.dx = None
         self.units = ""
         self.single_step = single_step
+        self.read_threads = read_threads
+        self.dtype = dtype
+        self.chunk_hours = chunk_hours
+        self.files_read = []
 
     def load_data(self):
         """
-        Load the specified variable from the ensemble files, then close the files.
+        Load the specified variable from the ensemble files, then close the files. If chunk_hours is set, only the
+        first chunk is loaded, and the other chunks are loaded when they are accessed.
+        """
+        if self.chunk_hours is not None:
+            first_chunk, self.units = self.load_chunk(0, self.chunk_hours)
+            if first_chunk is None:
+                self.data = None
+            else:
+                self.data = ChunkedData(self.load_chunk, self.end_hour - self.start_hour + 1, self.chunk_hours)
+                self.data.add_chunk(0, first_chunk)
+            return
+        mg = self.model_grid()
+        if mg is not None:
+            self.data, self.units = mg.load_data()
+            self.files_read = [f for f in getattr(mg, "filenames", []) if f is not None]
+            mg.close()
+        elif derived_variable_plan(self.ensemble_name, self.variable) is not None:
+            derived_output = load_model_outputs(self.ensemble_name, self.member_name, self.run_date, [self.variable],
+                                                self.start_date, self.end_date, self.path, self.map_file,
+                                                single_step=self.single_step, read_threads=self.read_threads,
+                                                dtype=self.dtype)[self.variable]
+            self.data, self.units = derived_output.data, derived_output.units
+            self.files_read = derived_output.files_read
+        else:
+            print(self.ensemble_name + " not supported.")
+
+    def load_chunk(self, start_index, end_index):
+        """
+        Load the time steps of the specified variable between two time indices.
+
+        Args:
+            start_index (int): Index of the first time step from the start date
+            end_index (int): Index after the last time step
+
+        Returns:
+            Array of data in (time, y, x) dimensions, Units
+        """
+        end_index = min(end_index, self.end_hour - self.start_hour + 1)
+        chunk_output = ModelOutput(self.ensemble_name, self.member_name, self.run_date, self.variable,
+                                   self.start_date + timedelta(hours=start_index),
+                                   self.start_date + timedelta(hours=end_index - 1), self.path, self.map_file,
+                                   single_step=self.single_step, read_threads=self.read_threads, dtype=self.dtype)
+        chunk_output.load_data()
+        self.files_read.extend([f for f in chunk_output.files_read if f not in self.files_read])
+        return chunk_output.data, chunk_output.units
+
+    def model_grid(self):
+        """
+        Create the object that reads the specified variable directly from the ensemble files. Files are not opened
+        until data are loaded.
+
+        Returns:
+            ModelGrid or GribModelGrid object, or None if the variable is derived from other variables or the
+            ensemble is not supported.
         """
         if self.ensemble_name.upper() == "SSEF":
-            if self.variable[0:2] == "rh":
-                pressure_level = self.variable[2:]
-                relh_vars = ["sph", "tmp"]
-                relh_vals = {}
-                for var in relh_vars:
-                    mg = SSEFModelGrid(self.member_name,
-                                       self.run_date,
-                                       var + pressure_level,
-                                       self.start_date,
-                                       self.end_date,
-                                       self.path,
-                                       single_step=self.single_step)
-                    relh_vals[var], units = mg.load_data()
-                    mg.close()
-                self.data = relative_humidity_pressure_level(relh_vals["tmp"],
-                                                             relh_vals["sph"],
-                                                             float(pressure_level) * 100)
-                self.units = "%"
-            elif self.variable == "melth":
-                input_vars = ["hgtsfc", "hgt700", "hgt500", "tmp700", "tmp500"]
-                input_vals = {}
-                for var in input_vars:
-                    mg = SSEFModelGrid(self.member_name,
-                                       self.run_date,
-                                       var,
-                                       self.start_date,
-                                       self.end_date,
-                                       self.path,
-                                       single_step=self.single_step)
-                    input_vals[var], units = mg.load_data()
-                    mg.close()
-                self.data = melting_layer_height(input_vals["hgtsfc"],
-                                                 input_vals["hgt700"],
-                                                 input_vals["hgt500"],
-                                                 input_vals["tmp700"],
-                                                 input_vals["tmp500"])
-                self.units = "m"
+            if self.variable[0:2] == "rh" or self.variable == "melth":
+                mg = None
             else:
                 mg = SSEFModelGrid(self.member_name,
                                    self.run_date,
@@ -114,8 +148,6 @@ class ModelOutput(object):
                                    self.end_date,
                                    self.path,
                                    single_step=self.single_step)
-                self.data, self.units = mg.load_data()
-                mg.close()
         elif self.ensemble_name.upper() == "NCAR":
             mg = NCARModelGrid(self.member_name,
                                self.run_date,
@@ -124,8 +156,6 @@ class ModelOutput(object):
                                self.end_date,
                                self.path,
                                single_step=self.single_step)
-            self.data, self.units = mg.load_data()
-            mg.close()
         elif self.ensemble_name.upper() == "HREFV2":
             mg = HREFv2ModelGrid(self.member_name,
                                self.run_date,
@@ -133,8 +163,6 @@ class ModelOutput(object):
                                self.start_date,
                                self.end_date,
                                self.path)
-            self.data, self.units = mg.load_data()
-        
         elif self.ensemble_name.upper() == "HRRRE":
             mg = HRRREModelGrid(self.member_name,
                                self.run_date,
@@ -143,8 +171,6 @@ class ModelOutput(object):
                                self.end_date,
                                self.path,
                                single_step=self.single_step)
-            self.data, self.units = mg.load_data()
-        
         elif self.ensemble_name.upper() == "SAR-FV3":
             mg = FV3ModelGrid(self.member_name,
                                self.run_date,
@@ -153,8 +179,6 @@ class ModelOutput(object):
                                self.end_date,
                                self.path,
                                single_step=self.single_step)
-            self.data, self.units = mg.load_data()
-
         elif self.ensemble_name.upper() == "VSE":
             mg = VSEModelGrid(self.member_name,
                                self.run_date,
@@ -163,26 +187,25 @@ class ModelOutput(object):
                                self.end_date,
                                self.path,
                                single_step=self.single_step)
-            self.data, self.units = mg.load_data()
-            mg.close()
         elif self.ensemble_name.upper() == "HRRR":
             mg = HRRRModelGrid(self.run_date,
                                self.variable,
                                self.start_date,
                                self.end_date,
                                self.path)
-            self.data, self.units = mg.load_data()
-            mg.close()
         elif self.ensemble_name.upper() == "NCARSTORM":
             mg = NCARStormEventModelGrid(self.run_date,
                                          self.variable,
                                          self.start_date,
                                          self.end_date,
                                          self.path)
-            self.data, self.units = mg.load_data()
-            mg.close()
         else:
-            print(self.ensemble_name + " not supported.")
+            mg = None
+        if mg is not None:
+            mg.dtype = self.dtype
+        if isinstance(mg, ModelGrid):
+            mg.read_threads = self.read_threads
+        return mg
 
     def load_map_info(self, map_file):
         """
@@ -194,7 +217,7 @@ class ModelOutput(object):
         if self.ensemble_name.upper() == "SSEF":
             proj_dict, grid_dict = read_arps_map_file(map_file)
             self.dx = int(grid_dict["dx"])
-            mapping_data = make_proj_grids(proj_dict, grid_dict)
+            mapping_data = shared_proj_grids(proj_dict, grid_dict)
             for m, v in mapping_data.items():
                 setattr(self, m, v)
             self.i, self.j = np.indices(self.lon.shape)
@@ -210,7 +233,7 @@ class ModelOutput(object):
                 grid_dict["ne_lat"] = 36.4822338520542 
 
             self.dx = int(grid_dict["dx"])
-            mapping_data = make_proj_grids(proj_dict, grid_dict)
+            mapping_data = shared_proj_grids(proj_dict, grid_dict)
             for m, v in mapping_data.items():
                 setattr(self, m, v)
             self.i, self.j = np.indices(self.lon.shape)
@@ -237,7 +260,7 @@ class ModelOutput(object):
         neighbor_x = x[::stride, ::stride] / 1000.0
         neighbor_y = y[::stride, ::stride] / 1000.0
         neighbor_kd_tree = cKDTree(np.vstack((neighbor_x.ravel(), neighbor_y.ravel())).T)
-        neighbor_prob = np.zeros((neighbor_x.shape[0], neighbor_x.shape[1]))
+        neighbor_prob = np.zeros((neighbor_x.shape[0], neighbor_x.shape[1]), dtype=self.dtype)
         period_max = self.data.max(axis=0)
         valid_i, valid_j = np.where(period_max >= threshold)
         print(self.variable, len(valid_i))
@@ -251,3 +274,269 @@ class ModelOutput(object):
                 neighbor_prob = gaussian_filter(neighbor_prob, smoothing)
         return neighbor_prob
 
+
+class ChunkedData(object):
+    """
+    Lazily loaded (time, y, x) grid split into chunks of consecutive time steps. Chunks are loaded when one of their
+    time steps is accessed, and only the most recently used chunks are kept in memory. Chunks without any model
+    files are filled with zeros. Supports indexing with an integer time index optionally followed by spatial indices,
+    and maxima over time.
+
+    Attributes:
+        load_chunk: Function that takes the start and end time indices of a chunk and returns its data and units.
+        num_times (int): Number of time steps in the full grid
+        chunk_size (int): Number of time steps in each chunk
+        max_chunks (int): Maximum number of chunks kept in memory
+        chunks (OrderedDict): Loaded chunks keyed by chunk number, ordered from least to most recently used
+        grid_shape (tuple): Shape of each time step, recorded when the first chunk is stored
+        grid_dtype: Data type of the values, recorded when the first chunk is stored
+    """
+    def __init__(self, load_chunk, num_times, chunk_size, max_chunks=2):
+        self.load_chunk = load_chunk
+        self.num_times = num_times
+        self.chunk_size = chunk_size
+        self.max_chunks = max(1, max_chunks)
+        self.chunks = OrderedDict()
+        self.grid_shape = None
+        self.grid_dtype = None
+
+    def __len__(self):
+        return self.num_times
+
+    @property
+    def shape(self):
+        if self.grid_shape is None:
+            self.chunk(0)
+        return (self.num_times,) + self.grid_shape
+
+    @property
+    def dtype(self):
+        if self.grid_dtype is None:
+            self.chunk(0)
+        return self.grid_dtype
+
+    def add_chunk(self, c, values):
+        """
+        Store a loaded chunk, removing the least recently used chunks if too many are in memory.
+
+        Args:
+            c (int): Chunk number
+            values: Array of chunk data in (time, y, x) dimensions
+        """
+        if self.grid_shape is None:
+            self.grid_shape = values.shape[1:]
+            self.grid_dtype = values.dtype
+        while len(self.chunks) >= self.max_chunks:
+            self.chunks.popitem(last=False)
+        self.chunks[c] = values
+
+    def chunk(self, c):
+        """
+        Get the data in a chunk, loading it if necessary.
+
+        Args:
+            c (int): Chunk number
+
+        Returns:
+            Array of chunk data in (time, y, x) dimensions
+        """
+        if c in self.chunks.keys():
+            values = self.chunks.pop(c)
+            self.chunks[c] = values
+        else:
+            try:
+                values = self.load_chunk(c * self.chunk_size, (c + 1) * self.chunk_size)[0]
+            except IOError:
+                values = None
+            if values is None:
+                if self.grid_shape is None:
+                    raise IOError("Could not load time steps {0:d} to {1:d}".format(c * self.chunk_size,
+                                                                                   (c + 1) * self.chunk_size - 1))
+                values = np.zeros((min(self.chunk_size, self.num_times - c * self.chunk_size),) + self.grid_shape,
+                                  dtype=self.grid_dtype)
+            self.add_chunk(c, values)
+        return values
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            t, spatial_index = index[0], index[1:]
+        else:
+            t, spatial_index = index, ()
+        t = int(t)
+        if t < 0:
+            t += self.num_times
+        if t < 0 or t >= self.num_times:
+            raise IndexError("Time index {0:d} is out of range".format(t))
+        return self.chunk(t // self.chunk_size)[(t % self.chunk_size,) + spatial_index]
+
+    def max(self, axis=0):
+        """
+        Calculate the maximum over time, loading one chunk at a time.
+
+        Args:
+            axis (int): Only the time axis (0) is supported.
+
+        Returns:
+            Array of maximum values in (y, x) dimensions
+        """
+        if axis != 0:
+            raise ValueError("ChunkedData maxima are only calculated over time")
+        period_max = None
+        for c in range(int(np.ceil(self.num_times / self.chunk_size))):
+            chunk_max = self.chunk(c).max(axis=0)
+            period_max = chunk_max if period_max is None else np.maximum(period_max, chunk_max)
+        return period_max
+
+
+class WindowedData(object):
+    """
+    Values of a (time, y, x) grid that were only read within rectangular windows around storm objects. Supports
+    the indexing used by STObject attribute extraction: a time index followed by arrays of row and column indices
+    that fall within one window.
+
+    Attributes:
+        num_times (int): Number of time steps in the full grid
+        windows (dict): Maps each time index to a list of (row start, column start, array) tuples.
+    """
+    def __init__(self, num_times, windows):
+        self.num_times = num_times
+        self.windows = windows
+
+    def __getitem__(self, index):
+        t, i, j = index
+        if t < 0:
+            t += self.num_times
+        i = np.asarray(i)
+        j = np.asarray(j)
+        for i_start, j_start, values in self.windows.get(t, []):
+            if i.min() >= i_start and i.max() < i_start + values.shape[0] and \
+                    j.min() >= j_start and j.max() < j_start + values.shape[1]:
+                return values[i - i_start, j - j_start]
+        raise IndexError("No window at time index {0:d} contains the requested points".format(t))
+
+
+def derived_variable_plan(ensemble_name, variable):
+    """
+    Describe how a derived variable is calculated from variables stored in the model output files.
+
+    Args:
+        ensemble_name (str): Name of the ensemble
+        variable (str): Name of the variable
+
+    Returns:
+        Tuple of the list of input variables, a function of the input arrays in the same order, and the units of the
+        derived variable, or None if the variable is not derived.
+    """
+    if ensemble_name.upper() == "SSEF":
+        if variable[0:2] == "rh":
+            pressure_level = variable[2:]
+            return (["tmp" + pressure_level, "sph" + pressure_level],
+                    lambda tmp, sph: relative_humidity_pressure_level(tmp, sph, float(pressure_level) * 100), "%")
+        elif variable == "melth":
+            return ["hgtsfc", "hgt700", "hgt500", "tmp700", "tmp500"], melting_layer_height, "m"
+    return None
+
+
+def evaluate_derived_variable(formula, input_data, dtype=np.float32, max_elements=2 ** 22):
+    """
+    Evaluate a derived variable formula in chunks of time steps so that the temporary arrays created by the formula
+    stay small. Results are written into a preallocated array.
+
+    Args:
+        formula: Function of the input arrays
+        input_data (list): Arrays of input variables in (time, y, x) dimensions
+        dtype: Data type of the derived array
+        max_elements (int): Maximum number of grid points in each chunk
+
+    Returns:
+        Array of the derived variable, or None if any input is missing.
+    """
+    if any([data is None for data in input_data]):
+        return None
+    derived = np.empty(input_data[0].shape, dtype=dtype)
+    chunk_size = max(1, max_elements // int(np.prod(derived.shape[1:])))
+    for t in range(0, derived.shape[0], chunk_size):
+        derived[t: t + chunk_size] = formula(*[data[t: t + chunk_size] for data in input_data])
+    return derived
+
+
+def load_model_outputs(ensemble_name, member_name, run_date, variables, start_date, end_date, path, map_file,
+                       single_step=True, windows=None, read_threads=1, dtype=np.float32):
+    """
+    Load several variables from one ensemble member run. Variables stored in the same set of files are read
+    together, so each file is opened once instead of once per variable. The inputs of all derived variables are read
+    once along with the other variables, and the derived variables are then evaluated in chunks of time steps.
+    If windows are provided, only the values within each window are read, and the data of each ModelOutput is a
+    WindowedData object.
+
+    Args:
+        ensemble_name (str): Name of the ensemble being loaded.
+        member_name (str): Ensemble member being loaded.
+        run_date (datetime): Date of the initial timestep of the model run.
+        variables (list of str): Variables being loaded.
+        start_date (datetime.datetime): Date of the first timestep loaded.
+        end_date (datetime.datetime): Date of the last timestep loaded.
+        path (str): Path to model output
+        map_file (str): path to data map file
+        single_step (bool): If true, each model timestep is in a separate file
+        windows (dict): Maps each time index to a list of (row start, row end, column start, column end) tuples.
+        read_threads (int): Number of threads reading single time step netCDF files at the same time.
+        dtype: Data type of the loaded arrays.
+
+    Returns:
+        dict mapping each variable to a ModelOutput object with its data loaded.
+    """
+    model_outputs = {}
+    file_groups = {}
+    derived_plans = {}
+    input_variables = []
+    for variable in variables:
+        plan = derived_variable_plan(ensemble_name, variable)
+        if plan is not None and variable not in derived_plans.keys():
+            derived_plans[variable] = plan
+            input_variables.extend([v for v in plan[0] if v not in input_variables])
+    derived_inputs = {}
+    if windows is not None and len(input_variables) > 0:
+        derived_inputs = load_model_outputs(ensemble_name, member_name, run_date, input_variables, start_date,
+                                            end_date, path, map_file, single_step=single_step,
+                                            read_threads=read_threads, dtype=dtype)
+        input_variables = []
+    else:
+        input_variables = [v for v in input_variables if v not in variables]
+    for variable in list(variables) + input_variables:
+        if variable in model_outputs.keys():
+            continue
+        model_outputs[variable] = ModelOutput(ensemble_name, member_name, run_date, variable, start_date, end_date,
+                                              path, map_file, single_step=single_step, read_threads=read_threads,
+                                              dtype=dtype)
+        if variable in derived_plans.keys():
+            continue
+        mg = model_outputs[variable].model_grid()
+        if mg is None:
+            model_outputs[variable].load_data()
+            continue
+        group_key = (type(mg).__name__, tuple(mg.filenames))
+        if group_key not in file_groups.keys():
+            file_groups[group_key] = (mg, [])
+        file_groups[group_key][1].append((variable, mg.variable))
+    for mg, group_variables in file_groups.values():
+        if windows is None:
+            loaded = mg.load_variables([file_variable for variable, file_variable in group_variables])
+        else:
+            loaded = mg.load_windows([file_variable for variable, file_variable in group_variables], windows)
+            for file_variable in loaded.keys():
+                loaded[file_variable] = (WindowedData(len(mg.valid_dates), loaded[file_variable][0]),
+                                         loaded[file_variable][1])
+        mg.close()
+        for variable, file_variable in group_variables:
+            model_outputs[variable].data, model_outputs[variable].units = loaded[file_variable]
+            model_outputs[variable].files_read = [f for f in mg.filenames if f is not None]
+    for variable, (inputs, formula, units) in derived_plans.items():
+        input_outputs = [derived_inputs[v] if v in derived_inputs.keys() else model_outputs[v] for v in inputs]
+        model_outputs[variable].data = evaluate_derived_variable(formula, [o.data for o in input_outputs],
+                                                                 dtype=dtype)
+        model_outputs[variable].units = units
+        model_outputs[variable].files_read = sorted(set([f for o in input_outputs for f in o.files_read]))
+    for variable in input_variables:
+        del model_outputs[variable]
+    return model_outputs
@@ -0,0 +1,254 @@
+import pandas as pd
+import os
+import json
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+from os.path import exists, join, getmtime, getsize, splitext, abspath, dirname
+from hagelslag.util.cache import cache_path
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+class TrackDataCatalog(object):
+    """
+    Catalog of the track table files written by hsdata for one ensemble. Each file is indexed by table, member,
+    and run date from its name, and by the columns stored in it. The directory is only listed again when it changes,
+    and the columns of a file are only read again when its modification time or size changes. The catalog is saved
+    to a JSON file so it can be reused by later training runs. Catalogs are normally saved in a cache directory, so
+    the training data directory is not written to.
+
+    Args:
+        path (str): Directory containing the track table files
+        ensemble_name (str): Name of the ensemble in the file names
+        data_format (str): csv or parquet
+        catalog_file (str): JSON file where the catalog is saved. If None, the catalog is saved in the
+            hagelslag/track_catalogs directory of the user cache directory given by XDG_CACHE_HOME, or ~/.cache.
+
+    Attributes:
+        directory_mtime (float): Modification time of the directory when it was listed
+        files (dict): Maps each track file name to a dict with its table, member, and run date
+        schemas (dict): Maps each file name to a dict with its mtime, size, and column names
+        modified (bool): Whether the catalog has changed since it was loaded or saved
+    """
+    def __init__(self, path, ensemble_name, data_format="csv", catalog_file=None):
+        self.path = path
+        self.ensemble_name = ensemble_name
+        self.data_format = data_format
+        if catalog_file is None:
+            catalog_file = join(cache_path("track_catalogs"), "{0}.track_catalog_{1}_{2}.json".format(
+                abspath(path).strip(os.sep).replace(os.sep, "_"), ensemble_name, data_format))
+        self.catalog_file = catalog_file
+        self.directory_mtime = None
+        self.files = {}
+        self.schemas = {}
+        self.modified = False
+        if exists(self.catalog_file):
+            try:
+                with open(self.catalog_file) as catalog_obj:
+                    catalog = json.load(catalog_obj)
+                self.directory_mtime = catalog["directory_mtime"]
+                self.files = catalog["files"]
+                self.schemas = catalog["schemas"]
+            except (IOError, OSError, ValueError, KeyError):
+                self.directory_mtime = None
+        self.refresh()
+
+    def parse_file_name(self, file_name):
+        """
+        Get the table, member, and run date of a track file from its name, which has the form
+        <prefix><table>_<ensemble>_<member>_<run date>.<format>.
+
+        Args:
+            file_name (str): Name of the file
+
+        Returns:
+            dict with table, member, and run_date (YYYYMMDD-HHMM) keys, or None if the file is not a track table
+            of this ensemble.
+        """
+        base_name, extension = splitext(file_name)
+        if extension != "." + self.data_format:
+            return None
+        for table in ["total", "step"]:
+            marker = "{0}_{1}_".format(table, self.ensemble_name)
+            if marker in base_name:
+                member_date = base_name[base_name.index(marker) + len(marker):].rsplit("_", 1)
+                if len(member_date) < 2:
+                    return None
+                try:
+                    datetime.strptime(member_date[1], "%Y%m%d-%H%M")
+                except ValueError:
+                    return None
+                return {"table": table, "member": member_date[0], "run_date": member_date[1]}
+        return None
+
+    def refresh(self):
+        """
+        List the directory again if it has changed since it was last listed.
+        """
+        directory_mtime = getmtime(self.path)
+        if directory_mtime != self.directory_mtime:
+            files = self.list_files()
+            if files != self.files:
+                self.files = files
+                for file_name in list(self.schemas.keys()):
+                    if file_name not in self.files.keys():
+                        del self.schemas[file_name]
+                self.modified = True
+            self.directory_mtime = directory_mtime
+
+    def list_files(self):
+        """
+        List the track files of this ensemble in the directory. A catalog saved in the directory is not a track file,
+        so it is left out.
+
+        Returns:
+            dict mapping each file name to a dict with its table, member, and run date
+        """
+        files = {}
+        for file_name in os.listdir(self.path):
+            file_info = self.parse_file_name(file_name)
+            if file_info is not None:
+                files[file_name] = file_info
+        return files
+
+    def select(self, table, start_date=None, end_date=None, run_dates=None, members=None):
+        """
+        Find the files of one table within a range of run dates.
+
+        Args:
+            table (str): total or step
+            start_date: First run date included, or None for no lower bound
+            end_date: Last run date included, or None for no upper bound
+            run_dates: List of run dates. If not None, only files with these run dates are included.
+            members: List of ensemble members. If None, all members are included.
+
+        Returns:
+            Sorted list of paths to the matching files
+        """
+        run_date_str = None
+        if run_dates is not None:
+            run_date_str = set([pd.Timestamp(d).strftime("%Y%m%d-%H%M") for d in run_dates])
+        start_str = None if start_date is None else pd.Timestamp(start_date).strftime("%Y%m%d-%H%M")
+        end_str = None if end_date is None else pd.Timestamp(end_date).strftime("%Y%m%d-%H%M")
+        selected = []
+        for file_name, file_info in self.files.items():
+            if file_info["table"] != table:
+                continue
+            if run_date_str is not None and file_info["run_date"] not in run_date_str:
+                continue
+            if (start_str is not None and file_info["run_date"] < start_str) or \
+                    (end_str is not None and file_info["run_date"] > end_str):
+                continue
+            if members is not None and file_info["member"] not in members:
+                continue
+            selected.append(join(self.path, file_name))
+        return sorted(selected)
+
+    def columns(self, filename):
+        """
+        Get the names of the columns in a track file, reading them from the file if they are not in the catalog.
+
+        Args:
+            filename (str): Path to the file
+
+        Returns:
+            list of column names
+        """
+        file_name = os.path.basename(filename)
+        mtime = getmtime(filename)
+        size = getsize(filename)
+        entry = self.schemas.get(file_name, None)
+        if entry is None or entry["mtime"] != mtime or entry["size"] != size:
+            if self.data_format == "parquet":
+                if pq is not None:
+                    file_columns = pq.read_schema(filename).names
+                else:
+                    file_columns = pd.read_parquet(filename).columns.tolist()
+            else:
+                file_columns = pd.read_csv(filename, nrows=0).columns.tolist()
+            entry = {"mtime": mtime, "size": size, "columns": file_columns}
+            self.schemas[file_name] = entry
+            self.modified = True
+        return entry["columns"]
+
+    def read_file(self, filename, columns=None):
+        """
+        Read one track file.
+
+        Args:
+            filename (str): Path to the file
+            columns: Names of the columns to read. Columns missing from the file are ignored. If None, all columns
+                are read.
+
+        Returns:
+            pandas.DataFrame
+        """
+        if columns is not None:
+            file_columns = self.columns(filename)
+            columns = [c for c in file_columns if c in columns]
+        if self.data_format == "parquet":
+            return pd.read_parquet(filename, columns=columns)
+        else:
+            return pd.read_csv(filename, usecols=columns)
+
+    def load(self, filenames, columns=None, num_threads=1):
+        """
+        Read track files and combine them into one table.
+
+        Args:
+            filenames (list): Paths to the files
+            columns: Names of the columns to read. If None, all columns are read.
+            num_threads (int): Number of threads reading files at the same time
+
+        Returns:
+            pandas.DataFrame
+        """
+        if columns is not None:
+            # Read the schemas here so that the catalog is only modified by one thread
+            for filename in filenames:
+                self.columns(filename)
+        if num_threads > 1:
+            pool = ThreadPool(num_threads)
+            tables = pool.map(lambda filename: self.read_file(filename, columns), filenames)
+            pool.close()
+            pool.join()
+        else:
+            tables = [self.read_file(filename, columns) for filename in filenames]
+        return pd.concat(tables, ignore_index=True, sort=True)
+
+    def save(self):
+        """
+        Save the catalog if it has changed. If the catalog file cannot be written, the catalog is only kept in
+        memory.
+        """
+        if not self.modified:
+            return
+        temp_file = self.catalog_file + ".{0:d}".format(os.getpid())
+        try:
+            os.makedirs(dirname(abspath(self.catalog_file)), exist_ok=True)
+            self.write(temp_file)
+            os.replace(temp_file, self.catalog_file)
+            if dirname(abspath(self.catalog_file)) == abspath(self.path):
+                # Moving the catalog into the directory changed the directory mtime. The new mtime is saved if no
+                # track files were added or removed in the meantime, by rewriting the catalog in place, which does
+                # not change the directory mtime again.
+                directory_mtime = getmtime(self.path)
+                if self.list_files() == self.files:
+                    self.directory_mtime = directory_mtime
+                    self.write(self.catalog_file)
+            self.modified = False
+        except (IOError, OSError):
+            print("Could not save track data catalog {0}".format(self.catalog_file))
+
+    def write(self, filename):
+        """
+        Write the catalog to a JSON file.
+
+        Args:
+            filename (str): Name of the file
+        """
+        with open(filename, "w") as catalog_obj:
+            json.dump({"directory_mtime": self.directory_mtime, "files": self.files,
+                       "schemas": self.schemas}, catalog_obj)
@@ -3,6 +3,7 @@ import pandas as pd
 from hagelslag.data.MRMSGrid import MRMSGrid
 from hagelslag.evaluation.ProbabilityMetrics import DistributedReliability, DistributedROC
 from netCDF4 import Dataset
+from hagelslag.util.shared_grids import shared_netcdf_grid
 from datetime import timedelta
 from scipy.signal import fftconvolve
 from skimage.morphology import disk
@@ -118,13 +119,14 @@ class NeighborEvaluator(object):
         Loads lat-lon coordinates from a netCDF file.
         """
         coord_file = Dataset(self.coordinate_file)
-        if "lon" in coord_file.variables.keys():
-            self.coordinates["lon"] = coord_file.variables["lon"][:]
-            self.coordinates["lat"] = coord_file.variables["lat"][:]
-        else:
-            self.coordinates["lon"] = coord_file.variables["XLONG"][0]
-            self.coordinates["lat"] = coord_file.variables["XLAT"][0]
+        wrf_coordinates = "lon" not in coord_file.variables.keys()
         coord_file.close()
+        if wrf_coordinates:
+            self.coordinates["lon"] = shared_netcdf_grid(self.coordinate_file, "XLONG")[0]
+            self.coordinates["lat"] = shared_netcdf_grid(self.coordinate_file, "XLAT")[0]
+        else:
+            self.coordinates["lon"] = shared_netcdf_grid(self.coordinate_file, "lon")
+            self.coordinates["lat"] = shared_netcdf_grid(self.coordinate_file, "lat")
 
     def evaluate_hourly_forecasts(self):
         """
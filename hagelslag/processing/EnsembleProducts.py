@@ -1,5 +1,6 @@
 from hagelslag.data.ModelOutput import ModelOutput
-from hagelslag.util.make_proj_grids import read_arps_map_file, read_ncar_map_file, make_proj_grids
+from hagelslag.util.make_proj_grids import read_arps_map_file, read_ncar_map_file
+from hagelslag.util.shared_grids import shared_proj_grids
 import numpy as np
 import pandas as pd
 from scipy.ndimage import gaussian_filter
@@ -19,7 +20,7 @@ from datetime import timedelta
 try:
     from ncepgrib2 import Grib2Encode
     grib_support = True
-except ImportError("ncepgrib2 not available"):
+except ImportError:
     grib_support = False
 
 
@@ -79,7 +80,7 @@ class EnsembleMemberProduct(object):
                 self.proj_dict, self.grid_dict = read_arps_map_file(self.map_file)
             else:
                 self.proj_dict, self.grid_dict = read_ncar_map_file(self.map_file)
-            self.mapping_data = make_proj_grids(self.proj_dict, self.grid_dict)
+            self.mapping_data = shared_proj_grids(self.proj_dict, self.grid_dict)
         self.units = ""
         self.nc_patches = None
         self.hail_forecast_table = None
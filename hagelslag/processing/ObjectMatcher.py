@@ -1,6 +1,7 @@
 import numpy as np
 from hagelslag.util.munkres import Munkres
 import pandas as pd
+from multiprocessing import Pool, current_process
 
 
 class ObjectMatcher(object):
@@ -37,7 +38,77 @@ class ObjectMatcher(object):
         Returns:
             List of tuples containing (set_a index, set_b index) for each match
         """
-        costs = self.cost_matrix(set_a, set_b, time_a, time_b) * 100
+        return self.assign_objects(self.cost_matrix(set_a, set_b, time_a, time_b))
+
+    def batch_match_objects(self, sets_a, sets_b, time_a, time_b, max_elements=2 ** 22):
+        """
+        Match several independent pairs of object sets, such as the objects from each ensemble member, at
+        particular times. Object features are extracted for all of the sets at once, and vectorized cost components
+        are calculated for batches of stacked sets. Each pair of sets is then assigned separately, so the results
+        are identical to calling match_objects on each pair.
+
+        Args:
+            sets_a: list of lists of STObjects
+            sets_b: list of lists of STObjects with the same length as sets_a
+            time_a: time at which sets_a are being evaluated for matching
+            time_b: time at which sets_b are being evaluated for matching
+            max_elements: Maximum number of stacked object pairs in a single batch.
+
+        Returns:
+            List containing the list of (set_a index, set_b index) tuples for each pair of sets.
+        """
+        all_assignments = [[] for s in range(len(sets_a))]
+        batches = [[]]
+        num_a = 0
+        num_b = 0
+        for g in range(len(sets_a)):
+            if len(sets_a[g]) == 0 or len(sets_b[g]) == 0:
+                continue
+            if len(batches[-1]) > 0 and (num_a + len(sets_a[g])) * (num_b + len(sets_b[g])) > max_elements:
+                batches.append([])
+                num_a = 0
+                num_b = 0
+            batches[-1].append(g)
+            num_a += len(sets_a[g])
+            num_b += len(sets_b[g])
+        for batch in batches:
+            if len(batch) == 0:
+                continue
+            bounds_a = np.cumsum([0] + [len(sets_a[g]) for g in batch])
+            bounds_b = np.cumsum([0] + [len(sets_b[g]) for g in batch])
+            features_a = object_step_features([item for g in batch for item in sets_a[g]], time_a)
+            features_b = object_step_features([item for g in batch for item in sets_b[g]], time_b)
+            distances = np.zeros((bounds_a[-1], bounds_b[-1], len(self.cost_function_components)))
+            for c, component in enumerate(self.cost_function_components):
+                if component in vectorized_cost_functions.keys():
+                    distances[:, :, c] = vectorized_cost_functions[component](features_a, features_b,
+                                                                             self.max_values[c])
+                else:
+                    for b in range(len(batch)):
+                        index_a = np.arange(bounds_a[b], bounds_a[b + 1])
+                        index_b = np.arange(bounds_b[b], bounds_b[b + 1])
+                        distances[bounds_a[b]:bounds_a[b + 1], bounds_b[b]:bounds_b[b + 1], c] = \
+                            step_cost_array(component, subset_features(features_a, index_a),
+                                            subset_features(features_b, index_b), self.max_values[c])
+            for b, g in enumerate(batch):
+                block = distances[bounds_a[b]:bounds_a[b + 1], bounds_b[b]:bounds_b[b + 1]]
+                all_assignments[g] = self.assign_objects(np.sum(self.weights * block, axis=2))
+        return all_assignments
+
+    def assign_objects(self, costs):
+        """
+        Find the optimal 1:1 assignments from a cost matrix with the Hungarian method. Pairs with a cost of 1 or
+        greater are not assigned.
+
+        Args:
+            costs: Array of shape [len(set_a), len(set_b)] from cost_matrix.
+
+        Returns:
+            List of tuples containing (set_a index, set_b index) for each match
+        """
+        if costs.size == 0:
+            return []
+        costs = costs * 100
         min_row_costs = costs.min(axis=1)
         min_col_costs = costs.min(axis=0)
         good_rows = np.where(min_row_costs < 100)[0]
@@ -54,7 +125,8 @@ class ObjectMatcher(object):
 
     def cost_matrix(self, set_a, set_b, time_a, time_b):
         """
-        Calculates the costs (distances) between the items in set a and set b at the specified times.
+        Calculates the costs (distances) between the items in set a and set b at the specified times. Components
+        with an entry in vectorized_cost_functions are evaluated on all pairs at once from cached object geometry.
 
         Args:
             set_a: List of STObjects
@@ -66,10 +138,14 @@ class ObjectMatcher(object):
             A numpy array with shape [len(set_a), len(set_b)] containing the cost matrix between the items in set a
             and the items in set b.
         """
-        costs = np.zeros((len(set_a), len(set_b)))
-        for a, item_a in enumerate(set_a):
-            for b, item_b in enumerate(set_b):
-                costs[a, b] = self.total_cost_function(item_a, item_b, time_a, time_b)
+        if len(set_a) == 0 or len(set_b) == 0:
+            return np.zeros((len(set_a), len(set_b)))
+        features_a = object_step_features(set_a, time_a)
+        features_b = object_step_features(set_b, time_b)
+        distances = np.zeros((len(set_a), len(set_b), len(self.cost_function_components)))
+        for c, component in enumerate(self.cost_function_components):
+            distances[:, :, c] = step_cost_array(component, features_a, features_b, self.max_values[c])
+        costs = np.sum(self.weights * distances, axis=2)
         return costs
 
     def total_cost_function(self, item_a, item_b, time_a, time_b):
@@ -131,13 +207,13 @@ class TrackMatcher(object):
         assignments = []
         if len(good_rows) > 0 and len(good_cols) > 0:
             if closest_matches:
-                b_matches = costs[np.meshgrid(good_rows, good_cols, indexing='ij')].argmin(axis=1)
+                b_matches = costs[np.ix_(good_rows, good_cols)].argmin(axis=1)
                 a_matches = np.arange(b_matches.size)
                 initial_assignments = [(good_rows[a_matches[x]], good_cols[b_matches[x]])
                                        for x in range(b_matches.size)]
             else:
                 munk = Munkres()
-                initial_assignments = munk.compute(costs[np.meshgrid(good_rows, good_cols, indexing='ij')].tolist())
+                initial_assignments = munk.compute(costs[np.ix_(good_rows, good_cols)].tolist())
                 initial_assignments = [(good_rows[x[0]], good_cols[x[1]]) for x in initial_assignments]
             for a in initial_assignments:
                 if costs[a[0], a[1]] < 100:
@@ -145,27 +221,73 @@ class TrackMatcher(object):
         return assignments
 
     def raw_cost_matrix(self, set_a, set_b):
+        cost_matrix = self.component_cost_matrix(set_a, set_b)
+        for c in range(len(self.cost_function_components)):
+            cost_matrix[:, :, c] *= self.max_values[c]
+        return cost_matrix
+
+    def component_cost_matrix(self, set_a, set_b):
+        """
+        Calculate each cost function component between every pair of tracks in set a and set b. Summaries of each
+        track are calculated once, and components with an entry in vectorized_track_cost_functions are evaluated
+        on all track pairs with array operations. Other components are evaluated one pair at a time.
+
+        Args:
+            set_a: List of STObjects
+            set_b: List of STObjects
+
+        Returns:
+            Array of shape [len(set_a), len(set_b), number of components] with scaled distances.
+        """
         cost_matrix = np.zeros((len(set_a), len(set_b), len(self.cost_function_components)))
-        for (a, b, c), x in np.ndenumerate(cost_matrix):
-            cost_matrix[a, b, c] = self.cost_function_components[c](set_a[a],
-                                                                    set_b[b], self.max_values[c]) * self.max_values[c]
+        if len(set_a) == 0 or len(set_b) == 0:
+            return cost_matrix
+        summary_a = track_summaries(set_a)
+        summary_b = track_summaries(set_b)
+        for c, component in enumerate(self.cost_function_components):
+            if component in vectorized_track_cost_functions.keys():
+                cost_matrix[:, :, c] = vectorized_track_cost_functions[component](summary_a, summary_b,
+                                                                                 self.max_values[c])
+            else:
+                for a, item_a in enumerate(set_a):
+                    for b, item_b in enumerate(set_b):
+                        cost_matrix[a, b, c] = component(item_a, item_b, self.max_values[c])
         return cost_matrix
 
-    def neighbor_matches(self, set_a, set_b):
-        costs = self.track_cost_matrix(set_a, set_b)
-        all_neighbors = []
-        for i in range(len(set_a)):
-            neighbors = np.where(costs[i] < 1)[0]
-            sorted_neighbors = neighbors[costs[i][neighbors].argsort()]
-            if len(neighbors) > 0:
-                all_neighbors.append((i, tuple(sorted_neighbors)))
-        return all_neighbors
+    def neighbor_matches(self, set_a, set_b, num_workers=1):
+        """
+        Find every track in set b with a total cost below 1 for each track in set a. The cost matrix is thresholded
+        and sorted with array operations, and the neighbors of each track are sliced from the sorted pairs. Large
+        sets can be split into blocks of set a that are processed in parallel. Daemonic worker processes, such as
+        the task scheduler workers, cannot start a pool of their own and find the neighbors serially.
+
+        Args:
+            set_a: List of STObjects
+            set_b: List of STObjects
+            num_workers: Number of processes used to calculate neighbors for blocks of set a.
+
+        Returns:
+            List of tuples containing the set a index and a tuple of set b indices sorted by increasing cost. Tracks
+            without any neighbors are not included.
+        """
+        if num_workers > 1 and len(set_a) > num_workers and not current_process().daemon:
+            pool = Pool(num_workers)
+            block_bounds = np.linspace(0, len(set_a), num_workers + 1).astype(int)
+            results = [pool.apply_async(block_neighbor_matches, (self, set_a[block_bounds[b]:block_bounds[b + 1]],
+                                                                 set_b, block_bounds[b]))
+                       for b in range(num_workers)]
+            pool.close()
+            pool.join()
+            all_neighbors = []
+            for result in results:
+                all_neighbors.extend(result.get())
+            return all_neighbors
+        return block_neighbor_matches(self, set_a, set_b)
 
     def track_cost_matrix(self, set_a, set_b):
-        costs = np.zeros((len(set_a), len(set_b)))
-        for a, item_a in enumerate(set_a):
-            for b, item_b in enumerate(set_b):
-                costs[a, b] = self.track_cost_function(item_a, item_b)
+        distances = self.component_cost_matrix(set_a, set_b)
+        costs = np.sum(self.weights * distances, axis=2)
+        costs[~np.all(distances < 1, axis=2)] = 1.0
         return costs
 
     def track_cost_function(self, item_a, item_b):
@@ -179,6 +301,28 @@ class TrackMatcher(object):
         return total_distance
 
 
+def block_neighbor_matches(track_matcher, set_a, set_b, offset=0):
+    """
+    Find the neighbors of a block of tracks for TrackMatcher.neighbor_matches.
+
+    Args:
+        track_matcher: TrackMatcher object
+        set_a: List of STObjects in the block
+        set_b: List of STObjects
+        offset: Index of the first track of the block within the full set a.
+
+    Returns:
+        List of tuples containing the set a index and a tuple of sorted set b indices.
+    """
+    costs = track_matcher.track_cost_matrix(set_a, set_b)
+    rows, cols = np.nonzero(costs < 1)
+    pair_order = np.lexsort((costs[rows, cols], rows))
+    rows = rows[pair_order]
+    cols = cols[pair_order]
+    row_bounds = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(set_a)))])
+    return [(int(i) + offset, tuple(cols[row_bounds[i]:row_bounds[i + 1]])) for i in np.unique(rows)]
+
+
 class TrackStepMatcher(object):
     """
     Determine if each step in a track is in close proximity to steps from another set of tracks
@@ -190,7 +334,8 @@ class TrackStepMatcher(object):
     def match(self, set_a, set_b):
         """
         For each step in each track from set_a, identify all steps in all tracks from set_b that meet all
-        cost function criteria
+        cost function criteria. Costs are only calculated between blocks of steps whose valid times can satisfy
+        the time_distance constraint, if one is included among the cost function components.
         
         Args:
             set_a: List of STObjects
@@ -199,43 +344,60 @@ class TrackStepMatcher(object):
         Returns:
             track_pairings: pandas.DataFrame 
         """
-        track_step_matches = [[] * len(set_a)]
-
-        costs = self.cost_matrix(set_a, set_b)
-        valid_costs = np.all(costs < 1, axis=2)
-        set_a_matches, set_b_matches = np.where(valid_costs)
-        s = 0
-        track_pairings = pd.DataFrame(index=np.arange(costs.shape[0]),
-                                      columns=["Track", "Step", "Time", "Matched", "Pairings"], dtype=object)
-        set_b_info = []
-        for trb, track_b in enumerate(set_b):
-            for t, time in enumerate(track_b.times):
-                set_b_info.append((trb, t))
-        set_b_info_arr = np.array(set_b_info, dtype=int)
-        for tr, track_a in enumerate(set_a):
-            for t, time in enumerate(track_a.times):
-                track_pairings.loc[s, ["Track", "Step", "Time"]] = [tr, t, time]
-                track_pairings.loc[s, "Matched"] = 1 if np.count_nonzero(set_a_matches == s) > 0 else 0
-                if track_pairings.loc[s, "Matched"] == 1:
-                    track_pairings.loc[s, "Pairings"] = set_b_info_arr[set_b_matches[set_a_matches == s]]
-                else:
-                    track_pairings.loc[s, "Pairings"] = np.array([])
-                s += 1
+        steps_a = track_step_features(set_a)
+        steps_b = track_step_features(set_b)
+        num_steps_a = steps_a["time"].size
+        max_time_diff = None
+        for c, component in enumerate(self.cost_function_components):
+            if component is time_distance:
+                max_time_diff = self.max_values[c] if max_time_diff is None else min(max_time_diff,
+                                                                                     self.max_values[c])
+        a_rows = []
+        b_cols = []
+        for time_a in np.unique(steps_a["time"]):
+            block_a = np.where(steps_a["time"] == time_a)[0]
+            if max_time_diff is None:
+                block_b = np.arange(steps_b["time"].size)
+            else:
+                block_b = np.where(np.abs(steps_b["time"] - time_a) < max_time_diff)[0]
+            if block_b.size == 0:
+                continue
+            valid = np.ones((block_a.size, block_b.size), dtype=bool)
+            for c, component in enumerate(self.cost_function_components):
+                valid &= step_cost_array(component, subset_features(steps_a, block_a),
+                                         subset_features(steps_b, block_b), self.max_values[c]) < 1
+            valid_a, valid_b = np.where(valid)
+            a_rows.append(block_a[valid_a])
+            b_cols.append(block_b[valid_b])
+        if len(a_rows) > 0:
+            a_rows = np.concatenate(a_rows)
+            b_cols = np.concatenate(b_cols)
+        else:
+            a_rows = np.array([], dtype=int)
+            b_cols = np.array([], dtype=int)
+        pair_order = np.lexsort((b_cols, a_rows))
+        a_rows = a_rows[pair_order]
+        b_cols = b_cols[pair_order]
+        set_b_info_arr = np.vstack((steps_b["track"], steps_b["step"])).T
+        match_counts = np.bincount(a_rows, minlength=num_steps_a)
+        split_points = np.cumsum(match_counts)[:-1]
+        pairings = np.empty(num_steps_a, dtype=object)
+        for s, step_pairs in enumerate(np.split(set_b_info_arr[b_cols], split_points)):
+            pairings[s] = step_pairs if step_pairs.shape[0] > 0 else np.array([])
+        track_pairings = pd.DataFrame({"Track": steps_a["track"],
+                                       "Step": steps_a["step"],
+                                       "Time": steps_a["time"],
+                                       "Matched": np.where(match_counts > 0, 1, 0),
+                                       "Pairings": pairings},
+                                      columns=["Track", "Step", "Time", "Matched", "Pairings"])
         return track_pairings
 
     def cost_matrix(self, set_a, set_b):
-        num_steps_a = np.sum([track_a.times.size for track_a in set_a])
-        num_steps_b = np.sum([track_b.times.size for track_b in set_b])
-        cost_matrix = np.zeros((num_steps_a, num_steps_b, len(self.cost_function_components)))
-        a_i = 0
-        for a, track_a in enumerate(set_a):
-            for time_a in track_a.times:
-                b_i = 0
-                for b, track_b in enumerate(set_b):
-                    for time_b in track_b.times:
-                        cost_matrix[a_i, b_i] = self.cost(track_a, time_a, track_b, time_b)
-                        b_i += 1
-                a_i += 1
+        steps_a = track_step_features(set_a)
+        steps_b = track_step_features(set_b)
+        cost_matrix = np.zeros((steps_a["time"].size, steps_b["time"].size, len(self.cost_function_components)))
+        for c, component in enumerate(self.cost_function_components):
+            cost_matrix[:, :, c] = step_cost_array(component, steps_a, steps_b, self.max_values[c])
         return cost_matrix
 
     def cost(self, track_a, time_a, track_b, time_b):
@@ -243,6 +405,165 @@ class TrackStepMatcher(object):
                          for c, cost_func in enumerate(self.cost_function_components)])
 
 
+geometry_keys = ["x", "y", "area", "max_intensity", "ellipse_x", "ellipse_y", "ellipse_a", "ellipse_b",
+                 "ellipse_theta"]
+
+
+def track_step_features(tracks):
+    """
+    Flatten every timestep of every STObject track into arrays for vectorized cost calculations.
+
+    Args:
+        tracks: List of STObjects
+
+    Returns:
+        dict of arrays with one entry per track step in track order.
+    """
+    num_steps = np.array([track.times.size for track in tracks], dtype=int)
+    features = dict(items=[track for track in tracks for t in range(track.times.size)],
+                    track=np.repeat(np.arange(len(tracks)), num_steps),
+                    step=np.concatenate([np.arange(n) for n in num_steps]) if len(tracks) > 0 else
+                    np.array([], dtype=int))
+    if len(tracks) > 0:
+        features["time"] = np.concatenate([track.times for track in tracks])
+        features["u"] = np.concatenate([np.asarray(track.u, dtype=float) for track in tracks])
+        features["v"] = np.concatenate([np.asarray(track.v, dtype=float) for track in tracks])
+        for key in geometry_keys:
+            features[key] = np.concatenate([track.step_geometry()[key] for track in tracks])
+    else:
+        for key in ["time", "u", "v"] + geometry_keys:
+            features[key] = np.array([])
+    return features
+
+
+def object_step_features(items, time):
+    """
+    Extract the geometry of each STObject at a single time into arrays for vectorized cost calculations.
+
+    Args:
+        items: List of STObjects
+        time: Time at which every object is evaluated.
+
+    Returns:
+        dict of arrays with one entry per object.
+    """
+    steps = np.array([np.where(item.times == time)[0][0] for item in items], dtype=int)
+    features = dict(items=list(items),
+                    track=np.arange(len(items)),
+                    step=steps,
+                    time=np.ones(len(items)) * time,
+                    u=np.array([item.u[s] for item, s in zip(items, steps)], dtype=float),
+                    v=np.array([item.v[s] for item, s in zip(items, steps)], dtype=float))
+    geometries = [item.step_geometry() for item in items]
+    for key in geometry_keys:
+        features[key] = np.array([geometry[key][s] for geometry, s in zip(geometries, steps)])
+    return features
+
+
+def subset_features(features, index):
+    """
+    Select a subset of the entries in a feature dictionary from object_step_features or track_step_features.
+
+    Args:
+        features: dict of feature arrays
+        index: integer array of entries to keep
+
+    Returns:
+        dict of feature arrays
+    """
+    subset = {}
+    for key, value in features.items():
+        if key == "items":
+            subset[key] = [value[i] for i in index]
+        else:
+            subset[key] = value[index]
+    return subset
+
+
+def track_summaries(tracks):
+    """
+    Summarize the trajectory, timing, and area of each STObject track in padded arrays for vectorized track cost
+    calculations. Steps beyond the end of a track are filled with NaN.
+
+    Args:
+        tracks: List of STObjects
+
+    Returns:
+        dict of arrays with one row per track.
+    """
+    num_steps = np.array([track.times.size for track in tracks], dtype=int)
+    max_steps = num_steps.max()
+    summary = dict(num_steps=num_steps,
+                   valid=np.arange(max_steps)[None, :] < num_steps[:, None],
+                   trajectory=np.full((len(tracks), max_steps, 2), np.nan),
+                   times=np.full((len(tracks), max_steps), np.nan),
+                   start_time=np.array([track.times[0] for track in tracks], dtype=float),
+                   end_time=np.array([track.times[-1] for track in tracks], dtype=float),
+                   duration=num_steps.astype(float),
+                   mean_area=np.zeros(len(tracks)))
+    for t, track in enumerate(tracks):
+        geometry = track.step_geometry()
+        summary["trajectory"][t, :num_steps[t], 0] = geometry["x"]
+        summary["trajectory"][t, :num_steps[t], 1] = geometry["y"]
+        summary["times"][t, :num_steps[t]] = track.times
+        summary["mean_area"][t] = geometry["area"].mean()
+    return summary
+
+
+def mean_min_step_distance_array(values_a, valid_a, values_b, valid_b, max_elements=2 ** 22):
+    """
+    Calculate the square root of the summed mean minimum squared distances between the steps of every pair of tracks.
+    Rows of set a are processed in chunks to limit the size of the temporary step distance arrays.
+
+    Args:
+        values_a: Array of shape [tracks in a, steps, dimensions] padded with NaN.
+        valid_a: Boolean array of shape [tracks in a, steps] indicating real steps.
+        values_b: Array of shape [tracks in b, steps, dimensions] padded with NaN.
+        valid_b: Boolean array of shape [tracks in b, steps] indicating real steps.
+        max_elements: Maximum number of step pair distances held in memory at once.
+
+    Returns:
+        Array of shape [tracks in a, tracks in b]
+    """
+    distances = np.zeros((values_a.shape[0], values_b.shape[0]))
+    pair_size = values_b.shape[0] * values_a.shape[1] * values_b.shape[1]
+    chunk_size = int(max(1, max_elements // max(pair_size, 1)))
+    count_a = valid_a.sum(axis=1)
+    count_b = valid_b.sum(axis=1)
+    for start in range(0, values_a.shape[0], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        step_dist = np.sum((values_a[chunk, None, :, None, :] - values_b[None, :, None, :, :]) ** 2, axis=-1)
+        step_dist[~(valid_a[chunk, None, :, None] & valid_b[None, :, None, :])] = np.inf
+        min_b = np.where(valid_b[None, :, :], step_dist.min(axis=2), 0).sum(axis=2) / count_b[None, :]
+        min_a = np.where(valid_a[chunk, None, :], step_dist.min(axis=3), 0).sum(axis=2) / count_a[chunk, None]
+        distances[chunk] = np.sqrt(min_b + min_a)
+    return distances
+
+
+def step_cost_array(component, features_a, features_b, max_value):
+    """
+    Calculate a single cost function component between every pair of object steps in features_a and features_b.
+    Components with a vectorized equivalent in vectorized_cost_functions are evaluated with array operations. Other
+    components are evaluated one pair at a time.
+
+    Args:
+        component: Cost function used by ObjectMatcher or TrackStepMatcher
+        features_a: dict of feature arrays from object_step_features or track_step_features
+        features_b: dict of feature arrays from object_step_features or track_step_features
+        max_value: Maximum distance value used as scaling value and upper constraint.
+
+    Returns:
+        Array of shape [number of steps in a, number of steps in b] with distance values between 0 and 1.
+    """
+    if component in vectorized_cost_functions.keys():
+        return vectorized_cost_functions[component](features_a, features_b, max_value)
+    costs = np.zeros((features_a["time"].size, features_b["time"].size))
+    for a, item_a in enumerate(features_a["items"]):
+        for b, item_b in enumerate(features_b["items"]):
+            costs[a, b] = component(item_a, features_a["time"][a], item_b, features_b["time"][b], max_value)
+    return costs
+
+
 def centroid_distance(item_a, time_a, item_b, time_b, max_value):
     """
     Euclidean distance between the centroids of item_a and item_b.
@@ -310,7 +631,8 @@ def closest_distance(item_a, time_a, item_b, time_b, max_value):
 
 def ellipse_distance(item_a, time_a, item_b, time_b, max_value):
     """
-    Calculate differences in the properties of ellipses fitted to each object.
+    Mean distance between the major axis endpoints of the second-moment ellipses fitted to each object. The
+    endpoints are paired in the orientation that gives the smaller distance.
 
     Args:
         item_a: STObject from the first set in ObjectMatcher
@@ -328,7 +650,8 @@ def ellipse_distance(item_a, time_a, item_b, time_b, max_value):
     ends_a = ell_a.predict_xy(ts)
     ends_b = ell_b.predict_xy(ts)
     distances = np.sqrt((ends_a[:, 0:1] - ends_b[:, 0:1].T) ** 2 + (ends_a[:, 1:] - ends_b[:, 1:].T) ** 2)
-    return np.minimum(distances[0, 1], max_value) / float(max_value)
+    end_distance = 0.5 * min(distances[0, 0] + distances[1, 1], distances[0, 1] + distances[1, 0])
+    return np.minimum(end_distance, max_value) / float(max_value)
 
 
 def nonoverlap(item_a, time_a, item_b, time_b, max_value):
@@ -492,3 +815,132 @@ def mean_area_distance(item_a, item_b, max_value):
     mean_area_a = np.mean([item_a.size(t) for t in item_a.times])
     mean_area_b = np.mean([item_b.size(t) for t in item_b.times])
     return np.abs(mean_area_a - mean_area_b) / float(max_value)
+
+
+def centroid_distance_array(features_a, features_b, max_value):
+    """
+    Vectorized centroid_distance between all pairs of object steps.
+    """
+    distances = np.sqrt((features_a["x"][:, None] - features_b["x"][None, :]) ** 2 +
+                        (features_a["y"][:, None] - features_b["y"][None, :]) ** 2)
+    return np.minimum(distances, max_value) / float(max_value)
+
+
+def time_distance_array(features_a, features_b, max_value):
+    """
+    Vectorized time_distance between all pairs of object steps.
+    """
+    return np.minimum(np.abs(features_b["time"][None, :] - features_a["time"][:, None]), max_value) / float(max_value)
+
+
+def shifted_centroid_distance_array(features_a, features_b, max_value):
+    """
+    Vectorized shifted_centroid_distance between all pairs of object steps.
+    """
+    b_later = features_a["time"][:, None] < features_b["time"][None, :]
+    ax = features_a["x"][:, None] - np.where(b_later, 0, features_a["u"][:, None])
+    ay = features_a["y"][:, None] - np.where(b_later, 0, features_a["v"][:, None])
+    bx = features_b["x"][None, :] - np.where(b_later, features_b["u"][None, :], 0)
+    by = features_b["y"][None, :] - np.where(b_later, features_b["v"][None, :], 0)
+    return np.minimum(np.sqrt((ax - bx) ** 2 + (ay - by) ** 2), max_value) / float(max_value)
+
+
+def max_intensity_array(features_a, features_b, max_value):
+    """
+    Vectorized max_intensity between all pairs of object steps.
+    """
+    diff = np.abs(features_a["max_intensity"][:, None] - features_b["max_intensity"][None, :])
+    return np.minimum(diff, max_value) / float(max_value)
+
+
+def area_difference_array(features_a, features_b, max_value):
+    """
+    Vectorized area_difference between all pairs of object steps.
+    """
+    diff = np.abs(features_a["area"][:, None] - features_b["area"][None, :])
+    return np.minimum(diff, max_value) / float(max_value)
+
+
+def ellipse_distance_array(features_a, features_b, max_value):
+    """
+    Vectorized ellipse_distance between all pairs of object steps.
+    """
+    ends = []
+    for features in [features_a, features_b]:
+        dx = features["ellipse_a"] * np.cos(features["ellipse_theta"])
+        dy = features["ellipse_a"] * np.sin(features["ellipse_theta"])
+        ends.append([(features["ellipse_x"] + dx, features["ellipse_y"] + dy),
+                     (features["ellipse_x"] - dx, features["ellipse_y"] - dy)])
+    distances = [[np.sqrt((ends[0][e_a][0][:, None] - ends[1][e_b][0][None, :]) ** 2 +
+                          (ends[0][e_a][1][:, None] - ends[1][e_b][1][None, :]) ** 2) for e_b in range(2)]
+                 for e_a in range(2)]
+    end_distance = 0.5 * np.minimum(distances[0][0] + distances[1][1], distances[0][1] + distances[1][0])
+    return np.minimum(end_distance, max_value) / float(max_value)
+
+
+vectorized_cost_functions = {centroid_distance: centroid_distance_array,
+                             time_distance: time_distance_array,
+                             shifted_centroid_distance: shifted_centroid_distance_array,
+                             max_intensity: max_intensity_array,
+                             area_difference: area_difference_array,
+                             ellipse_distance: ellipse_distance_array}
+
+
+def mean_minimum_centroid_distance_array(summary_a, summary_b, max_value):
+    """
+    Vectorized mean_minimum_centroid_distance between all pairs of tracks.
+    """
+    distances = mean_min_step_distance_array(summary_a["trajectory"], summary_a["valid"],
+                                             summary_b["trajectory"], summary_b["valid"])
+    return np.minimum(distances, max_value) / float(max_value)
+
+
+def mean_min_time_distance_array(summary_a, summary_b, max_value):
+    """
+    Vectorized mean_min_time_distance between all pairs of tracks.
+    """
+    distances = mean_min_step_distance_array(summary_a["times"][:, :, None], summary_a["valid"],
+                                             summary_b["times"][:, :, None], summary_b["valid"])
+    return np.minimum(distances, max_value) / float(max_value)
+
+
+def start_centroid_distance_array(summary_a, summary_b, max_value):
+    """
+    Vectorized start_centroid_distance between all pairs of tracks.
+    """
+    start_a = summary_a["trajectory"][:, 0]
+    start_b = summary_b["trajectory"][:, 0]
+    distances = np.sqrt((start_a[:, None, 0] - start_b[None, :, 0]) ** 2 +
+                        (start_a[:, None, 1] - start_b[None, :, 1]) ** 2)
+    return np.minimum(distances, max_value) / float(max_value)
+
+
+def start_time_distance_array(summary_a, summary_b, max_value):
+    """
+    Vectorized start_time_distance between all pairs of tracks.
+    """
+    diff = np.abs(summary_a["start_time"][:, None] - summary_b["start_time"][None, :])
+    return np.minimum(diff, max_value) / float(max_value)
+
+
+def duration_distance_array(summary_a, summary_b, max_value):
+    """
+    Vectorized duration_distance between all pairs of tracks.
+    """
+    diff = np.abs(summary_a["duration"][:, None] - summary_b["duration"][None, :])
+    return np.minimum(diff, max_value) / float(max_value)
+
+
+def mean_area_distance_array(summary_a, summary_b, max_value):
+    """
+    Vectorized mean_area_distance between all pairs of tracks.
+    """
+    return np.abs(summary_a["mean_area"][:, None] - summary_b["mean_area"][None, :]) / float(max_value)
+
+
+vectorized_track_cost_functions = {mean_minimum_centroid_distance: mean_minimum_centroid_distance_array,
+                                   mean_min_time_distance: mean_min_time_distance_array,
+                                   start_centroid_distance: start_centroid_distance_array,
+                                   start_time_distance: start_time_distance_array,
+                                   duration_distance: duration_distance_array,
+                                   mean_area_distance: mean_area_distance_array}
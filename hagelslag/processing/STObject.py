@@ -1,5 +1,5 @@
 import numpy as np
-from skimage.measure import regionprops
+from skimage.measure import regionprops, EllipseModel
 from skimage.segmentation import find_boundaries
 from skimage.morphology import convex_hull_image
 import json
@@ -66,6 +66,7 @@ class STObject(object):
         self.times = np.arange(start_time, end_time + step, step)
         self.attributes = {}
         self.observations = None
+        self.geometry = None
 
     @property
     def __str__(self):
@@ -151,6 +152,76 @@ class STObject(object):
             traj[:, t] = self.center_of_mass(time)
         return traj
 
+    def step_geometry(self):
+        """
+        Calculates the center of mass, area, maximum intensity, and second-moment ellipse of the object at each
+        timestep. The results are cached on the object and extended along with the object.
+
+        Returns:
+            dict of arrays with one value per timestep for the keys "x", "y", "area", "max_intensity", and the
+            ellipse parameters "ellipse_x", "ellipse_y", "ellipse_a", "ellipse_b", and "ellipse_theta".
+        """
+        if getattr(self, "geometry", None) is None:
+            keys = ["x", "y", "area", "max_intensity", "ellipse_x", "ellipse_y", "ellipse_a", "ellipse_b",
+                    "ellipse_theta"]
+            geometry = dict([(key, np.zeros(self.times.size)) for key in keys])
+            for t, time in enumerate(self.times):
+                geometry["x"][t], geometry["y"][t] = self.center_of_mass(time)
+                geometry["area"][t] = self.masks[t].sum()
+                geometry["max_intensity"][t] = self.timesteps[t].max()
+                (geometry["ellipse_x"][t], geometry["ellipse_y"][t], geometry["ellipse_a"][t],
+                 geometry["ellipse_b"][t], geometry["ellipse_theta"][t]) = self.ellipse_parameters(t)
+            self.geometry = geometry
+        return self.geometry
+
+    def ellipse_parameters(self, ti):
+        """
+        Fit an ellipse to the object mask at a timestep from the second moments of the masked pixel coordinates.
+        The semi-axis lengths follow the regionprops convention of twice the square root of the covariance
+        eigenvalues.
+
+        Args:
+            ti: Index of the timestep within the object.
+
+        Returns:
+            Tuple of the center x and y coordinates, semi-major axis, semi-minor axis, and the angle of the major
+            axis from the x-axis in radians.
+        """
+        valid = self.masks[ti] != 0
+        if not np.any(valid):
+            valid = np.ones(self.masks[ti].shape, dtype=bool)
+        xs = self.x[ti][valid].astype(float)
+        ys = self.y[ti][valid].astype(float)
+        center_x = xs.sum() / xs.size
+        center_y = ys.sum() / ys.size
+        xs -= center_x
+        ys -= center_y
+        var_x = xs.dot(xs) / xs.size
+        var_y = ys.dot(ys) / ys.size
+        cov_xy = xs.dot(ys) / xs.size
+        spread = np.sqrt(((var_x - var_y) / 2.0) ** 2 + cov_xy ** 2)
+        semi_major = 2 * np.sqrt(max((var_x + var_y) / 2.0 + spread, 0))
+        semi_minor = 2 * np.sqrt(max((var_x + var_y) / 2.0 - spread, 0))
+        theta = 0.5 * np.arctan2(2 * cov_xy, var_x - var_y)
+        return center_x, center_y, semi_major, semi_minor, theta
+
+    def get_ellipse_model(self, time):
+        """
+        Get the second-moment ellipse of the object at a given time.
+
+        Args:
+            time: Time value being queried.
+
+        Returns:
+            skimage.measure.EllipseModel with params (xc, yc, a, b, theta).
+        """
+        ti = np.where(self.times == time)[0][0]
+        geometry = self.step_geometry()
+        ellipse = EllipseModel()
+        ellipse.params = tuple(geometry[key][ti] for key in ["ellipse_x", "ellipse_y", "ellipse_a", "ellipse_b",
+                                                             "ellipse_theta"])
+        return ellipse
+
     def get_corner(self, time):
         """
         Gets the corner array indices of the STObject at a given time that corresponds 
@@ -218,6 +289,10 @@ class STObject(object):
         self.times = np.arange(self.start_time, self.end_time + self.step, self.step)
         self.u = np.concatenate((self.u, step.u))
         self.v = np.concatenate((self.v, step.v))
+        if getattr(self, "geometry", None) is not None:
+            step_geometry = step.step_geometry()
+            self.geometry = dict([(key, np.concatenate((value, step_geometry[key])))
+                                  for key, value in self.geometry.items()])
         for attr in self.attributes.keys():
             if attr in step.attributes.keys():
                 self.attributes[attr].extend(step.attributes[attr])
@@ -3,6 +3,7 @@ import pandas as pd
 import pickle
 import json
 import os
+import hashlib
 from sklearn.decomposition import PCA
 from copy import deepcopy
 from glob import glob
@@ -11,8 +12,27 @@ from sklearn.linear_model import LinearRegression
 from hagelslag.evaluation.ProbabilityMetrics import DistributedROC
 from os.path import join
 from hagelslag.util.make_proj_grids import read_arps_map_file, read_ncar_map_file
+from hagelslag.data.TrackDataCatalog import TrackDataCatalog
 from sklearn.model_selection import KFold
 
+
+def read_track_table(filename, columns=None):
+    """
+    Read a track table written by hsdata as a csv or parquet file.
+
+    Args:
+        filename (str): Path to the table file. Files ending in .parquet are read as parquet and others as csv.
+        columns (list): Names of the columns to read. If None, all columns are read.
+
+    Returns:
+        pandas.DataFrame
+    """
+    if filename.endswith(".parquet"):
+        return pd.read_parquet(filename, columns=columns)
+    else:
+        return pd.read_csv(filename, usecols=columns)
+
+
 class TrackModeler(object):
     """
     TrackModeler is designed to load and process data generated by TrackProcessing and then use that data to fit
@@ -54,42 +74,50 @@ class TrackModeler(object):
             self.proj_dict, self.grid_dict = read_ncar_map_file(self.map_file)   
         return
 
-    def load_data(self, mode="train", format="csv"):
+    def load_data(self, mode="train", format="csv", columns=None, num_threads=1, cache_path=None):
         """
         Load data from flat data files containing total track information and information about each timestep.
         The two sets are combined using merge operations on the Track IDs. Additional member information is gathered
-        from the appropriate member file.
+        from the appropriate member file. Files are found through a TrackDataCatalog of the data directory.
 
         Args:
             mode: "train" or "forecast"
-            format:  file format being used. Default is "csv"
+            format:  file format being used, "csv" or "parquet". Default is "csv"
+            columns: Names of the timestep columns to load. The columns used to merge the tables are always loaded.
+                If None, all columns are loaded.
+            num_threads: Number of threads reading files at the same time
+            cache_path: Directory where the merged tables are cached. The cache is reused until the selected files,
+                the member file, or the columns change. If None, the tables are not cached.
         """
         if mode in self.data.keys():
             run_dates = pd.date_range(start=self.start_dates[mode],
                                          end=self.end_dates[mode], freq="1D")
-            run_date_str = [d.strftime("%Y%m%d-%H%M") for d in run_dates.date]
             print(np.unique(run_dates.strftime('%Y%m')))
-            all_total_track_files = sorted(glob(getattr(self, mode + "_data_path") +
-                                                "*total_" + self.ensemble_name + "*." + format))
-            all_step_track_files = sorted(glob(getattr(self, mode + "_data_path") +
-                                               "*step_" + self.ensemble_name + "*." + format))
-            total_track_files = []
-            for track_file in all_total_track_files:
-                file_date = track_file.split("_")[-1][:-4]
-                if file_date in run_date_str:
-                    total_track_files.append(track_file)
-            step_track_files = []
-            for step_file in all_step_track_files:
-                file_date = step_file.split("_")[-1][:-4]
-                if file_date in run_date_str:
-                    step_track_files.append(step_file)
-
-            self.data[mode]["total"] = pd.concat(map(pd.read_csv, total_track_files),
-                                                 ignore_index=True,sort='True')
+            catalog = TrackDataCatalog(getattr(self, mode + "_data_path"), self.ensemble_name, data_format=format)
+            total_track_files = catalog.select("total", run_dates=run_dates.date)
+            step_track_files = catalog.select("step", run_dates=run_dates.date)
+            step_columns = None
+            if columns is not None:
+                step_columns = ["Step_ID", "Track_ID", "Ensemble_Name", "Ensemble_Member", "Run_Date"]
+                step_columns += [c for c in columns if c not in step_columns]
+            cache_file = None
+            if cache_path is not None:
+                cache_key = [mode, format, step_columns]
+                for filename in total_track_files + step_track_files + [self.member_files[mode]]:
+                    cache_key.append([filename, os.path.getmtime(filename), os.path.getsize(filename)])
+                cache_file = join(cache_path, "track_data_{0}_{1}_{2}.pkl".format(
+                    self.ensemble_name, mode, hashlib.sha1(json.dumps(cache_key).encode()).hexdigest()))
+                if os.path.exists(cache_file):
+                    print("Load cached {0} data".format(mode))
+                    with open(cache_file, "rb") as cache_obj:
+                        self.data[mode] = pickle.load(cache_obj)
+                    return
+            self.data[mode]["total"] = catalog.load(total_track_files, num_threads=num_threads)
             self.data[mode]["total"] = self.data[mode]["total"].fillna(value=0)
             self.data[mode]["total"] = self.data[mode]["total"].replace([np.inf, -np.inf], 0)
-            self.data[mode]["step"] = pd.concat(map(pd.read_csv, step_track_files),
-                                                ignore_index=True,sort='True')
+            self.data[mode]["step"] = catalog.load(step_track_files, columns=step_columns,
+                                                   num_threads=num_threads)
+            catalog.save()
             self.data[mode]["step"] = self.data[mode]["step"].fillna(value=0)
             self.data[mode]["step"] = self.data[mode]["step"].replace([np.inf, -np.inf], 0)
             if mode == "forecast":
@@ -104,6 +132,11 @@ class TrackModeler(object):
             self.data[mode]["total_group"] = pd.merge(self.data[mode]["total"],
                                                       self.data[mode]["member"],
                                                       on="Ensemble_Member")
+            if cache_file is not None:
+                temp_file = cache_file + ".{0:d}".format(os.getpid())
+                with open(temp_file, "wb") as cache_obj:
+                    pickle.dump(self.data[mode], cache_obj, pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_file, cache_file)
 
     def calc_copulas(self,
                      output_file,
@@ -1,19 +1,23 @@
-from hagelslag.data.ModelOutput import ModelOutput
+from hagelslag.data.ModelOutput import ModelOutput, load_model_outputs
 from hagelslag.data.MRMSGrid import MRMSGrid
 from hagelslag.processing.EnhancedWatershedSegmenter import EnhancedWatershed, rescale_data
 from hagelslag.processing.Watershed import Watershed
 from hagelslag.processing.Hysteresis import Hysteresis
-from hagelslag.processing.tracker import label_storm_objects, extract_storm_patches, track_storms
+from hagelslag.processing.tracker import label_storm_objects, extract_storm_patches, track_storms, \
+    track_ensemble_storms
 from .ObjectMatcher import ObjectMatcher, TrackMatcher, TrackStepMatcher
 from scipy.ndimage import find_objects, gaussian_filter
 from .STObject import STObject, read_geojson
 import numpy as np
+import os
+import pickle
 from scipy.interpolate import interp1d
 from glob import glob
 import pandas as pd
 from datetime import timedelta
 from scipy.stats import gamma
-from netCDF4 import Dataset
+from hagelslag.util.shared_grids import shared_netcdf_grid
+from hagelslag.util.metrics import StageMetrics
 
 
 class TrackProcessor(object):
@@ -45,6 +49,9 @@ class TrackProcessor(object):
             segmentation parameters are used.
         single_step: Whether model timesteps are in separate files or aggregated into one file.
         mask_file: netCDF filename containing a mask of valid grid points on the model domain.
+        read_threads: Number of threads reading single time step model files at the same time.
+        dtype: Data type of the model and observation grids used for segmentation and attribute extraction.
+        chunk_hours: If set, the model grid used for segmentation is loaded lazily in chunks of this many hours.
     """
     def __init__(self,
                  run_date,
@@ -67,7 +74,10 @@ class TrackProcessor(object):
                  mrms_watershed_params=None,
                  single_step=True,
                  mask_file=None,
-                 patch_radius=32):
+                 patch_radius=32,
+                 read_threads=1,
+                 dtype=np.float32,
+                 chunk_hours=None):
         self.run_date = run_date
         self.start_date = start_date
         self.end_date = end_date
@@ -97,9 +107,13 @@ class TrackProcessor(object):
         self.model_map_file = model_map_file
         self.mrms_path = mrms_path
         self.single_step = single_step
+        self.read_threads = read_threads
+        self.dtype = dtype
+        self.chunk_hours = chunk_hours
         self.model_grid = ModelOutput(self.ensemble_name, self.ensemble_member, self.run_date, self.variable,
                                       self.start_date, self.end_date, self.model_path, self.model_map_file,
-                                        single_step=self.single_step)
+                                      single_step=self.single_step, read_threads=self.read_threads,
+                                      dtype=self.dtype, chunk_hours=self.chunk_hours)
         self.model_grid.load_map_info(self.model_map_file)
         if self.mrms_path is not None:
             self.mrms_variable = mrms_variable
@@ -118,10 +132,11 @@ class TrackProcessor(object):
         self.mask_file = mask_file
         self.mask = None
         if self.mask_file is not None:
-            mask_data = Dataset(self.mask_file)
-            self.mask = mask_data.variables["usa_mask"][:]
-            mask_data.close()
+            self.mask = shared_netcdf_grid(self.mask_file, "usa_mask", self.dtype)
         self.patch_radius = patch_radius
+        self.metrics = StageMetrics("_".join([self.ensemble_member, self.run_date.strftime("%Y%m%d-%H%M")]),
+                                    {"ensemble_name": self.ensemble_name, "ensemble_member": self.ensemble_member,
+                                     "run_date": self.run_date.strftime("%Y%m%d-%H%M")})
         return
 
     def find_model_patch_tracks(self):
@@ -131,12 +146,33 @@ class TrackProcessor(object):
         Returns:
 
         """
-        self.model_grid.load_data()
+        model_objects = self.find_model_patch_objects()
         tracked_model_objects = []
+        if len(model_objects) == 0:
+            return tracked_model_objects
+        with self.metrics.stage("tracking"):
+            tracked_model_objects.extend(track_storms(model_objects, self.hours,
+                                                      self.object_matcher.cost_function_components,
+                                                      self.object_matcher.max_values,
+                                                      self.object_matcher.weights))
+        self.metrics.count("model_tracks", len(tracked_model_objects))
+        return tracked_model_objects
+
+    def find_model_patch_objects(self):
+        """
+        Identify storms in gridded model output at each time step and extract uniform sized patches around the
+        storm centers of mass without linking them in time.
+
+        Returns:
+            List containing the list of STObjects found at each hour, or an empty list if no model output is found.
+        """
+        with self.metrics.stage("load_model"):
+            self.model_grid.load_data()
+        self.metrics.count("files_read", len(self.model_grid.files_read))
         model_objects = []
         if self.model_grid.data is None:
             print("No model output found")
-            return tracked_model_objects
+            return model_objects
         if self.segmentation_approach == "ew":
             min_orig = self.model_ew.min_intensity
             max_orig = self.model_ew.max_intensity
@@ -148,52 +184,51 @@ class TrackProcessor(object):
             min_orig = 0
             max_orig = 1
             data_increment_orig = 1
-        for h, hour in enumerate(self.hours):
-            # Identify storms at each time step and apply size filter
-            print("Finding {0} objects for run {1} Hour: {2:02d}".format(self.ensemble_member,
-                                                                         self.run_date.strftime("%Y%m%d%H"), hour))
-            if self.mask is not None:
-                model_data = self.model_grid.data[h] * self.mask
-            else:
-                model_data = self.model_grid.data[h]
-            model_data[:self.patch_radius] = 0
-            model_data[-self.patch_radius:] = 0
-            model_data[:, :self.patch_radius] = 0
-            model_data[:, -self.patch_radius:] = 0
-            if self.segmentation_approach == "ew":
-                scaled_data = np.array(rescale_data(model_data, min_orig, max_orig))
-                hour_labels = label_storm_objects(scaled_data, self.segmentation_approach,
-                                                  self.model_ew.min_intensity, self.model_ew.max_intensity,
-                                                  min_area=self.size_filter, max_area=self.model_ew.max_size,
-                                                  max_range=self.model_ew.delta, increment=self.model_ew.data_increment,
-                                                  gaussian_sd=self.gaussian_window)
-                del scaled_data
-            else:
-                hour_labels = label_storm_objects(model_data, self.segmentation_approach,
-                                                  self.model_ew.min_intensity, self.model_ew.max_intensity,
-                                                  min_area=self.size_filter, gaussian_sd=self.gaussian_window)
-            model_objects.extend(extract_storm_patches(hour_labels, model_data, self.model_grid.x,
-                                                       self.model_grid.y, [hour],
-                                                       dx=self.model_grid.dx,
-                                                       patch_radius=self.patch_radius))
-            for model_obj in model_objects[-1]:
-                slices = list(find_objects(model_obj.masks[-1]))
-                if len(slices) > 0:
-                    dims = (slices[0][0].stop - slices[0][0].start, slices[0][1].stop - slices[0][1].start)
-                    if h > 0:
-                        model_obj.estimate_motion(hour, self.model_grid.data[h-1], dims[1], dims[0])
-
-            del model_data
-            del hour_labels
-        tracked_model_objects.extend(track_storms(model_objects, self.hours,
-                                                  self.object_matcher.cost_function_components,
-                                                  self.object_matcher.max_values,
-                                                  self.object_matcher.weights))
+        with self.metrics.stage("segmentation"):
+            for h, hour in enumerate(self.hours):
+                # Identify storms at each time step and apply size filter
+                print("Finding {0} objects for run {1} Hour: {2:02d}".format(self.ensemble_member,
+                                                                             self.run_date.strftime("%Y%m%d%H"), hour))
+                if self.mask is not None:
+                    model_data = self.model_grid.data[h] * self.mask
+                else:
+                    model_data = self.model_grid.data[h]
+                model_data[:self.patch_radius] = 0
+                model_data[-self.patch_radius:] = 0
+                model_data[:, :self.patch_radius] = 0
+                model_data[:, -self.patch_radius:] = 0
+                if self.segmentation_approach == "ew":
+                    scaled_data = np.array(rescale_data(model_data, min_orig, max_orig))
+                    hour_labels = label_storm_objects(scaled_data, self.segmentation_approach,
+                                                      self.model_ew.min_intensity, self.model_ew.max_intensity,
+                                                      min_area=self.size_filter, max_area=self.model_ew.max_size,
+                                                      max_range=self.model_ew.delta,
+                                                      increment=self.model_ew.data_increment,
+                                                      gaussian_sd=self.gaussian_window)
+                    del scaled_data
+                else:
+                    hour_labels = label_storm_objects(model_data, self.segmentation_approach,
+                                                      self.model_ew.min_intensity, self.model_ew.max_intensity,
+                                                      min_area=self.size_filter, gaussian_sd=self.gaussian_window)
+                model_objects.extend(extract_storm_patches(hour_labels, model_data, self.model_grid.x,
+                                                           self.model_grid.y, [hour],
+                                                           dx=self.model_grid.dx,
+                                                           patch_radius=self.patch_radius))
+                for model_obj in model_objects[-1]:
+                    slices = list(find_objects(model_obj.masks[-1]))
+                    if len(slices) > 0:
+                        dims = (slices[0][0].stop - slices[0][0].start, slices[0][1].stop - slices[0][1].start)
+                        if h > 0:
+                            model_obj.estimate_motion(hour, self.model_grid.data[h-1], dims[1], dims[0])
+
+                del model_data
+                del hour_labels
         if self.segmentation_approach == "ew":
             self.model_ew.min_intensity = min_orig
             self.model_ew.max_intensity = max_orig
             self.model_ew.data_increment = data_increment_orig
-        return tracked_model_objects
+        self.metrics.count("model_objects", sum([len(objects) for objects in model_objects]))
+        return model_objects
 
     def find_model_tracks(self):
         """
@@ -202,89 +237,106 @@ class TrackProcessor(object):
         Returns:
             List of STObjects containing model track information.
         """
-        self.model_grid.load_data()
-        model_objects = []
+        model_objects = self.find_model_objects()
         tracked_model_objects = []
+        if len(model_objects) == 0:
+            return tracked_model_objects
+        with self.metrics.stage("tracking"):
+            for h, hour in enumerate(self.hours):
+                past_time_objs = []
+                for obj in tracked_model_objects:
+                    # Potential trackable objects are identified
+                    if obj.end_time == hour - 1:
+                        past_time_objs.append(obj)
+                # If no objects existed in the last time step, then consider objects in current time step all new
+                if len(past_time_objs) == 0:
+                    tracked_model_objects.extend(model_objects[h])
+                # Match from previous time step with current time step
+                elif len(past_time_objs) > 0 and len(model_objects[h]) > 0:
+                    assignments = self.object_matcher.match_objects(past_time_objs, model_objects[h], hour - 1, hour)
+                    unpaired = list(range(len(model_objects[h])))
+                    for pair in assignments:
+                        past_time_objs[pair[0]].extend(model_objects[h][pair[1]])
+                        unpaired.remove(pair[1])
+                    if len(unpaired) > 0:
+                        for up in unpaired:
+                            tracked_model_objects.append(model_objects[h][up])
+                print("Tracked Model Objects: {0:03d} Hour: {1:02d}".format(len(tracked_model_objects), hour))
+        self.metrics.count("model_tracks", len(tracked_model_objects))
+        return tracked_model_objects
+
+    def find_model_objects(self):
+        """
+        Identify storms at each model time step without linking them in time.
+
+        Returns:
+            List containing the list of STObjects found at each hour, or an empty list if no model output is found.
+        """
+        with self.metrics.stage("load_model"):
+            self.model_grid.load_data()
+        self.metrics.count("files_read", len(self.model_grid.files_read))
+        model_objects = []
         if self.model_grid.data is None:
             print("No model output found")
-            return tracked_model_objects
-        for h, hour in enumerate(self.hours):
-            # Identify storms at each time step and apply size filter
-            print("Finding {0} objects for run {1} Hour: {2:02d}".format(self.ensemble_member,
-                                                                         self.run_date.strftime("%Y%m%d%H"), hour))
-            if self.mask is not None:
-                model_data = self.model_grid.data[h] * self.mask
-            else:
-                model_data = self.model_grid.data[h]
-
-            # remember orig values
-
-            # scale to int 0-100.
-            if self.segmentation_approach == "ew":
-                min_orig = self.model_ew.min_intensity
-                max_orig = self.model_ew.max_intensity
-                data_increment_orig = self.model_ew.data_increment
-                scaled_data = np.array(rescale_data(self.model_grid.data[h], min_orig, max_orig))
-                self.model_ew.min_intensity = 0
-                self.model_ew.data_increment = 1
-                self.model_ew.max_intensity = 100
-            else:
-                min_orig = 0
-                max_orig = 1
-                data_increment_orig = 1
-                scaled_data = self.model_grid.data[h]
-            hour_labels = self.model_ew.label(gaussian_filter(scaled_data, self.gaussian_window))
-            hour_labels[model_data < self.model_ew.min_intensity] = 0
-            if self.size_filter > 1:
-                hour_labels = self.model_ew.size_filter(hour_labels, self.size_filter)
-            # Return to orig values
-            if self.segmentation_approach == "ew":
-                self.model_ew.min_intensity = min_orig
-                self.model_ew.max_intensity = max_orig
-                self.model_ew.data_increment = data_increment_orig
-            obj_slices = find_objects(hour_labels)
-
-            num_slices = len(list(obj_slices))
-            model_objects.append([])
-            if num_slices > 0:
-                for s, sl in enumerate(obj_slices):
-                    model_objects[-1].append(STObject(self.model_grid.data[h][sl],
-                                                      np.where(hour_labels[sl] == s + 1, 1, 0),
-                                                      self.model_grid.x[sl], 
-                                                      self.model_grid.y[sl], 
-                                                      self.model_grid.i[sl], 
-                                                      self.model_grid.j[sl],
-                                                      hour,
-                                                      hour,
-                                                      dx=self.model_grid.dx))
-                    if h > 0:
-                        dims = model_objects[-1][-1].timesteps[0].shape
-                        model_objects[-1][-1].estimate_motion(hour, self.model_grid.data[h-1], dims[1], dims[0])
-            del hour_labels
-            del scaled_data
-            del model_data
-        for h, hour in enumerate(self.hours):
-            past_time_objs = []
-            for obj in tracked_model_objects:
-                # Potential trackable objects are identified
-                if obj.end_time == hour - 1:
-                    past_time_objs.append(obj)
-            # If no objects existed in the last time step, then consider objects in current time step all new
-            if len(past_time_objs) == 0:
-                tracked_model_objects.extend(model_objects[h])
-            # Match from previous time step with current time step
-            elif len(past_time_objs) > 0 and len(model_objects[h]) > 0:
-                assignments = self.object_matcher.match_objects(past_time_objs, model_objects[h], hour - 1, hour)
-                unpaired = list(range(len(model_objects[h])))
-                for pair in assignments:
-                    past_time_objs[pair[0]].extend(model_objects[h][pair[1]])
-                    unpaired.remove(pair[1])
-                if len(unpaired) > 0:
-                    for up in unpaired:
-                        tracked_model_objects.append(model_objects[h][up])
-            print("Tracked Model Objects: {0:03d} Hour: {1:02d}".format(len(tracked_model_objects), hour))
+            return model_objects
+        with self.metrics.stage("segmentation"):
+            for h, hour in enumerate(self.hours):
+                # Identify storms at each time step and apply size filter
+                print("Finding {0} objects for run {1} Hour: {2:02d}".format(self.ensemble_member,
+                                                                             self.run_date.strftime("%Y%m%d%H"), hour))
+                if self.mask is not None:
+                    model_data = self.model_grid.data[h] * self.mask
+                else:
+                    model_data = self.model_grid.data[h]
+
+                # remember orig values
+
+                # scale to int 0-100.
+                if self.segmentation_approach == "ew":
+                    min_orig = self.model_ew.min_intensity
+                    max_orig = self.model_ew.max_intensity
+                    data_increment_orig = self.model_ew.data_increment
+                    scaled_data = np.array(rescale_data(self.model_grid.data[h], min_orig, max_orig))
+                    self.model_ew.min_intensity = 0
+                    self.model_ew.data_increment = 1
+                    self.model_ew.max_intensity = 100
+                else:
+                    min_orig = 0
+                    max_orig = 1
+                    data_increment_orig = 1
+                    scaled_data = self.model_grid.data[h]
+                hour_labels = self.model_ew.label(gaussian_filter(scaled_data, self.gaussian_window))
+                hour_labels[model_data < self.model_ew.min_intensity] = 0
+                if self.size_filter > 1:
+                    hour_labels = self.model_ew.size_filter(hour_labels, self.size_filter)
+                # Return to orig values
+                if self.segmentation_approach == "ew":
+                    self.model_ew.min_intensity = min_orig
+                    self.model_ew.max_intensity = max_orig
+                    self.model_ew.data_increment = data_increment_orig
+                obj_slices = find_objects(hour_labels)
 
-        return tracked_model_objects
+                num_slices = len(list(obj_slices))
+                model_objects.append([])
+                if num_slices > 0:
+                    for s, sl in enumerate(obj_slices):
+                        model_objects[-1].append(STObject(self.model_grid.data[h][sl],
+                                                          np.where(hour_labels[sl] == s + 1, 1, 0),
+                                                          self.model_grid.x[sl], 
+                                                          self.model_grid.y[sl], 
+                                                          self.model_grid.i[sl], 
+                                                          self.model_grid.j[sl],
+                                                          hour,
+                                                          hour,
+                                                          dx=self.model_grid.dx))
+                        if h > 0:
+                            dims = model_objects[-1][-1].timesteps[0].shape
+                            model_objects[-1][-1].estimate_motion(hour, self.model_grid.data[h-1], dims[1], dims[0])
+                del hour_labels
+                del scaled_data
+                del model_data
+        self.metrics.count("model_objects", sum([len(objects) for objects in model_objects]))
+        return model_objects
 
     def load_model_tracks(self, json_path):
         model_track_files = sorted(glob(json_path + "{0}/{1}/{2}_*.json".format(self.run_date.strftime("%Y%m%d"),
@@ -314,60 +366,63 @@ class TrackProcessor(object):
         obs_objects = []
         tracked_obs_objects = []
         if self.mrms_ew is not None:
-            self.mrms_grid.load_data()
-            
+            with self.metrics.stage("load_obs"):
+                self.mrms_grid.load_data()
+            self.metrics.count("files_read", len(self.mrms_grid.files_read))
             if len(self.mrms_grid.data) != len(self.hours):
                 print('Less than 24 hours of observation data found')
                 
                 return tracked_obs_objects
          
-            for h, hour in enumerate(self.hours):
-                mrms_data = np.zeros(self.mrms_grid.data[h].shape)
-                mrms_data[:] = np.array(self.mrms_grid.data[h])
-                mrms_data[mrms_data < 0] = 0
-                hour_labels = self.mrms_ew.size_filter(self.mrms_ew.label(gaussian_filter(mrms_data,
-                                                                                      self.gaussian_window)),
-                                                       self.size_filter)
-                hour_labels[mrms_data < self.mrms_ew.min_intensity] = 0
-                obj_slices = find_objects(hour_labels)
-                num_slices = len(list(obj_slices))
-                obs_objects.append([])
-                if num_slices > 0:
-                    for sl in obj_slices:
-                        obs_objects[-1].append(STObject(mrms_data[sl],
-                                                        np.where(hour_labels[sl] > 0, 1, 0),
-                                                        self.model_grid.x[sl],
-                                                        self.model_grid.y[sl],
-                                                        self.model_grid.i[sl],
-                                                        self.model_grid.j[sl],
-                                                        hour,
-                                                        hour,
-                                                        dx=self.model_grid.dx))
-                        if h > 0:
-                            dims = obs_objects[-1][-1].timesteps[0].shape
-                            obs_objects[-1][-1].estimate_motion(hour, self.mrms_grid.data[h-1], dims[1], dims[0])
-        
-            for h, hour in enumerate(self.hours):
-                past_time_objs = []
-                for obj in tracked_obs_objects:
-                    if obj.end_time == hour - 1:
-                        past_time_objs.append(obj)
-                if len(past_time_objs) == 0:
-                    tracked_obs_objects.extend(obs_objects[h])
-                elif len(past_time_objs) > 0 and len(obs_objects[h]) > 0:
-                    assignments = self.object_matcher.match_objects(past_time_objs, obs_objects[h], hour - 1, hour)
-                    unpaired = list(range(len(obs_objects[h])))
-                    for pair in assignments:
-                        past_time_objs[pair[0]].extend(obs_objects[h][pair[1]])
-                        unpaired.remove(pair[1])
-                    if len(unpaired) > 0:
-                        for up in unpaired:
-                            tracked_obs_objects.append(obs_objects[h][up])
-                print("Tracked Obs Objects: {0:03d} Hour: {1:02d}".format(len(tracked_obs_objects), hour))
-        
+            with self.metrics.stage("obs_segmentation"):
+                for h, hour in enumerate(self.hours):
+                    mrms_data = np.zeros(self.mrms_grid.data[h].shape, dtype=self.dtype)
+                    mrms_data[:] = np.array(self.mrms_grid.data[h])
+                    mrms_data[mrms_data < 0] = 0
+                    hour_labels = self.mrms_ew.size_filter(self.mrms_ew.label(gaussian_filter(mrms_data,
+                                                                                          self.gaussian_window)),
+                                                           self.size_filter)
+                    hour_labels[mrms_data < self.mrms_ew.min_intensity] = 0
+                    obj_slices = find_objects(hour_labels)
+                    num_slices = len(list(obj_slices))
+                    obs_objects.append([])
+                    if num_slices > 0:
+                        for sl in obj_slices:
+                            obs_objects[-1].append(STObject(mrms_data[sl],
+                                                            np.where(hour_labels[sl] > 0, 1, 0),
+                                                            self.model_grid.x[sl],
+                                                            self.model_grid.y[sl],
+                                                            self.model_grid.i[sl],
+                                                            self.model_grid.j[sl],
+                                                            hour,
+                                                            hour,
+                                                            dx=self.model_grid.dx))
+                            if h > 0:
+                                dims = obs_objects[-1][-1].timesteps[0].shape
+                                obs_objects[-1][-1].estimate_motion(hour, self.mrms_grid.data[h-1], dims[1], dims[0])
+            self.metrics.count("obs_objects", sum([len(objects) for objects in obs_objects]))
+            with self.metrics.stage("obs_tracking"):
+                for h, hour in enumerate(self.hours):
+                    past_time_objs = []
+                    for obj in tracked_obs_objects:
+                        if obj.end_time == hour - 1:
+                            past_time_objs.append(obj)
+                    if len(past_time_objs) == 0:
+                        tracked_obs_objects.extend(obs_objects[h])
+                    elif len(past_time_objs) > 0 and len(obs_objects[h]) > 0:
+                        assignments = self.object_matcher.match_objects(past_time_objs, obs_objects[h], hour - 1, hour)
+                        unpaired = list(range(len(obs_objects[h])))
+                        for pair in assignments:
+                            past_time_objs[pair[0]].extend(obs_objects[h][pair[1]])
+                            unpaired.remove(pair[1])
+                        if len(unpaired) > 0:
+                            for up in unpaired:
+                                tracked_obs_objects.append(obs_objects[h][up])
+                    print("Tracked Obs Objects: {0:03d} Hour: {1:02d}".format(len(tracked_obs_objects), hour))
+            self.metrics.count("obs_tracks", len(tracked_obs_objects))
         return tracked_obs_objects
 
-    def match_tracks(self, model_tracks, obs_tracks, unique_matches=True, closest_matches=False):
+    def match_tracks(self, model_tracks, obs_tracks, unique_matches=True, closest_matches=False, num_workers=1):
         """
         Match forecast and observed tracks.
 
@@ -376,21 +431,26 @@ class TrackProcessor(object):
             obs_tracks:
             unique_matches:
             closest_matches:
+            num_workers: Number of processes used to find neighbors when unique_matches is False.
 
         Returns:
 
         """
-        if unique_matches:
-            pairings = self.track_matcher.match_tracks(model_tracks, obs_tracks, closest_matches=closest_matches)
-        else:
-            pairings = self.track_matcher.neighbor_matches(model_tracks, obs_tracks)
+        with self.metrics.stage("matching"):
+            if unique_matches:
+                pairings = self.track_matcher.match_tracks(model_tracks, obs_tracks, closest_matches=closest_matches)
+            else:
+                pairings = self.track_matcher.neighbor_matches(model_tracks, obs_tracks, num_workers=num_workers)
+        self.metrics.count("track_pairs", len(pairings))
         return pairings
 
     def match_track_steps(self, model_tracks, obs_tracks):
-        return self.track_step_matcher.match(model_tracks, obs_tracks)
+        with self.metrics.stage("matching"):
+            step_pairs = self.track_step_matcher.match(model_tracks, obs_tracks)
+        return step_pairs
 
     def extract_model_attributes(self, tracked_model_objects, storm_variables, potential_variables,
-                                 tendency_variables=None, future_variables=None):
+                                 tendency_variables=None, future_variables=None, windowed=False):
         """
         Extract model attribute data for each model track. Storm variables are those that describe the model storm
         directly, such as radar reflectivity or updraft helicity. Potential variables describe the surrounding
@@ -404,68 +464,89 @@ class TrackProcessor(object):
             storm_variables: List of storm variable names
             potential_variables: List of potential variable names.
             tendency_variables: List of tendency variables
+            future_variables: List of future variables
+            windowed: If True, only read model output within the bounding boxes of the model objects.
         """
         if tendency_variables is None:
             tendency_variables = []
         if future_variables is None:
             future_variables = []
-        model_grids = {}
         for l_var in ["lon", "lat"]:
             for model_obj in tracked_model_objects:
                 model_obj.extract_attribute_array(getattr(self.model_grid, l_var), l_var)
-        for storm_var in storm_variables:
-            print("Storm {0} {1} {2}".format(storm_var,self.ensemble_member, self.run_date.strftime("%Y%m%d")))
-            model_grids[storm_var] = ModelOutput(self.ensemble_name, self.ensemble_member,
-                                                 self.run_date, storm_var, self.start_date - timedelta(hours=1),
-                                                 self.end_date + timedelta(hours=1),
-                                                 self.model_path,self.model_map_file, 
-                                                 self.single_step)
-            model_grids[storm_var].load_data()
-            for model_obj in tracked_model_objects:
-                model_obj.extract_attribute_grid(model_grids[storm_var])
-            if storm_var not in potential_variables + tendency_variables + future_variables:
-                del model_grids[storm_var]
-        for potential_var in potential_variables:
-            print("Potential {0} {1} {2}".format(potential_var,self.ensemble_member, self.run_date.strftime("%Y%m%d")))
-            if potential_var not in model_grids.keys():
-                model_grids[potential_var] = ModelOutput(self.ensemble_name, self.ensemble_member,
-                                                         self.run_date, potential_var,
-                                                         self.start_date - timedelta(hours=1),
-                                                         self.end_date + timedelta(hours=1),
-                                                         self.model_path, self.model_map_file, 
-                                                         self.single_step)
-                model_grids[potential_var].load_data()
-            for model_obj in tracked_model_objects:
-                model_obj.extract_attribute_grid(model_grids[potential_var], potential=True)
-            if potential_var not in tendency_variables + future_variables:
-                del model_grids[potential_var]
-        for future_var in future_variables:
-            print("Future {0} {1} {2}".format(future_var, self.ensemble_member, self.run_date.strftime("%Y%m%d")))
-            if future_var not in model_grids.keys():
-                model_grids[future_var] = ModelOutput(self.ensemble_name, self.ensemble_member,
-                                                         self.run_date, future_var,
-                                                         self.start_date - timedelta(hours=1),
-                                                         self.end_date + timedelta(hours=1),
-                                                         self.model_path, self.model_map_file,
-                                                         self.single_step)
-                model_grids[future_var].load_data()
-            for model_obj in tracked_model_objects:
-                model_obj.extract_attribute_grid(model_grids[future_var], future=True)
-            if future_var not in tendency_variables:
-                del model_grids[future_var]
-        for tendency_var in tendency_variables:
-            print("Tendency {0} {1} {2}".format(tendency_var, self.ensemble_member, self.run_date.strftime("%Y%m%d")))
-            if tendency_var not in model_grids.keys():
-                model_grids[tendency_var] = ModelOutput(self.ensemble_name, self.ensemble_member,
-                                                        self.run_date, tendency_var,
-                                                        self.start_date - timedelta(hours=1),
-                                                        self.end_date,
-                                                        self.model_path, self.model_map_file, 
-                                                        self.single_step)
-            for model_obj in tracked_model_objects:
-                model_obj.extract_tendency_grid(model_grids[tendency_var])
-            del model_grids[tendency_var]
+        all_variables = []
+        for var in storm_variables + potential_variables + future_variables + tendency_variables:
+            if var not in all_variables:
+                all_variables.append(var)
+        print("Loading {0:d} variables {1} {2}".format(len(all_variables), self.ensemble_member,
+                                                       self.run_date.strftime("%Y%m%d")))
+        windows = None
+        if windowed:
+            offsets = []
+            if len(storm_variables + tendency_variables) > 0:
+                offsets.append(0)
+            if len(potential_variables + tendency_variables) > 0:
+                offsets.append(-1)
+            if len(future_variables) > 0:
+                offsets.append(1)
+            windows = self.attribute_windows(tracked_model_objects, offsets)
+        with self.metrics.stage("load_attributes"):
+            model_grids = load_model_outputs(self.ensemble_name, self.ensemble_member, self.run_date, all_variables,
+                                             self.start_date - timedelta(hours=1), self.end_date + timedelta(hours=1),
+                                             self.model_path, self.model_map_file, self.single_step, windows=windows,
+                                             read_threads=self.read_threads, dtype=self.dtype)
+        self.metrics.count("files_read", len(set([f for model_grid in model_grids.values()
+                                                  for f in model_grid.files_read])))
+        with self.metrics.stage("attributes"):
+            for storm_var in storm_variables:
+                print("Storm {0} {1} {2}".format(storm_var,self.ensemble_member, self.run_date.strftime("%Y%m%d")))
+                for model_obj in tracked_model_objects:
+                    model_obj.extract_attribute_grid(model_grids[storm_var])
+                if storm_var not in potential_variables + tendency_variables + future_variables:
+                    del model_grids[storm_var]
+            for potential_var in potential_variables:
+                print("Potential {0} {1} {2}".format(potential_var,self.ensemble_member, self.run_date.strftime("%Y%m%d")))
+                for model_obj in tracked_model_objects:
+                    model_obj.extract_attribute_grid(model_grids[potential_var], potential=True)
+                if potential_var not in tendency_variables + future_variables:
+                    del model_grids[potential_var]
+            for future_var in future_variables:
+                print("Future {0} {1} {2}".format(future_var, self.ensemble_member, self.run_date.strftime("%Y%m%d")))
+                for model_obj in tracked_model_objects:
+                    model_obj.extract_attribute_grid(model_grids[future_var], future=True)
+                if future_var not in tendency_variables:
+                    del model_grids[future_var]
+            for tendency_var in tendency_variables:
+                print("Tendency {0} {1} {2}".format(tendency_var, self.ensemble_member, self.run_date.strftime("%Y%m%d")))
+                for model_obj in tracked_model_objects:
+                    model_obj.extract_tendency_grid(model_grids[tendency_var])
+                del model_grids[tendency_var]
+
+
+    def attribute_windows(self, tracked_model_objects, offsets):
+        """
+        Find the bounding boxes of the model object steps at each time index of the grids loaded by
+        extract_model_attributes, which start one hour before the start date.
+
+        Args:
+            tracked_model_objects: List of STObjects describing each forecasted storm
+            offsets: List of hour offsets from each object step where attributes are extracted, such as -1 for
+                potential variables.
 
+        Returns:
+            dict mapping each time index to a list of (row start, row end, column start, column end) tuples.
+        """
+        windows = {}
+        for model_obj in tracked_model_objects:
+            for ti, t in enumerate(model_obj.times):
+                box = (int(model_obj.i[ti].min()), int(model_obj.i[ti].max()) + 1,
+                       int(model_obj.j[ti].min()), int(model_obj.j[ti].max()) + 1)
+                for offset in offsets:
+                    time_index = int(t + offset - (self.start_hour - 1))
+                    if time_index not in windows.keys():
+                        windows[time_index] = set()
+                    windows[time_index].add(box)
+        return dict([(time_index, sorted(boxes)) for time_index, boxes in windows.items()])
 
     @staticmethod
     def match_hail_sizes(model_tracks, obs_tracks, track_pairings):
@@ -614,3 +695,66 @@ class TrackProcessor(object):
             track_errors.loc[pair[0], 'end_time_difference'] = model_track.end_time - obs_track.end_time 
         return track_errors
 
+
+def find_ensemble_model_tracks(track_processors, patches=False):
+    """
+    Identify storms in the output of several ensemble members and track them with batched object matching across
+    members. The tracks for each member are identical to those from TrackProcessor.find_model_tracks or
+    find_model_patch_tracks, but the watershed variable of every member is held in memory at once.
+
+    Args:
+        track_processors: List of TrackProcessor objects for the members of one run. All should share the same
+            hours and object matcher parameters.
+        patches: If True, extract uniform sized patches around each storm as in find_model_patch_tracks.
+
+    Returns:
+        List containing the list of model track STObjects for each TrackProcessor.
+    """
+    member_objects = []
+    for track_proc in track_processors:
+        if patches:
+            model_objects = track_proc.find_model_patch_objects()
+        else:
+            model_objects = track_proc.find_model_objects()
+        if len(model_objects) == 0:
+            model_objects = [[] for hour in track_proc.hours]
+        member_objects.append(model_objects)
+    object_matcher = track_processors[0].object_matcher
+    member_tracks = track_ensemble_storms(member_objects, track_processors[0].hours,
+                                          object_matcher.cost_function_components,
+                                          object_matcher.max_values,
+                                          object_matcher.weights)
+    for track_proc, model_tracks in zip(track_processors, member_tracks):
+        print("Tracked {0} Model Objects: {1:03d}".format(track_proc.ensemble_member, len(model_tracks)))
+    return member_tracks
+
+
+def save_obs_tracks(obs_tracks, filename):
+    """
+    Save observed tracks so that they can be shared by the tasks for each ensemble member. The file is written under
+    a temporary name and then renamed, so other processes never read a partial file.
+
+    Args:
+        obs_tracks: List of STObjects containing the observed tracks
+        filename: Name of the file
+    """
+    temp_filename = filename + ".{0:d}".format(os.getpid())
+    with open(temp_filename, "wb") as obs_file:
+        pickle.dump(obs_tracks, obs_file, pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, filename)
+
+
+def load_obs_tracks(filename):
+    """
+    Load observed tracks saved by save_obs_tracks.
+
+    Args:
+        filename: Name of the file
+
+    Returns:
+        List of STObjects containing the observed tracks, or None if the file does not exist.
+    """
+    if not os.path.exists(filename):
+        return None
+    with open(filename, "rb") as obs_file:
+        return pickle.load(obs_file)
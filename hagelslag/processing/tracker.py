@@ -228,3 +228,46 @@ def track_storms(storm_objects, times, distance_components, distance_maxima, dis
                 for up in unpaired:
                     tracked_objects.append(storm_objects[t][up])
     return tracked_objects
+
+
+def track_ensemble_storms(member_storm_objects, times, distance_components, distance_maxima, distance_weights,
+                          member_tracked_objects=None):
+    """
+    Track storms from several ensemble members at once. The objects from every member at each time are matched
+    in a single batch with ObjectMatcher.batch_match_objects, and the tracks of each member are identical to those
+    from calling track_storms on that member alone.
+
+    Args:
+        member_storm_objects: list with the output of extract_storm_objects for each member.
+        times: List of times associated with each set of STObjects
+        distance_components: list of function objects that make up components of distance function
+        distance_maxima: array of maximum values for each distance for normalization purposes
+        distance_weights: weight given to each component of the distance function. Should add to 1.
+        member_tracked_objects: list with the STObjects that have already been tracked for each member.
+    Returns:
+        member_tracked_objects: list of tracked STObjects for each member.
+    """
+    obj_matcher = ObjectMatcher(distance_components, distance_weights, distance_maxima)
+    if member_tracked_objects is None:
+        member_tracked_objects = [[] for m in range(len(member_storm_objects))]
+    for t, time in enumerate(times):
+        member_past_objects = []
+        for tracked_objects in member_tracked_objects:
+            member_past_objects.append([obj for obj in tracked_objects if obj.end_time == time - obj.step])
+        all_assignments = obj_matcher.batch_match_objects(member_past_objects,
+                                                          [storm_objects[t] for storm_objects in member_storm_objects],
+                                                          times[t - 1], times[t])
+        for m, tracked_objects in enumerate(member_tracked_objects):
+            past_time_objects = member_past_objects[m]
+            storm_objects = member_storm_objects[m]
+            if len(past_time_objects) == 0:
+                tracked_objects.extend(storm_objects[t])
+            elif len(past_time_objects) > 0 and len(storm_objects[t]) > 0:
+                unpaired = list(range(len(storm_objects[t])))
+                for pair in all_assignments[m]:
+                    past_time_objects[pair[0]].extend(storm_objects[t][pair[1]])
+                    unpaired.remove(pair[1])
+                if len(unpaired) > 0:
+                    for up in unpaired:
+                        tracked_objects.append(storm_objects[t][up])
+    return member_tracked_objects
@@ -0,0 +1,16 @@
+import os
+from os.path import join, expanduser
+
+
+def cache_path(name):
+    """
+    Directory in the user cache where hagelslag saves one kind of reusable file, such as file catalogs or
+    indices. Keeping these files out of the data directories avoids writing to shared or read-only archives.
+
+    Args:
+        name (str): Name of the subdirectory for this kind of file
+
+    Returns:
+        Path to the hagelslag/<name> directory of the user cache directory given by XDG_CACHE_HOME, or ~/.cache.
+    """
+    return join(os.environ.get("XDG_CACHE_HOME", join(expanduser("~"), ".cache")), "hagelslag", name)
@@ -0,0 +1,200 @@
+import json
+import pandas as pd
+import os
+import resource
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def memory_mb():
+    """
+    Resident memory of this process in megabytes. Where /proc is not available, the peak resident memory of the
+    process is returned instead.
+
+    Returns:
+        float
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024.0 ** 2
+    except (IOError, OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak /= 1024.0
+        return peak / 1024.0
+
+
+def bytes_read():
+    """
+    Number of bytes this process has read from files and sockets, or None where /proc is not available.
+
+    Returns:
+        int or None
+    """
+    try:
+        with open("/proc/self/io") as io_file:
+            for line in io_file:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def append_metrics(filename, record):
+    """
+    Append a metrics record to a file as one line of JSON. Each record is written with a single call, so records
+    from several processes appending to the same local file are not interleaved.
+
+    Args:
+        filename (str): Path to the metrics file
+        record (dict): Metrics of one task
+    """
+    with open(filename, "a") as metrics_file:
+        metrics_file.write(json.dumps(record, default=str) + "\n")
+
+
+class StageMetrics(object):
+    """
+    Stage timers, counters and memory samples for one task, such as processing one ensemble member. Stages with the
+    same name are added together. The bytes read during each stage are added to the bytes_read counter, and the
+    resident memory is sampled at the end of each stage.
+
+    Args:
+        name (str): Name of the task
+        labels (dict): Values describing the task, such as the ensemble member and run date
+
+    Attributes:
+        start_time (float): Time the metrics were created, in seconds since the epoch
+        timers (OrderedDict): Maps each stage name to its elapsed time in seconds
+        counters (OrderedDict): Maps each counter name to its value
+        peak_memory_mb (float): Largest resident memory sampled, in megabytes
+    """
+    def __init__(self, name, labels=None):
+        self.name = name
+        if labels is None:
+            labels = {}
+        self.labels = labels
+        self.start_time = time.time()
+        self.timers = OrderedDict()
+        self.counters = OrderedDict()
+        self.peak_memory_mb = 0.0
+        self.sample_memory()
+
+    @contextmanager
+    def stage(self, stage_name):
+        """
+        Time the code run inside a with block.
+
+        Args:
+            stage_name (str): Name of the stage
+        """
+        start_bytes = bytes_read()
+        start = time.time()
+        try:
+            yield self
+        finally:
+            self.timers[stage_name] = self.timers.get(stage_name, 0.0) + time.time() - start
+            end_bytes = bytes_read()
+            if start_bytes is not None and end_bytes is not None:
+                self.count("bytes_read", end_bytes - start_bytes)
+            self.sample_memory()
+
+    def count(self, counter, value=1):
+        """
+        Add to a counter.
+
+        Args:
+            counter (str): Name of the counter
+            value: Amount added
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def sample_memory(self):
+        """
+        Sample the resident memory of the process and update the peak.
+        """
+        self.peak_memory_mb = max(self.peak_memory_mb, memory_mb())
+
+    def to_dict(self):
+        """
+        Returns:
+            dict with the name, labels, start time, total time, timers, counters, and peak memory of the task
+        """
+        return OrderedDict([("name", self.name),
+                            ("labels", self.labels),
+                            ("start_time", self.start_time),
+                            ("total_time", time.time() - self.start_time),
+                            ("timers", self.timers),
+                            ("counters", self.counters),
+                            ("peak_memory_mb", self.peak_memory_mb),
+                            ("pid", os.getpid())])
+
+    def save(self, filename):
+        """
+        Append the metrics to a metrics file.
+
+        Args:
+            filename (str): Path to the metrics file
+        """
+        append_metrics(filename, self.to_dict())
+
+
+class MetricsCollector(object):
+    """
+    Collects task metrics in the current process and optionally appends them to a metrics file.
+
+    Args:
+        filename (str): Path to the metrics file, or None to keep the metrics in memory only
+
+    Attributes:
+        records (list): dicts of the collected metrics
+    """
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.records = []
+
+    def add(self, metrics):
+        """
+        Add the metrics of one task.
+
+        Args:
+            metrics: StageMetrics object or dict from StageMetrics.to_dict
+        """
+        if isinstance(metrics, StageMetrics):
+            metrics = metrics.to_dict()
+        if self.filename is not None:
+            append_metrics(self.filename, metrics)
+        self.records.append(metrics)
+
+
+def read_metrics(filename):
+    """
+    Read a metrics file into a table with one row per task. Timers and counters become columns prefixed with
+    time_ and count_, and labels become columns with their own names.
+
+    Args:
+        filename (str): Path to the metrics file
+
+    Returns:
+        pandas.DataFrame
+    """
+    rows = []
+    with open(filename) as metrics_file:
+        for line in metrics_file:
+            if len(line.strip()) == 0:
+                continue
+            record = json.loads(line)
+            row = OrderedDict([("name", record["name"])])
+            row.update(record.get("labels", {}))
+            for key in ["start_time", "total_time", "peak_memory_mb", "pid"]:
+                row[key] = record.get(key)
+            for stage_name, seconds in record.get("timers", {}).items():
+                row["time_" + stage_name] = seconds
+            for counter, value in record.get("counters", {}).items():
+                row["count_" + counter] = value
+            rows.append(row)
+    return pd.DataFrame(rows)
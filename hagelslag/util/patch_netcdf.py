@@ -0,0 +1,69 @@
+import numpy as np
+
+
+def patch_chunk_sizes(dimension_sizes, itemsize=4, chunk_patches=None, target_bytes=2 ** 18):
+    """
+    Choose the chunk shape of a storm patch variable. Each chunk holds whole patches, so reading one patch only
+    decompresses the chunk containing it, and consecutive patches share chunks.
+
+    Args:
+        dimension_sizes (list): Sizes of the variable dimensions. The first dimension indexes the patches.
+        itemsize (int): Number of bytes in each value
+        chunk_patches (int): Number of patches in each chunk. If None, the number is chosen so that each chunk
+            holds about target_bytes.
+        target_bytes (int): Approximate size of each chunk before compression
+
+    Returns:
+        list of chunk sizes
+    """
+    patch_bytes = itemsize * int(np.prod(dimension_sizes[1:]))
+    if chunk_patches is None:
+        chunk_patches = max(target_bytes // patch_bytes, 1)
+    return [int(min(chunk_patches, max(dimension_sizes[0], 1)))] + list(dimension_sizes[1:])
+
+
+def create_patch_variable(out_file, name, dtype, dimensions, complevel=1, shuffle=True, chunk_patches=None):
+    """
+    Create a variable indexed by patch in a storm patch netCDF file with patch-aligned chunks.
+
+    Args:
+        out_file: netCDF4.Dataset open for writing
+        name (str): Name of the variable
+        dtype (str): netCDF data type
+        dimensions (tuple): Names of the dimensions. The first dimension indexes the patches.
+        complevel (int): zlib compression level from 0 to 9. 0 turns compression off.
+        shuffle (bool): Whether the HDF5 shuffle filter is applied before compression
+        chunk_patches (int): Number of patches in each chunk. If None, it is chosen from the patch size.
+
+    Returns:
+        netCDF4.Variable
+    """
+    dimension_sizes = [len(out_file.dimensions[dimension]) for dimension in dimensions]
+    chunk_sizes = patch_chunk_sizes(dimension_sizes, np.dtype(dtype).itemsize, chunk_patches=chunk_patches)
+    return out_file.createVariable(name, dtype, dimensions, zlib=complevel > 0, complevel=complevel,
+                                   shuffle=shuffle and complevel > 0, chunksizes=chunk_sizes)
+
+
+def patch_batches(patch_counts, batch_size):
+    """
+    Group consecutive items, such as storm tracks, into batches holding at least batch_size patches, so that
+    patches can be written to disk a batch at a time.
+
+    Args:
+        patch_counts (list): Number of patches in each item
+        batch_size (int): Minimum number of patches in each batch except the last
+
+    Returns:
+        list of (first item, last item + 1, first patch, last patch + 1) tuples
+    """
+    batches = []
+    start_item = 0
+    start_patch = 0
+    end_patch = 0
+    for i, patch_count in enumerate(patch_counts):
+        end_patch += patch_count
+        if end_patch - start_patch >= batch_size or i == len(patch_counts) - 1:
+            batches.append((start_item, i + 1, start_patch, end_patch))
+            start_item = i + 1
+            start_patch = end_patch
+    return batches
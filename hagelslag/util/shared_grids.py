@@ -0,0 +1,243 @@
+import hashlib
+import os
+import numpy as np
+from multiprocessing import shared_memory
+from netCDF4 import Dataset
+from hagelslag.util.make_proj_grids import make_proj_grids, read_arps_map_file, read_ncar_map_file
+
+
+class SharedGridRegistry(object):
+    """
+    Registry of read-only grids stored in shared memory. The parent process publishes each grid once, and worker
+    processes look grids up by name and get views of the shared memory instead of loading or receiving their own
+    copies. Workers started with fork inherit the registry. Workers started another way need the descriptors
+    passed to set_descriptors, for example through a Pool initializer.
+
+    Attributes:
+        descriptors (dict): Maps each grid name to the shared memory block name, shape, and dtype of the grid
+        blocks (dict): Maps each grid name to the SharedMemory object open in this process
+        views (dict): Maps each grid name to the read-only array open in this process
+        published (set): Names of the grids published by this registry
+    """
+    def __init__(self):
+        self.descriptors = {}
+        self.blocks = {}
+        self.views = {}
+        self.published = set()
+        self.owner_pid = os.getpid()
+
+    def __contains__(self, name):
+        return name in self.descriptors.keys()
+
+    def publish(self, name, array):
+        """
+        Copy a grid into shared memory. Grids that are already published are not copied again.
+
+        Args:
+            name (str): Name of the grid
+            array: numpy array
+
+        Returns:
+            Read-only view of the shared grid
+        """
+        if name not in self.descriptors.keys():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared_array[:] = array
+            self.blocks[name] = block
+            self.published.add(name)
+            self.descriptors[name] = (block.name, array.shape, array.dtype.str)
+        return self.get(name)
+
+    def get(self, name):
+        """
+        Get a view of a published grid.
+
+        Args:
+            name (str): Name of the grid
+
+        Returns:
+            Read-only numpy array, or None if no grid is published with the name
+        """
+        if name not in self.descriptors.keys():
+            return None
+        if name not in self.views.keys():
+            block_name, shape, dtype = self.descriptors[name]
+            if name not in self.blocks.keys():
+                self.blocks[name] = shared_memory.SharedMemory(name=block_name)
+            view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.blocks[name].buf)
+            view.flags.writeable = False
+            self.views[name] = view
+        return self.views[name]
+
+    def set_descriptors(self, descriptors):
+        """
+        Use the grids published by another process.
+
+        Args:
+            descriptors (dict): descriptors attribute of the publishing registry
+        """
+        self.descriptors.update(descriptors)
+
+    def close(self):
+        """
+        Close the shared memory blocks open in this process. Blocks are freed when closed by the process that
+        published them.
+        """
+        owner = os.getpid() == self.owner_pid
+        self.views.clear()
+        for name, block in self.blocks.items():
+            block.close()
+            if owner and name in self.published:
+                block.unlink()
+        self.blocks.clear()
+        if owner:
+            self.descriptors.clear()
+            self.published.clear()
+
+
+grid_registry = SharedGridRegistry()
+
+
+def attach_shared_grids(descriptors):
+    """
+    Pool initializer that lets a worker process use the grids published by its parent process.
+
+    Args:
+        descriptors (dict): descriptors attribute of the parent process grid_registry
+    """
+    grid_registry.set_descriptors(descriptors)
+
+
+def proj_grid_names(proj_dict, grid_dict):
+    """
+    Names of the shared longitude, latitude, x, and y grids for a map projection and grid.
+
+    Args:
+        proj_dict (dict): Map projection parameters
+        grid_dict (dict): Grid corner and spacing parameters
+
+    Returns:
+        dict mapping each grid variable to its name in the registry
+    """
+    key = hashlib.sha1(repr([sorted(proj_dict.items()), sorted(grid_dict.items())]).encode()).hexdigest()
+    return dict([(var, "proj_{0}_{1}".format(key, var)) for var in ["lon", "lat", "x", "y"]])
+
+
+def publish_proj_grids(proj_dict, grid_dict, registry=grid_registry):
+    """
+    Calculate the grids of a map projection and publish them in a registry.
+
+    Args:
+        proj_dict (dict): Map projection parameters
+        grid_dict (dict): Grid corner and spacing parameters
+        registry: SharedGridRegistry
+
+    Returns:
+        dict of read-only lon, lat, x, and y grids
+    """
+    grid_names = proj_grid_names(proj_dict, grid_dict)
+    if all([name in registry for name in grid_names.values()]):
+        return shared_proj_grids(proj_dict, grid_dict, registry)
+    mapping_data = make_proj_grids(proj_dict, grid_dict)
+    return dict([(var, registry.publish(grid_names[var], mapping_data[var])) for var in grid_names.keys()])
+
+
+def publish_map_grids(map_file, registry=grid_registry):
+    """
+    Read the projection of a map file and publish its grids in a registry. ARPS map files end in "map", and all
+    other map files are read as WRF netCDF files.
+
+    Args:
+        map_file (str): Path to the map file
+        registry: SharedGridRegistry
+
+    Returns:
+        dict of read-only lon, lat, x, and y grids
+    """
+    if map_file[-3:] == "map":
+        proj_dict, grid_dict = read_arps_map_file(map_file)
+    else:
+        proj_dict, grid_dict = read_ncar_map_file(map_file)
+    return publish_proj_grids(proj_dict, grid_dict, registry)
+
+
+def shared_proj_grids(proj_dict, grid_dict, registry=grid_registry):
+    """
+    Get the grids of a map projection from a registry, or calculate them if they were not published.
+
+    Args:
+        proj_dict (dict): Map projection parameters
+        grid_dict (dict): Grid corner and spacing parameters
+        registry: SharedGridRegistry
+
+    Returns:
+        dict of lon, lat, x, and y grids
+    """
+    grid_names = proj_grid_names(proj_dict, grid_dict)
+    if all([name in registry for name in grid_names.values()]):
+        return dict([(var, registry.get(name)) for var, name in grid_names.items()])
+    return make_proj_grids(proj_dict, grid_dict)
+
+
+def netcdf_grid_name(filename, variable, dtype):
+    """
+    Name of a shared grid loaded from a netCDF variable.
+
+    Args:
+        filename (str): Path to the netCDF file
+        variable (str): Name of the variable
+        dtype: Data type of the grid, or None for the data type of the variable
+
+    Returns:
+        str
+    """
+    dtype_str = "native" if dtype is None else np.dtype(dtype).str
+    return "nc_{0}_{1}_{2}".format(os.path.abspath(filename), variable, dtype_str)
+
+
+def publish_netcdf_grid(filename, variable, dtype=None, registry=grid_registry):
+    """
+    Load a grid from a netCDF variable and publish it in a registry.
+
+    Args:
+        filename (str): Path to the netCDF file
+        variable (str): Name of the variable
+        dtype: Data type of the grid. If None, the data type of the variable is kept.
+        registry: SharedGridRegistry
+
+    Returns:
+        Read-only view of the grid
+    """
+    name = netcdf_grid_name(filename, variable, dtype)
+    if name not in registry:
+        with Dataset(filename) as nc_file:
+            grid = np.ma.filled(nc_file.variables[variable][:])
+        if dtype is not None:
+            grid = grid.astype(dtype)
+        registry.publish(name, grid)
+    return registry.get(name)
+
+
+def shared_netcdf_grid(filename, variable, dtype=None, registry=grid_registry):
+    """
+    Get a grid loaded from a netCDF variable from a registry, or load it from the file if it was not published.
+
+    Args:
+        filename (str): Path to the netCDF file
+        variable (str): Name of the variable
+        dtype: Data type of the grid. If None, the data type of the variable is kept.
+        registry: SharedGridRegistry
+
+    Returns:
+        numpy array
+    """
+    name = netcdf_grid_name(filename, variable, dtype)
+    if name in registry:
+        return registry.get(name)
+    with Dataset(filename) as nc_file:
+        grid = nc_file.variables[variable][:]
+    if dtype is not None:
+        grid = grid.astype(dtype)
+    return grid
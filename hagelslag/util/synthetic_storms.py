@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+
+class SyntheticStormGenerator(object):
+    """
+    Generates gridded fields of storm cells for testing and benchmarking the storm processing pipeline without model
+    or radar data. Each storm is a Gaussian cell that starts at a random time and location, moves with a constant
+    velocity, and grows and decays in intensity over its lifetime.
+
+    Args:
+        num_storms (int): Number of storms
+        grid_shape (tuple): Number of rows and columns in the grid
+        dx (float): Grid spacing in meters
+        num_times (int): Number of time steps
+        dt (float): Time between steps in seconds
+        radius_range (tuple): Minimum and maximum storm radius (Gaussian standard deviation) in meters
+        intensity_range (tuple): Minimum and maximum peak intensity of each storm
+        speed_range (tuple): Minimum and maximum storm speed in meters per second
+        lifetime_range (tuple): Minimum and maximum number of time steps each storm lasts
+        seed (int): Seed of the random number generator used for the storm parameters
+
+    Attributes:
+        storms (pandas.DataFrame): Start time, lifetime, initial center, velocity, radius, and peak intensity of
+            each storm
+    """
+    def __init__(self, num_storms=20, grid_shape=(200, 200), dx=3000.0, num_times=12, dt=3600.0,
+                 radius_range=(6000.0, 15000.0), intensity_range=(30.0, 80.0), speed_range=(5.0, 20.0),
+                 lifetime_range=(3, 8), seed=0):
+        self.num_storms = num_storms
+        self.grid_shape = tuple(grid_shape)
+        self.dx = dx
+        self.num_times = num_times
+        self.dt = dt
+        self.radius_range = radius_range
+        self.intensity_range = intensity_range
+        self.speed_range = speed_range
+        self.lifetime_range = lifetime_range
+        self.seed = seed
+        self.storms = self.make_storms()
+
+    def make_storms(self):
+        """
+        Draw the parameters of each storm.
+
+        Returns:
+            pandas.DataFrame with one row per storm
+        """
+        rs = np.random.RandomState(self.seed)
+        lifetimes = rs.randint(self.lifetime_range[0], self.lifetime_range[1] + 1, size=self.num_storms)
+        lifetimes = np.minimum(lifetimes, self.num_times)
+        start_times = np.array([rs.randint(0, self.num_times - lifetime + 1) for lifetime in lifetimes])
+        speeds = rs.uniform(self.speed_range[0], self.speed_range[1], size=self.num_storms)
+        directions = rs.uniform(0, 2 * np.pi, size=self.num_storms)
+        storms = pd.DataFrame({"start_time": start_times,
+                               "lifetime": lifetimes,
+                               "x": rs.uniform(0, self.grid_shape[1] * self.dx, size=self.num_storms),
+                               "y": rs.uniform(0, self.grid_shape[0] * self.dx, size=self.num_storms),
+                               "u": speeds * np.cos(directions),
+                               "v": speeds * np.sin(directions),
+                               "radius": rs.uniform(self.radius_range[0], self.radius_range[1],
+                                                    size=self.num_storms),
+                               "intensity": rs.uniform(self.intensity_range[0], self.intensity_range[1],
+                                                       size=self.num_storms)},
+                              columns=["start_time", "lifetime", "x", "y", "u", "v", "radius", "intensity"])
+        return storms
+
+    def coordinates(self):
+        """
+        Returns:
+            x and y coordinate grids in meters
+        """
+        return np.meshgrid(np.arange(self.grid_shape[1]) * self.dx, np.arange(self.grid_shape[0]) * self.dx)
+
+    def fields(self, position_error=0.0, intensity_error=0.0, seed=None, dtype=np.float32):
+        """
+        Calculate the storm field at each time step. Random position and intensity errors can be added to each storm
+        to make forecast fields that approximately match the original storms.
+
+        Args:
+            position_error (float): Standard deviation of the displacement of each storm in meters
+            intensity_error (float): Standard deviation of the relative error in the peak intensity of each storm
+            seed (int): Seed of the random number generator used for the errors
+            dtype: Data type of the fields
+
+        Returns:
+            Array of the fields in (time, y, x) dimensions
+        """
+        rs = np.random.RandomState(seed)
+        x_offsets = rs.normal(0, position_error, size=self.num_storms) if position_error > 0 \
+            else np.zeros(self.num_storms)
+        y_offsets = rs.normal(0, position_error, size=self.num_storms) if position_error > 0 \
+            else np.zeros(self.num_storms)
+        intensity_scales = 1 + rs.normal(0, intensity_error, size=self.num_storms) if intensity_error > 0 \
+            else np.ones(self.num_storms)
+        data = np.zeros((self.num_times,) + self.grid_shape, dtype=dtype)
+        for s, storm in enumerate(self.storms.itertuples()):
+            # Only evaluate each cell within 4 standard deviations of its center
+            half_width = int(np.ceil(4 * storm.radius / self.dx))
+            for step in range(storm.lifetime):
+                t = storm.start_time + step
+                center_x = storm.x + x_offsets[s] + storm.u * step * self.dt
+                center_y = storm.y + y_offsets[s] + storm.v * step * self.dt
+                center_col = int(np.round(center_x / self.dx))
+                center_row = int(np.round(center_y / self.dx))
+                rows = slice(max(center_row - half_width, 0), min(center_row + half_width + 1, self.grid_shape[0]))
+                cols = slice(max(center_col - half_width, 0), min(center_col + half_width + 1, self.grid_shape[1]))
+                if rows.start >= rows.stop or cols.start >= cols.stop:
+                    continue
+                y_box, x_box = np.meshgrid(np.arange(rows.start, rows.stop) * self.dx,
+                                           np.arange(cols.start, cols.stop) * self.dx, indexing="ij")
+                # Intensity rises and falls over the lifetime of the storm
+                life_fraction = (step + 1.0) / (storm.lifetime + 1.0)
+                peak = storm.intensity * intensity_scales[s] * np.sin(np.pi * life_fraction)
+                cell = peak * np.exp(-((x_box - center_x) ** 2 + (y_box - center_y) ** 2) / (2 * storm.radius ** 2))
+                data[t, rows, cols] = np.maximum(data[t, rows, cols], cell)
+        return data
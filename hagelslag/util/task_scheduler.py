@@ -0,0 +1,386 @@
+import hashlib
+import json
+import os
+import time
+import traceback
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from datetime import date, time as day_time, timedelta
+from multiprocessing import Pool
+from os.path import exists
+from queue import Queue
+
+
+class Task(object):
+    """
+    A single stage of a processing workflow.
+
+    Args:
+        name (str): Unique name of the task
+        function: Module-level function that performs the task
+        args (tuple): Arguments passed to the function
+        depends_on (list): Names of tasks that must finish before this task starts
+        inputs (list): Files read by the task. Files declared as outputs of another task add that task as a
+            dependency. Other files must exist when the task starts.
+        outputs (list): Files written by the task
+        callback: Function called in the scheduling process with the value returned by the task
+        local (bool): If True, run the task in the scheduling process instead of a worker process. Used for stages
+            that keep large objects in memory.
+
+    Attributes:
+        args_hash (str): Hash of the arguments before the task ran, set when the task is checked against a manifest
+    """
+    def __init__(self, name, function, args=(), depends_on=(), inputs=(), outputs=(), callback=None, local=False):
+        self.name = name
+        self.function = function
+        self.args = tuple(args)
+        self.depends_on = list(depends_on)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.callback = callback
+        self.local = local
+        self.status = "waiting"
+        self.start_time = None
+        self.args_hash = None
+
+
+def file_fingerprints(filenames):
+    """
+    Get the modification time and size of each file that exists.
+
+    Args:
+        filenames (list): paths to files
+
+    Returns:
+        dict mapping each existing file to a list containing its modification time and size
+    """
+    fingerprints = {}
+    for filename in filenames:
+        if exists(filename):
+            file_stat = os.stat(filename)
+            fingerprints[filename] = [file_stat.st_mtime, file_stat.st_size]
+    return fingerprints
+
+
+def describe_value(value, seen=None):
+    """
+    Describe a task argument as text that stays the same across runs of a workflow. Containers and the attributes
+    of objects are described recursively, functions and classes by their module and name, and arrays by their
+    contents. Values without a stable description fall back to their repr.
+
+    Args:
+        value: Any task argument
+        seen (set): ids of the objects already being described, used to stop at reference cycles
+
+    Returns:
+        str description of the value
+    """
+    if seen is None:
+        seen = set()
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes, date, day_time, timedelta,
+                                           np.generic)):
+        return repr(value)
+    if id(value) in seen:
+        return "<cycle {0}>".format(type(value).__name__)
+    seen = seen.union([id(value)])
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        return "ndarray({0},{1},{2})".format(value.dtype.str, value.shape,
+                                             hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest())
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        return "{0}({1})".format(type(value).__name__, hashlib.sha1(
+            pd.util.hash_pandas_object(value if not isinstance(value, pd.Index) else value.to_series(),
+                                       index=True).values.tobytes()).hexdigest())
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return "{0}[{1}]".format(type(value).__name__, ",".join([describe_value(v, seen) for v in value]))
+    if isinstance(value, (set, frozenset)):
+        return "set[{0}]".format(",".join(sorted([describe_value(v, seen) for v in value])))
+    if isinstance(value, dict):
+        return "dict{{{0}}}".format(",".join(sorted(["{0}:{1}".format(describe_value(k, seen),
+                                                                       describe_value(v, seen))
+                                                      for k, v in value.items()])))
+    if hasattr(value, "__module__") and hasattr(value, "__qualname__"):
+        return "{0}.{1}".format(value.__module__, value.__qualname__)
+    if hasattr(value, "__dict__"):
+        return "{0}.{1}{2}".format(type(value).__module__, type(value).__qualname__,
+                                   describe_value(vars(value), seen))
+    return repr(value)
+
+
+def args_digest(args):
+    """
+    Hash the arguments of a task so that a task reruns when its arguments or the config it was given change.
+
+    Args:
+        args (tuple): Arguments of the task function
+
+    Returns:
+        str hex digest
+    """
+    return hashlib.sha1(describe_value(args).encode("utf-8")).hexdigest()
+
+
+class TaskManifest(object):
+    """
+    Record of the tasks that finished in earlier runs of a workflow, stored as a JSON file. Each completed task is
+    saved with a hash of its arguments and fingerprints of its input and output files. A task remains complete only
+    while it has the same arguments and the same input and output files exist with the same modification times and
+    sizes, so changing the config or deleting or rewriting a file invalidates the tasks that depend on it. Tasks
+    that declare no output files are never complete, since nothing shows that their results still exist.
+
+    Args:
+        filename (str): Path to the manifest file. It is created if it does not exist.
+
+    Attributes:
+        tasks (dict): Maps each completed task name to its argument hash and input and output fingerprints
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.tasks = {}
+        if exists(self.filename):
+            try:
+                with open(self.filename) as manifest_file:
+                    self.tasks = json.load(manifest_file)
+            except ValueError:
+                print("Manifest {0} is unreadable. All tasks will run.".format(self.filename))
+
+    @staticmethod
+    def fingerprint(task):
+        """
+        Get the hash of the arguments and the current fingerprints of the input and output files of a task. The
+        arguments are hashed before the task runs, since tasks may change the objects they are given.
+
+        Args:
+            task: Task object
+
+        Returns:
+            dict with the argument hash and input and output file fingerprints
+        """
+        if task.args_hash is None:
+            task.args_hash = args_digest(task.args)
+        return {"args": task.args_hash, "inputs": file_fingerprints(task.inputs),
+                "outputs": file_fingerprints(task.outputs)}
+
+    def is_complete(self, task):
+        """
+        Check if a task finished in an earlier run and its arguments and files have not changed since. Tasks
+        without declared outputs always run again.
+
+        Args:
+            task: Task object
+
+        Returns:
+            True if the task does not need to run again
+        """
+        return len(task.outputs) > 0 and task.name in self.tasks.keys() and \
+            self.tasks[task.name] == self.fingerprint(task)
+
+    def record(self, task):
+        """
+        Record a task as complete and save the manifest.
+
+        Args:
+            task: Task object
+        """
+        self.tasks[task.name] = self.fingerprint(task)
+        self.save()
+
+    def remove(self, task):
+        """
+        Remove a task from the manifest before it runs again, so that an interrupted task is not marked complete.
+
+        Args:
+            task: Task object
+        """
+        if task.name in self.tasks.keys():
+            del self.tasks[task.name]
+            self.save()
+
+    def save(self):
+        """
+        Write the manifest to a temporary file and move it into place.
+        """
+        temp_filename = self.filename + ".tmp{0:d}".format(os.getpid())
+        with open(temp_filename, "w") as manifest_file:
+            json.dump(self.tasks, manifest_file)
+        os.replace(temp_filename, self.filename)
+
+
+class TaskScheduler(object):
+    """
+    Runs a graph of tasks on a local process pool. A task is submitted as soon as all of its dependencies have
+    finished, so independent tasks run concurrently and downstream stages do not wait for unrelated work. Tasks
+    downstream of a failed task are skipped. If a manifest is given, tasks completed by an earlier run are not run
+    again unless their files changed or one of their dependencies ran.
+
+    Args:
+        num_procs (int): Number of worker processes. With 1 process, tasks run in the scheduling process in the
+            order they were added, subject to their dependencies.
+        manifest (TaskManifest): Record of completed tasks, or None to run every task.
+        initializer: Function called by each worker process when it starts, or None
+        initargs (tuple): Arguments of the initializer
+        metrics (MetricsCollector): Collector of the run time and status of each finished task, or None
+
+    Attributes:
+        tasks (OrderedDict): Maps each task name to its Task object
+    """
+    def __init__(self, num_procs=1, manifest=None, initializer=None, initargs=(), metrics=None):
+        self.num_procs = num_procs
+        self.manifest = manifest
+        self.initializer = initializer
+        self.initargs = initargs
+        self.metrics = metrics
+        self.tasks = OrderedDict()
+
+    def add_task(self, name, function, args=(), depends_on=(), inputs=(), outputs=(), callback=None, local=False):
+        """
+        Add a task to the graph. See Task for a description of the arguments.
+
+        Returns:
+            Task object
+        """
+        if name in self.tasks.keys():
+            raise ValueError("Task {0} was already added".format(name))
+        self.tasks[name] = Task(name, function, args=args, depends_on=depends_on, inputs=inputs, outputs=outputs,
+                                callback=callback, local=local)
+        return self.tasks[name]
+
+    def dependencies(self):
+        """
+        Find the tasks each task depends on from the declared task names and files.
+
+        Returns:
+            dict mapping each task name to a set of task names
+        """
+        producers = {}
+        for name, task in self.tasks.items():
+            for output in task.outputs:
+                producers[output] = name
+        task_dependencies = {}
+        for name, task in self.tasks.items():
+            task_dependencies[name] = set(task.depends_on)
+            task_dependencies[name].update([producers[f] for f in task.inputs if f in producers.keys()])
+            task_dependencies[name].discard(name)
+            unknown = task_dependencies[name].difference(self.tasks.keys())
+            if len(unknown) > 0:
+                raise ValueError("Task {0} depends on unknown tasks {1}".format(name, sorted(unknown)))
+        return task_dependencies
+
+    def finish_task(self, task, success, result):
+        """
+        Record the result of a task and pass its return value to the task callback.
+
+        Args:
+            task: Task object
+            success (bool): Whether the task function completed without an exception
+            result: Value returned by the task function or the exception raised
+        """
+        if success and task.callback is not None:
+            try:
+                task.callback(result)
+            except Exception as e:
+                print(traceback.format_exc())
+                success = False
+                result = e
+        elapsed = time.time() - task.start_time
+        if success:
+            task.status = "done"
+            if self.manifest is not None:
+                self.manifest.record(task)
+            print("Task {0} done in {1:0.1f} s".format(task.name, elapsed))
+        else:
+            task.status = "failed"
+            print("Task {0} failed after {1:0.1f} s: {2}".format(task.name, elapsed, repr(result)))
+        if self.metrics is not None:
+            self.metrics.add(OrderedDict([("name", task.name),
+                                          ("labels", {"status": task.status, "local": task.local}),
+                                          ("start_time", task.start_time),
+                                          ("total_time", elapsed),
+                                          ("timers", {}),
+                                          ("counters", {}),
+                                          ("peak_memory_mb", None),
+                                          ("pid", os.getpid())]))
+
+    def run(self):
+        """
+        Run every task in the graph.
+
+        Returns:
+            dict mapping each task name to its final status: done, complete (finished in an earlier run), failed,
+            or skipped
+        """
+        task_dependencies = self.dependencies()
+        if self.manifest is not None:
+            for task in self.tasks.values():
+                task.args_hash = args_digest(task.args)
+        pool = None
+        if self.num_procs > 1:
+            pool = Pool(self.num_procs, initializer=self.initializer, initargs=self.initargs)
+        completed = Queue()
+        num_running = 0
+        try:
+            while True:
+                changed = False
+                ready = []
+                for name, task in self.tasks.items():
+                    if task.status != "waiting":
+                        continue
+                    dep_status = [self.tasks[dep].status for dep in task_dependencies[name]]
+                    if "failed" in dep_status or "skipped" in dep_status:
+                        task.status = "skipped"
+                        changed = True
+                        print("Skipping task {0} after upstream failure".format(name))
+                    elif all([status == "complete" for status in dep_status]) and self.manifest is not None \
+                            and self.manifest.is_complete(task):
+                        task.status = "complete"
+                        changed = True
+                        print("Task {0} already complete".format(name))
+                    elif all([status in ["done", "complete"] for status in dep_status]):
+                        ready.append(task)
+                local_tasks = []
+                for task in ready:
+                    missing = [f for f in task.inputs if not exists(f)]
+                    if len(missing) > 0:
+                        task.status = "skipped"
+                        changed = True
+                        print("Skipping task {0}, missing inputs {1}".format(task.name, ", ".join(missing)))
+                        continue
+                    if self.manifest is not None:
+                        self.manifest.remove(task)
+                    if pool is None or task.local:
+                        local_tasks.append(task)
+                    else:
+                        task.status = "running"
+                        task.start_time = time.time()
+                        pool.apply_async(task.function, task.args,
+                                         callback=lambda result, n=task.name: completed.put((n, True, result)),
+                                         error_callback=lambda error, n=task.name: completed.put((n, False, error)))
+                        num_running += 1
+                if len(local_tasks) > 0:
+                    # Run one task here, then check again so that tasks it unblocks are not held up behind the rest
+                    task = local_tasks[0]
+                    task.status = "running"
+                    task.start_time = time.time()
+                    try:
+                        result = task.function(*task.args)
+                        self.finish_task(task, True, result)
+                    except Exception as e:
+                        self.finish_task(task, False, e)
+                elif num_running > 0:
+                    name, success, result = completed.get()
+                    num_running -= 1
+                    self.finish_task(self.tasks[name], success, result)
+                elif changed:
+                    continue
+                elif any([task.status == "waiting" for task in self.tasks.values()]):
+                    for task in self.tasks.values():
+                        if task.status == "waiting":
+                            task.status = "skipped"
+                            print("Skipping task {0}, dependencies form a cycle".format(task.name))
+                else:
+                    break
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return OrderedDict([(name, task.status) for name, task in self.tasks.items()])
@@ -0,0 +1,55 @@
+import unittest
+import os
+import shutil
+import tempfile
+from glob import glob
+from datetime import datetime
+from hagelslag.data.DirectoryCatalog import DirectoryCatalog
+from hagelslag.data.HREFv2ModelGrid import HREFv2ModelGrid
+
+
+class TestDirectoryCatalog(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.run_dir = os.path.join(self.path, "20170501")
+        os.makedirs(self.run_dir)
+        file_names = [".hidden.grib2"]
+        for hour in range(1, 13):
+            file_names.append("hiresw_conusarw_2017050100f{0:03d}.grib2".format(hour))
+            file_names.append("nam_conusnest_2017050100f{0:03d}.grib2".format(hour))
+        for file_name in file_names:
+            open(os.path.join(self.run_dir, file_name), "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_glob(self):
+        catalog = DirectoryCatalog()
+        for pattern in ["*", ".*", "*hiresw*conusarw*00f*1*", "nam*conusnest*00f*12*", "*.nc"]:
+            self.assertEqual(sorted(catalog.glob(os.path.join(self.run_dir, pattern))),
+                             sorted(glob(os.path.join(self.run_dir, pattern))), "Matches differ from glob")
+        self.assertEqual(catalog.glob(os.path.join(self.path, "20170502", "*")), [], "Missing directory not empty")
+        self.assertEqual(len(catalog.listings), 2, "Directories were listed more than once")
+
+    def test_new_files(self):
+        catalog = DirectoryCatalog()
+        pattern = os.path.join(self.run_dir, "nam_conusnest_2017050100f013*")
+        self.assertEqual(catalog.glob(pattern), [], "File found before it was written")
+        open(os.path.join(self.run_dir, "nam_conusnest_2017050100f013.grib2"), "w").close()
+        stat = os.stat(self.run_dir)
+        os.utime(self.run_dir, (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(catalog.glob(pattern), glob(pattern), "New file not found")
+        new_pattern = os.path.join(self.path, "20170502", "*")
+        self.assertEqual(catalog.glob(new_pattern), [], "Missing directory not empty")
+        os.makedirs(os.path.join(self.path, "20170502"))
+        open(os.path.join(self.path, "20170502", "nam_conusnest_2017050200f001.grib2"), "w").close()
+        self.assertEqual(catalog.glob(new_pattern), glob(new_pattern), "File in new directory not found")
+
+    def test_href_filenames(self):
+        catalog = DirectoryCatalog()
+        run_date = datetime(2017, 5, 1, 0)
+        for member in ["arw_00", "nam_00"]:
+            model_grid = HREFv2ModelGrid(member, run_date, "MAXREF", datetime(2017, 5, 1, 2),
+                                         datetime(2017, 5, 1, 6), self.path, catalog=catalog)
+            self.assertEqual(len(model_grid.filenames), 5, "Wrong number of files found")
+        self.assertEqual(list(catalog.listings.keys()), [self.path + "/20170501"], "Directory was not shared")
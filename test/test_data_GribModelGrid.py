@@ -0,0 +1,184 @@
+import unittest
+import numpy as np
+import os
+import shutil
+import struct
+import tempfile
+import pygrib
+from hagelslag.data.GribModelGrid import GribModelGrid, build_grib_index, load_grib_index
+from datetime import datetime
+from unittest import mock
+
+
+def grib2_message(values, category, number, level_type, level, forecast_hour):
+    """
+    Encode a simple packed grib2 message on a regular latitude-longitude grid.
+
+    Args:
+        values: 2D array of integers between 0 and 65535
+        category (int): Parameter category
+        number (int): Parameter number
+        level_type (int): Type of the first fixed surface
+        level (int): Value of the first fixed surface
+        forecast_hour (int): Forecast hour of the message
+
+    Returns:
+        bytes of the grib2 message
+    """
+    nj, ni = values.shape
+    packed = np.asarray(values, dtype=">u2").tobytes()
+    section_1 = struct.pack(">IBHHBBBHBBBBBBB", 21, 1, 7, 0, 2, 1, 1, 2016, 5, 1, 0, 0, 0, 0, 1)
+    grid = struct.pack(">BBIBIBIIIIIiiBiiIIB", 6, 0, 0, 0, 0, 0, 0, ni, nj, 0, 0xFFFFFFFF, 30000000, 250000000,
+                       48, 30000000 + (nj - 1) * 1000000, 250000000 + (ni - 1) * 1000000, 1000000, 1000000, 64)
+    section_3 = struct.pack(">IBBIBBH", 14 + len(grid), 3, 0, ni * nj, 0, 0, 0) + grid
+    section_4 = struct.pack(">IBHHBBBBBHBBIBBIBBI", 34, 4, 0, 0, category, number, 2, 0, 0, 0, 0, 1,
+                            forecast_hour, level_type, 0, level, 255, 0, 0)
+    section_5 = struct.pack(">IBIHfhhBB", 21, 5, ni * nj, 0, 0.0, 0, 0, 16, 0)
+    section_6 = struct.pack(">IBB", 6, 6, 255)
+    section_7 = struct.pack(">IB", 5 + len(packed), 7) + packed
+    body = section_1 + section_3 + section_4 + section_5 + section_6 + section_7 + b"7777"
+    return b"GRIB" + struct.pack(">HBBQ", 0, 0, 2, 16 + len(body)) + body
+
+
+class TestGribModelGrid(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.index_path = tempfile.mkdtemp()
+        self.cache_path = tempfile.mkdtemp()
+        self.environ = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": self.cache_path})
+        self.environ.start()
+        self.messages = [(0, 0, 103, 2), (0, 0, 100, 50000), (0, 0, 100, 85000), (16, 196, 10, 0),
+                         (16, 198, 103, 1000), (7, 199, 103, 5000), (7, 199, 103, 3000), (2, 2, 103, 10)]
+        self.variables = ["2t", "Temperature_500", "Temperature_850", "refc", "MAXREF", "MXUPHL_5000",
+                          "MXUPHL_3000", "10 metre U wind component", 5]
+        self.run_date = datetime(2016, 5, 1, 0)
+        self.forecast_hours = [3, 4, 5]
+        rs = np.random.RandomState(35)
+        self.filenames = []
+        for forecast_hour in self.forecast_hours:
+            filename = os.path.join(self.path, "model_f{0:03d}.grib2".format(forecast_hour))
+            with open(filename, "wb") as grib_file:
+                # Leading bytes that are not part of any message are skipped
+                grib_file.write(b"\x00" * 7)
+                for message in self.messages:
+                    grib_file.write(grib2_message(rs.randint(0, 1000, size=(12, 15)), *message, forecast_hour))
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        self.environ.stop()
+        shutil.rmtree(self.path)
+        shutil.rmtree(self.index_path)
+        shutil.rmtree(self.cache_path)
+
+    def index_file(self, filename, index_path=None):
+        if index_path is None:
+            index_path = os.path.join(self.cache_path, "hagelslag", "grib_indices")
+        return os.path.join(index_path, os.path.abspath(filename).strip(os.sep).replace(os.sep, "_") + ".hsidx")
+
+    def model_grid(self, index_path=None):
+        model_grid = GribModelGrid(self.filenames, self.run_date, datetime(2016, 5, 1, 3), datetime(2016, 5, 1, 5),
+                                   self.variables[0], "member")
+        model_grid.index_path = index_path
+        return model_grid
+
+    def pygrib_values(self, filename, variable):
+        """
+        Select the values of a variable in a grib file by scanning all of its messages with pygrib.
+        """
+        with pygrib.open(filename) as grbs:
+            if type(variable) is int:
+                return grbs.message(variable).values
+            if variable == "MAXREF":
+                return grbs.select(parameterNumber=198)[0].values
+            if variable.startswith("MXUPHL"):
+                return grbs.select(parameterNumber=199, level=int(variable.split("_")[1]))[0].values
+            if "_" in variable:
+                name, level = variable.split("_")
+                return grbs.select(name=name, level=int(level))[0].values
+            if variable in ["2t", "refc"]:
+                return grbs.select(shortName=variable)[0].values
+            return grbs.select(name=variable)[0].values
+
+    def test_build_grib_index(self):
+        with open(self.filenames[0], "rb") as grib_file:
+            contents = grib_file.read()
+        grib_index = build_grib_index(self.filenames[0])
+        with pygrib.open(self.filenames[0]) as grbs:
+            grib_messages = [grb for grb in grbs]
+        self.assertEqual(len(grib_index), len(grib_messages), "Wrong number of messages")
+        offset = 7
+        for message, grb in zip(grib_index, grib_messages):
+            self.assertEqual(message[:6], [grb.name, grb.shortName, str(grb.level), grb.typeOfLevel,
+                                           str(grb.stepRange), str(grb["parameterNumber"])],
+                             "Wrong message description")
+            self.assertEqual(message[6], offset, "Wrong message offset")
+            self.assertEqual(message[7], grb["totalLength"], "Wrong message length")
+            self.assertEqual(contents[message[6]:message[6] + message[7]], grb.tostring(), "Wrong message bytes")
+            offset += message[7]
+
+    def test_load_grib_index(self):
+        for index_path in [None, self.index_path]:
+            index_file = self.index_file(self.filenames[0], index_path)
+            with mock.patch("hagelslag.data.GribModelGrid.build_grib_index", wraps=build_grib_index) as build:
+                grib_index = load_grib_index(self.filenames[0], index_path)
+                self.assertEqual(build.call_count, 1, "Index not built")
+                self.assertTrue(os.path.exists(index_file), "Index not saved")
+                self.assertTrue(np.all(load_grib_index(self.filenames[0], index_path) == grib_index),
+                                "Saved index differs")
+                self.assertEqual(build.call_count, 1, "Unchanged index was rebuilt")
+                stat = os.stat(self.filenames[0])
+                os.utime(self.filenames[0], (stat.st_atime, stat.st_mtime + 10))
+                self.assertTrue(np.all(load_grib_index(self.filenames[0], index_path) == grib_index),
+                                "Index differs after touching the file")
+                self.assertEqual(build.call_count, 2, "Index not rebuilt after the modification time changed")
+                with open(self.filenames[0], "ab") as grib_file:
+                    grib_file.write(grib2_message(np.zeros((12, 15)), 0, 0, 103, 2, 6))
+                os.utime(self.filenames[0], (stat.st_atime, stat.st_mtime + 10))
+                self.assertEqual(load_grib_index(self.filenames[0], index_path).shape[0], len(grib_index) + 1,
+                                 "Appended message not indexed")
+                self.assertEqual(build.call_count, 3, "Index not rebuilt after the size changed")
+
+    def test_load_data(self):
+        model_grid = self.model_grid(self.index_path)
+        loaded = model_grid.load_variables(self.variables)
+        for variable in self.variables:
+            data, units = loaded[variable]
+            self.assertEqual(data.shape, (len(self.forecast_hours), 12, 15), "Wrong data shape")
+            self.assertEqual(data.dtype, model_grid.dtype, "Wrong data type")
+            for f, filename in enumerate(self.filenames):
+                self.assertTrue(np.all(data[f] == self.pygrib_values(filename, variable)),
+                                "{0} values differ from pygrib".format(variable))
+        data, units = model_grid.load_data()
+        self.assertTrue(np.all(data == loaded[self.variables[0]][0]), "load_data differs from load_variables")
+        self.assertEqual(len(os.listdir(self.path)), len(self.filenames), "Index saved next to the grib files")
+
+    def test_load_windows(self):
+        model_grid = self.model_grid()
+        windows = {0: [(0, 4, 2, 7)], 2: [(3, 12, 0, 5), (8, 10, 10, 15)]}
+        loaded = model_grid.load_windows(self.variables, windows)
+        for variable in self.variables:
+            window_data, units = loaded[variable]
+            self.assertEqual(sorted(window_data.keys()), [0, 2], "Wrong time steps loaded")
+            for t, t_windows in windows.items():
+                values = self.pygrib_values(self.filenames[t], variable)
+                for (i_start, i_end, j_start, j_end), (row, col, data) in zip(t_windows, window_data[t]):
+                    self.assertEqual((row, col), (i_start, j_start), "Wrong window corner")
+                    self.assertTrue(np.all(data == values[i_start:i_end, j_start:j_end]),
+                                    "{0} window values differ from pygrib".format(variable))
+        self.assertTrue(os.path.exists(self.index_file(self.filenames[2])), "Index not saved in the cache directory")
+        self.assertFalse(os.path.exists(self.index_file(self.filenames[1])), "File without windows was indexed")
+        self.assertEqual(len(os.listdir(self.path)), len(self.filenames), "Index saved next to the grib files")
+
+    def test_missing_file(self):
+        expected = [self.pygrib_values(filename, "2t") for filename in self.filenames]
+        os.remove(self.filenames[1])
+        model_grid = self.model_grid(self.index_path)
+        data, units = model_grid.load_data()
+        self.assertEqual(data.shape[0], len(self.forecast_hours), "Wrong number of time steps")
+        self.assertTrue(np.all(data[0] == expected[0]), "Values before the missing file are wrong")
+        self.assertTrue(np.all(data[1] == 0), "Missing time step not filled with zeros")
+        self.assertTrue(np.all(data[2] == expected[2]), "Values after the missing file are wrong")
+        windows = {1: [(0, 4, 2, 7)], 2: [(3, 12, 0, 5)]}
+        window_data, units = model_grid.load_windows(["2t"], windows)["2t"]
+        self.assertEqual(list(window_data.keys()), [2], "Missing time step was loaded")
+        self.assertTrue(np.all(window_data[2][0][2] == expected[2][3:12, 0:5]), "Window read from the wrong file")
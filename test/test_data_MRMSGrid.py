@@ -1,6 +1,12 @@
 import unittest
-from hagelslag.data.MRMSGrid import MRMSGrid
+import numpy as np
+import os
+import shutil
+import tempfile
+from netCDF4 import Dataset
+from hagelslag.data.MRMSGrid import MRMSGrid, get_mrms_catalog, mrms_catalogs
 from datetime import datetime
+from unittest import mock
 
 class TestMRMSGrid(unittest.TestCase):
     def setUp(self):
@@ -21,3 +27,66 @@ class TestMRMSGrid(unittest.TestCase):
         #self.assertEquals(self.mrms.all_dates.shape[0], self.mrms.valid_dates.shape[0], "All dates were not loaded")
 
         
+
+
+class TestMRMSCatalog(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+        self.cache_path = tempfile.mkdtemp()
+        self.environ = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": self.cache_path})
+        self.environ.start()
+        mrms_catalogs.clear()
+        os.makedirs(self.path + "MESH")
+        rs = np.random.RandomState(6)
+        self.values = {}
+        for day in [1, 2]:
+            date = datetime(2016, 5, day)
+            self.values[day] = rs.uniform(-10, 200, size=(24, 10, 12)).astype(np.float32)
+            filename = self.path + "MESH/MESH_{0}-000000_conus.nc".format(date.strftime("%Y%m%d"))
+            with Dataset(filename, "w") as out_file:
+                out_file.createDimension("time", 24)
+                out_file.createDimension("y", 10)
+                out_file.createDimension("x", 12)
+                time_var = out_file.createVariable("time", "i4", ("time",))
+                time_var[:] = np.arange(24)
+                time_var.units = "hours since {0}".format(date.strftime("%Y-%m-%d %H:%M:%S"))
+                out_file.createVariable("MESH", "f4", ("time", "y", "x"))[:] = self.values[day]
+
+    def tearDown(self):
+        self.environ.stop()
+        mrms_catalogs.clear()
+        shutil.rmtree(self.path)
+        shutil.rmtree(self.cache_path)
+
+    def test_load_data(self):
+        mrms_grid = MRMSGrid(datetime(2016, 5, 1, 20), datetime(2016, 5, 2, 3), "MESH", self.path)
+        mrms_grid.load_data()
+        expected = np.clip(np.concatenate([self.values[1][20:], self.values[2][:4]]), 0, 150)
+        self.assertEqual(mrms_grid.data.shape, expected.shape, "Data shape is wrong")
+        self.assertTrue(np.all(mrms_grid.data == expected), "Data values are wrong")
+        self.assertTrue(np.all(mrms_grid.valid_dates == mrms_grid.all_dates), "Valid dates are wrong")
+        self.assertEqual(len(os.listdir(self.path + "MESH")), 2, "Catalog was saved in the MRMS directory")
+        self.assertEqual(len(os.listdir(os.path.join(self.cache_path, "hagelslag", "mrms_catalogs"))), 1,
+                         "Catalog was not saved in the cache directory")
+        catalog = get_mrms_catalog(self.path + "MESH/")
+        self.assertEqual(len(catalog.file_times), 2, "Wrong number of files in catalog")
+        self.assertFalse(catalog.modified, "Catalog changed without new files")
+        missing_grid = MRMSGrid(datetime(2016, 5, 2, 22), datetime(2016, 5, 3, 1), "MESH", self.path)
+        missing_grid.load_data()
+        self.assertEqual(missing_grid.data.shape[0], 2, "Missing times were loaded")
+
+    def test_saved_catalog(self):
+        for catalog_path in [None, self.path + "MESH"]:
+            MRMSGrid.catalog_path = catalog_path
+            try:
+                MRMSGrid(datetime(2016, 5, 1, 20), datetime(2016, 5, 2, 3), "MESH", self.path).load_data()
+                # A new process starts without the catalogs loaded in this one
+                mrms_catalogs.clear()
+                with mock.patch("hagelslag.data.MRMSGrid.os.listdir", wraps=os.listdir) as listdir:
+                    mrms_grid = MRMSGrid(datetime(2016, 5, 1, 20), datetime(2016, 5, 2, 3), "MESH", self.path)
+                    mrms_grid.load_data()
+                    self.assertEqual(listdir.call_count, 0, "Unchanged directory was listed again")
+                self.assertEqual(mrms_grid.data.shape[0], 8, "Data not loaded from saved catalog")
+                mrms_catalogs.clear()
+            finally:
+                MRMSGrid.catalog_path = None
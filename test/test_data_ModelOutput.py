@@ -0,0 +1,198 @@
+import unittest
+import numpy as np
+import os
+import shutil
+import tempfile
+from glob import glob
+from datetime import datetime, timedelta
+from netCDF4 import Dataset
+from hagelslag.data.ModelGrid import FileHandlePool, ModelGrid
+from unittest import mock
+from hagelslag.data.ModelOutput import ModelOutput, load_model_outputs
+from hagelslag.util.derived_vars import relative_humidity_pressure_level, melting_layer_height
+from hagelslag.processing.STObject import STObject
+
+
+class TestModelOutput(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.run_date = datetime(2016, 5, 1, 0)
+        self.start_date = self.run_date + timedelta(hours=12)
+        self.end_date = self.run_date + timedelta(hours=15)
+        self.variables = ["REFL_1KM_AGL", "UP_HELI_MAX", "T_PL_850"]
+        self.pressure_levels = np.array([1000, 925, 850, 700, 600, 500, 400, 300, 250, 200, 150, 100])
+        rs = np.random.RandomState(4)
+        os.makedirs(os.path.join(self.path, self.run_date.strftime("%Y%m%d%H")))
+        for hour in range(12, 16):
+            valid_date = self.run_date + timedelta(hours=hour)
+            filename = os.path.join(self.path, self.run_date.strftime("%Y%m%d%H"),
+                                    "diags_d01_{0}.nc".format(valid_date.strftime("%Y-%m-%d_%H_%M_%S")))
+            with Dataset(filename, "w") as out_file:
+                out_file.createDimension("time", 1)
+                out_file.createDimension("num_press_levels_stag", self.pressure_levels.size)
+                out_file.createDimension("south_north", 20)
+                out_file.createDimension("west_east", 30)
+                for var in self.variables[:2]:
+                    var_obj = out_file.createVariable(var, "f4", ("time", "south_north", "west_east"))
+                    var_obj[:] = rs.normal(size=(1, 20, 30))
+                    var_obj.units = "units"
+                var_obj = out_file.createVariable("T_PL", "f4", ("time", "num_press_levels_stag", "south_north",
+                                                                 "west_east"))
+                var_obj[:] = rs.normal(size=(1, self.pressure_levels.size, 20, 30))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_load_model_outputs(self):
+        model_outputs = load_model_outputs("NCARSTORM", "mem1", self.run_date, self.variables, self.start_date,
+                                           self.end_date, self.path, None)
+        for variable in self.variables:
+            model_output = ModelOutput("NCARSTORM", "mem1", self.run_date, variable, self.start_date,
+                                       self.end_date, self.path, None)
+            model_output.load_data()
+            self.assertEqual(model_outputs[variable].data.shape, (4, 20, 30), "Data shape is wrong")
+            self.assertTrue(np.all(model_outputs[variable].data == model_output.data),
+                            "Data loaded together do not match data loaded individually")
+            self.assertEqual(model_outputs[variable].units, model_output.units, "Units do not match")
+            self.assertEqual(model_output.data.dtype, np.float32, "Data type is wrong")
+        double_outputs = load_model_outputs("NCARSTORM", "mem1", self.run_date, self.variables, self.start_date,
+                                            self.end_date, self.path, None, dtype=np.float64)
+        for variable in self.variables:
+            self.assertEqual(double_outputs[variable].data.dtype, np.float64, "Data type policy was not applied")
+
+    def test_derived_variables(self):
+        ssef_path = os.path.join(self.path, "ssef") + "/"
+        os.makedirs(os.path.join(ssef_path, "mem1", self.run_date.strftime("%Y%m%d")))
+        rs = np.random.RandomState(5)
+        input_values = {}
+        for var in ["hgtsfc", "hgt700", "hgt500", "tmp700", "tmp500", "sph700"]:
+            input_values[var] = rs.uniform(1, 10, size=(16, 20, 30)).astype(np.float32)
+            filename = os.path.join(ssef_path, "mem1", self.run_date.strftime("%Y%m%d"),
+                                    "ssef_mem1_{0}_{1}.nc".format(self.run_date.strftime("%Y%m%d"), var))
+            with Dataset(filename, "w") as out_file:
+                out_file.createDimension("time", 16)
+                out_file.createDimension("y", 20)
+                out_file.createDimension("x", 30)
+                out_file.createVariable(var, "f4", ("time", "y", "x"))[:] = input_values[var]
+        model_outputs = load_model_outputs("SSEF", "mem1", self.run_date, ["melth", "rh700", "tmp700"],
+                                           self.start_date, self.end_date, ssef_path, None, single_step=False)
+        self.assertEqual(sorted(model_outputs.keys()), ["melth", "rh700", "tmp700"], "Wrong variables returned")
+        hours = slice(12, 16)
+        melth = melting_layer_height(*[input_values[var][hours] for var in ["hgtsfc", "hgt700", "hgt500", "tmp700",
+                                                                             "tmp500"]])
+        rh = relative_humidity_pressure_level(input_values["tmp700"][hours], input_values["sph700"][hours], 70000.0)
+        self.assertTrue(np.allclose(model_outputs["melth"].data, melth), "Melting layer height is wrong")
+        self.assertTrue(np.allclose(model_outputs["rh700"].data, rh), "Relative humidity is wrong")
+        self.assertEqual(model_outputs["rh700"].units, "%", "Units are wrong")
+        model_output = ModelOutput("SSEF", "mem1", self.run_date, "melth", self.start_date, self.end_date,
+                                   ssef_path, None, single_step=False)
+        model_output.load_data()
+        self.assertTrue(np.all(model_output.data == model_outputs["melth"].data),
+                        "Derived variable loaded individually does not match")
+
+    def test_threaded_loading(self):
+        model_outputs = load_model_outputs("NCARSTORM", "mem1", self.run_date, self.variables, self.start_date,
+                                           self.end_date, self.path, None)
+        threaded_outputs = load_model_outputs("NCARSTORM", "mem1", self.run_date, self.variables, self.start_date,
+                                              self.end_date, self.path, None, read_threads=3)
+        for variable in self.variables:
+            self.assertEqual(threaded_outputs[variable].data.dtype, np.float32, "Data type is wrong")
+            self.assertTrue(np.all(model_outputs[variable].data == threaded_outputs[variable].data),
+                            "Data loaded with threads do not match data loaded serially")
+        with Dataset(glob(os.path.join(self.path, "*", "*.nc"))[0]) as file_obj:
+            self.assertAlmostEqual(ModelGrid.read_fraction(file_obj, ["REFL_1KM_AGL", "T_PL"]), 13 / 14.0,
+                                   msg="Read fraction is wrong")
+        with mock.patch.object(ModelGrid, "max_read_bytes", 1), \
+                mock.patch.object(ModelGrid, "read_step_files", autospec=True,
+                                  side_effect=ModelGrid.read_step_files) as read_step_files:
+            capped_outputs = load_model_outputs("NCARSTORM", "mem1", self.run_date, self.variables, self.start_date,
+                                                self.end_date, self.path, None, read_threads=3)
+            self.assertEqual(read_step_files.call_count, 1, "Whole files were not read with threads")
+            small_outputs = load_model_outputs("NCARSTORM", "mem1", self.run_date, self.variables[:1],
+                                               self.start_date, self.end_date, self.path, None, read_threads=3)
+            self.assertEqual(read_step_files.call_count, 1, "Whole files were read for a small share of the data")
+            with mock.patch.object(ModelGrid, "min_read_fraction", 0):
+                forced_outputs = load_model_outputs("NCARSTORM", "mem1", self.run_date, self.variables[:1],
+                                                    self.start_date, self.end_date, self.path, None, read_threads=3)
+            self.assertEqual(read_step_files.call_count, 2, "Whole files were not read with the fraction lowered")
+        for variable in self.variables:
+            self.assertTrue(np.all(model_outputs[variable].data == capped_outputs[variable].data),
+                            "Data loaded with a byte limit do not match data loaded serially")
+        self.assertTrue(np.all(model_outputs[self.variables[0]].data == small_outputs[self.variables[0]].data),
+                        "Data loaded serially with threads enabled do not match")
+        self.assertTrue(np.all(model_outputs[self.variables[0]].data == forced_outputs[self.variables[0]].data),
+                        "Data loaded with the fraction lowered do not match")
+
+    def test_chunked_loading(self):
+        model_output = ModelOutput("NCARSTORM", "mem1", self.run_date, "UP_HELI_MAX", self.start_date,
+                                   self.end_date, self.path, None)
+        model_output.load_data()
+        chunked_output = ModelOutput("NCARSTORM", "mem1", self.run_date, "UP_HELI_MAX", self.start_date,
+                                     self.end_date, self.path, None, chunk_hours=3)
+        chunked_output.load_data()
+        self.assertEqual(chunked_output.data.shape, model_output.data.shape, "Chunked shape is wrong")
+        for t in range(-1, model_output.data.shape[0]):
+            self.assertTrue(np.all(chunked_output.data[t] == model_output.data[t]), "Chunked values are wrong")
+            self.assertTrue(np.all(chunked_output.data[t, 4:9, [1, 3]] == model_output.data[t, 4:9, [1, 3]]),
+                            "Chunked spatial indexing is wrong")
+        self.assertTrue(np.all(chunked_output.data.max(axis=0) == model_output.data.max(axis=0)),
+                        "Chunked maximum is wrong")
+        self.assertLessEqual(len(chunked_output.data.chunks), 2, "Too many chunks in memory")
+        self.assertRaises(IndexError, chunked_output.data.__getitem__, 4)
+        hourly_output = ModelOutput("NCARSTORM", "mem1", self.run_date, "UP_HELI_MAX", self.start_date,
+                                    self.end_date, self.path, None, chunk_hours=1)
+        hourly_output.load_data()
+        with mock.patch.object(hourly_output.data, "load_chunk", wraps=hourly_output.data.load_chunk) as load_chunk:
+            for t in [1, 2]:
+                hourly_output.data[t]
+            self.assertEqual(hourly_output.data.shape, model_output.data.shape, "Chunked shape is wrong")
+            self.assertEqual(hourly_output.data.dtype, model_output.data.dtype, "Chunked data type is wrong")
+            self.assertEqual(load_chunk.call_count, 2, "Chunks were reloaded to find the shape")
+        self.assertEqual(list(hourly_output.data.chunks.keys()), [1, 2], "Chunks in use were removed")
+
+    def test_chunked_missing_files(self):
+        for hour in [14, 15]:
+            os.remove(glob(os.path.join(self.path, "*", "*{0:02d}_00_00.nc".format(hour)))[0])
+            model_output = ModelOutput("NCARSTORM", "mem1", self.run_date, "UP_HELI_MAX", self.start_date,
+                                       self.end_date, self.path, None)
+            model_output.load_data()
+            chunked_output = ModelOutput("NCARSTORM", "mem1", self.run_date, "UP_HELI_MAX", self.start_date,
+                                         self.end_date, self.path, None, chunk_hours=2)
+            chunked_output.load_data()
+            for t in range(model_output.data.shape[0]):
+                self.assertTrue(np.all(chunked_output.data[t] == model_output.data[t]),
+                                "Chunked values with missing files are wrong")
+            self.assertTrue(np.all(chunked_output.data[2] == 0), "Missing time step not filled with zeros")
+
+    def test_windowed_loading(self):
+        i_grid, j_grid = np.indices((20, 30))
+        box = (slice(4, 9), slice(10, 16))
+        storm = STObject([np.ones((5, 6))] * 2, [np.ones((5, 6), dtype=int)] * 2, [j_grid[box]] * 2,
+                         [i_grid[box]] * 2, [i_grid[box]] * 2, [j_grid[box]] * 2, 13, 14)
+        windows = {1: [(4, 9, 10, 16)], 2: [(4, 9, 10, 16), (0, 3, 0, 3)]}
+        full_outputs = load_model_outputs("NCARSTORM", "mem1", self.run_date, self.variables, self.start_date,
+                                          self.end_date, self.path, None)
+        window_outputs = load_model_outputs("NCARSTORM", "mem1", self.run_date, self.variables, self.start_date,
+                                            self.end_date, self.path, None, windows=windows)
+        for variable in self.variables:
+            storm.extract_attribute_grid(full_outputs[variable])
+            full_values = storm.attributes[variable]
+            storm.extract_attribute_grid(window_outputs[variable])
+            for t in range(len(full_values)):
+                self.assertTrue(np.all(full_values[t] == storm.attributes[variable][t]),
+                                "Windowed values do not match full grid values")
+        self.assertRaises(IndexError, window_outputs[self.variables[0]].data.__getitem__,
+                          (3, i_grid[box], j_grid[box]))
+
+    def test_file_handle_pool(self):
+        filenames = sorted(glob(os.path.join(self.path, self.run_date.strftime("%Y%m%d%H"), "*.nc")))
+        pool = FileHandlePool(filenames + [os.path.join(self.path, "missing.nc")], max_open=2)
+        for f, file_object in enumerate(pool):
+            if f < len(filenames):
+                self.assertEqual(file_object.filepath(), filenames[f], "Wrong file opened")
+            else:
+                self.assertIsNone(file_object, "Missing file should be None")
+            self.assertLessEqual(len(pool.open_files), 2, "Too many files open")
+        self.assertTrue(pool[0].isopen(), "File was not reopened")
+        pool.close()
+        self.assertEqual(len(pool.open_files), 0, "Files were not closed")
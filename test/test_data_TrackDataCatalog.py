@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+import pandas as pd
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import mock
+from hagelslag.data.TrackDataCatalog import TrackDataCatalog
+
+
+class TestTrackDataCatalog(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+        self.cache_path = tempfile.mkdtemp()
+        self.environ = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": self.cache_path})
+        self.environ.start()
+        self.members = ["wrf-s3cn_arw", "wrf-s3m3_arw"]
+        self.run_dates = pd.date_range("2016-05-01", "2016-05-03", freq="1D")
+        rs = np.random.RandomState(7)
+        for member in self.members:
+            for run_date in self.run_dates:
+                run_name = run_date.strftime("%Y%m%d-%H%M")
+                step_data = pd.DataFrame({"Step_ID": ["{0}_{1}_{2:d}".format(member, run_name, s) for s in range(5)],
+                                          "Ensemble_Member": member,
+                                          "uh_max": rs.normal(size=5),
+                                          "cape_mean": rs.normal(size=5)})
+                step_data.to_csv(self.path + "track_step_SSEF_{0}_{1}.csv".format(member, run_name), index=False)
+                step_data[["Step_ID"]].to_csv(self.path + "track_total_SSEF_{0}_{1}.csv".format(member, run_name),
+                                              index=False)
+        for file_name in ["track_step_obs_mem_20160501-0000.csv", "track_step_SSEF_mem_20160501.csv",
+                          "track_step_SSEF_mem_20160501-0000.json"]:
+            open(self.path + file_name, "w").close()
+
+    def tearDown(self):
+        self.environ.stop()
+        shutil.rmtree(self.path)
+        shutil.rmtree(self.cache_path)
+
+    def test_select(self):
+        catalog = TrackDataCatalog(self.path, "SSEF")
+        self.assertEqual(len(catalog.files), 12, "Wrong number of track files indexed")
+        self.assertEqual(catalog.files["track_step_SSEF_wrf-s3cn_arw_20160502-0000.csv"],
+                         {"table": "step", "member": "wrf-s3cn_arw", "run_date": "20160502-0000"},
+                         "File name parsed incorrectly")
+        self.assertEqual(len(catalog.select("step", start_date=datetime(2016, 5, 2))), 4, "Start date not applied")
+        self.assertEqual(len(catalog.select("total", end_date=datetime(2016, 5, 1), members=self.members[:1])), 1,
+                         "End date or member not applied")
+        self.assertEqual(len(catalog.select("step", run_dates=self.run_dates[[0, 2]])), 4, "Run dates not applied")
+
+    def test_load(self):
+        catalog = TrackDataCatalog(self.path, "SSEF")
+        step_files = catalog.select("step")
+        all_data = pd.concat([pd.read_csv(f) for f in step_files], ignore_index=True, sort=True)
+        loaded_data = catalog.load(step_files, columns=["Step_ID", "uh_max", "missing"], num_threads=3)
+        self.assertEqual(list(loaded_data.columns), ["Step_ID", "uh_max"], "Wrong columns loaded")
+        self.assertTrue(np.all(loaded_data["uh_max"] == all_data["uh_max"]), "Loaded values are wrong")
+        catalog.save()
+        saved_catalog = TrackDataCatalog(self.path, "SSEF")
+        self.assertFalse(saved_catalog.modified, "Saved catalog was not reused")
+        self.assertEqual(saved_catalog.columns(step_files[0]), ["Step_ID", "Ensemble_Member", "uh_max", "cape_mean"],
+                         "Columns not saved")
+
+    def test_saved_catalog(self):
+        data_files = sorted(os.listdir(self.path))
+        for catalog_file in [None, self.path + "catalog.json"]:
+            catalog = TrackDataCatalog(self.path, "SSEF", catalog_file=catalog_file)
+            catalog.columns(catalog.select("step")[0])
+            catalog.save()
+            if catalog_file is None:
+                self.assertEqual(sorted(os.listdir(self.path)), data_files, "Catalog was saved in the data directory")
+                self.assertEqual(len(os.listdir(os.path.join(self.cache_path, "hagelslag", "track_catalogs"))), 1,
+                                 "Catalog was not saved in the cache directory")
+            with mock.patch("hagelslag.data.TrackDataCatalog.os.listdir", wraps=os.listdir) as listdir:
+                saved_catalog = TrackDataCatalog(self.path, "SSEF", catalog_file=catalog_file)
+                self.assertEqual(listdir.call_count, 0, "Unchanged directory was listed again")
+            self.assertEqual(saved_catalog.files, catalog.files, "Files not loaded from saved catalog")
@@ -0,0 +1,148 @@
+import unittest
+import numpy as np
+from multiprocessing import Pool
+from skimage.measure import regionprops
+from hagelslag.processing.STObject import STObject
+from hagelslag.processing.ObjectMatcher import ObjectMatcher, TrackStepMatcher, TrackMatcher, centroid_distance, \
+    time_distance, ellipse_distance, area_difference, closest_distance, mean_minimum_centroid_distance, \
+    mean_min_time_distance, start_centroid_distance, start_time_distance, duration_distance, mean_area_distance
+
+
+def make_storm_tracks(num_tracks, seed, num_times=6, shape=(60, 60), dx=3000):
+    """
+    Create STObject tracks from Gaussian storm cells moving across a uniform grid.
+    """
+    rs = np.random.RandomState(seed)
+    i_grid, j_grid = np.indices(shape)
+    tracks = []
+    for n in range(num_tracks):
+        start_time = rs.randint(0, num_times - 1)
+        duration = rs.randint(1, num_times - start_time + 1)
+        center_i, center_j = rs.uniform(10, shape[0] - 10, size=2)
+        grids, masks, xs, ys, i_s, j_s = [], [], [], [], [], []
+        for t in range(duration):
+            radius = rs.uniform(2, 4)
+            grid = 60 * np.exp(-((i_grid - center_i - t) ** 2 + (j_grid - center_j - 2 * t) ** 2) / (2 * radius ** 2))
+            rows, cols = np.where(grid > 10)
+            box = (slice(rows.min(), rows.max() + 1), slice(cols.min(), cols.max() + 1))
+            grids.append(grid[box])
+            masks.append(np.where(grid[box] > 10, 1, 0))
+            xs.append(j_grid[box] * dx)
+            ys.append(i_grid[box] * dx)
+            i_s.append(i_grid[box])
+            j_s.append(j_grid[box])
+        tracks.append(STObject(grids, masks, xs, ys, i_s, j_s, start_time, start_time + duration - 1, dx=dx))
+    return tracks
+
+
+class TestObjectMatcher(unittest.TestCase):
+    def setUp(self):
+        self.objects_a = [track for track in make_storm_tracks(30, 5) if 2 in track.times]
+        self.objects_b = [track for track in make_storm_tracks(30, 6) if 3 in track.times]
+
+    def test_ellipse_model(self):
+        storm = self.objects_a[0]
+        props = regionprops(storm.masks[0])[0]
+        center_x, center_y, semi_major, semi_minor, theta = storm.get_ellipse_model(storm.times[0]).params
+        self.assertAlmostEqual(semi_major, props.major_axis_length / 2 * storm.dx, msg="Major axis is wrong")
+        self.assertAlmostEqual(semi_minor, props.minor_axis_length / 2 * storm.dx, msg="Minor axis is wrong")
+        self.assertAlmostEqual(np.cos(2 * theta), np.cos(2 * (np.pi / 2 - props.orientation)),
+                               msg="Orientation is wrong")
+        self.assertEqual(ellipse_distance(storm, storm.times[0], storm, storm.times[0], 10000), 0,
+                         "Identical ellipses should have zero distance")
+
+    def test_cost_matrix(self):
+        matcher = ObjectMatcher([centroid_distance, ellipse_distance, area_difference], np.array([0.4, 0.4, 0.2]),
+                                np.array([40000, 40000, 100]))
+        costs = matcher.cost_matrix(self.objects_a, self.objects_b, 2, 3)
+        for a, item_a in enumerate(self.objects_a):
+            for b, item_b in enumerate(self.objects_b):
+                self.assertAlmostEqual(costs[a, b], matcher.total_cost_function(item_a, item_b, 2, 3),
+                                       msg="Vectorized cost does not match pairwise cost")
+
+    def test_batch_match_objects(self):
+        matcher = ObjectMatcher([centroid_distance, closest_distance], np.array([0.5, 0.5]), np.array([40000, 20000]))
+        sets_a = [self.objects_a[:10], [], self.objects_a[10:]]
+        sets_b = [self.objects_b[:12], self.objects_b[12:], self.objects_b[12:]]
+        all_assignments = matcher.batch_match_objects(sets_a, sets_b, 2, 3, max_elements=200)
+        for set_a, set_b, assignments in zip(sets_a, sets_b, all_assignments):
+            self.assertEqual(assignments, matcher.match_objects(set_a, set_b, 2, 3),
+                             "Batched assignments do not match individual assignments")
+
+
+class TestTrackStepMatcher(unittest.TestCase):
+    def setUp(self):
+        self.tracks_a = make_storm_tracks(15, 1)
+        self.tracks_b = make_storm_tracks(12, 2)
+
+    def test_cost_matrix(self):
+        components = [centroid_distance, time_distance, closest_distance]
+        matcher = TrackStepMatcher(components, np.array([40000, 2, 20000]))
+        costs = matcher.cost_matrix(self.tracks_a, self.tracks_b)
+        a_i = 0
+        for track_a in self.tracks_a:
+            for time_a in track_a.times:
+                b_i = 0
+                for track_b in self.tracks_b:
+                    for time_b in track_b.times:
+                        self.assertTrue(np.allclose(costs[a_i, b_i], matcher.cost(track_a, time_a, track_b, time_b)),
+                                        "Vectorized cost does not match pairwise cost")
+                        b_i += 1
+                a_i += 1
+
+    def test_match(self):
+        matcher = TrackStepMatcher([centroid_distance, time_distance], np.array([40000, 1]))
+        pairings = matcher.match(self.tracks_a, self.tracks_b)
+        costs = matcher.cost_matrix(self.tracks_a, self.tracks_b)
+        valid = np.all(costs < 1, axis=2)
+        self.assertEqual(pairings.shape[0], costs.shape[0], "Pairings do not cover every step")
+        self.assertTrue(np.all(pairings["Matched"].values == valid.any(axis=1)), "Matched flags are wrong")
+        step_info = np.array([(t, s) for t, track in enumerate(self.tracks_b) for s in range(track.times.size)])
+        for s in np.where(valid.any(axis=1))[0]:
+            self.assertTrue(np.array_equal(pairings.loc[s, "Pairings"], step_info[valid[s]]),
+                            "Pairings do not match valid costs")
+
+
+class TestTrackMatcher(unittest.TestCase):
+    def setUp(self):
+        self.tracks_a = make_storm_tracks(15, 3)
+        self.tracks_b = make_storm_tracks(12, 4)
+
+    def test_track_cost_matrix(self):
+        components = [mean_minimum_centroid_distance, mean_min_time_distance, start_centroid_distance,
+                      start_time_distance, duration_distance, mean_area_distance]
+        matcher = TrackMatcher(components, np.ones(len(components)) / len(components),
+                               np.array([40000, 2, 40000, 2, 3, 200]))
+        costs = matcher.track_cost_matrix(self.tracks_a, self.tracks_b)
+        for a, track_a in enumerate(self.tracks_a):
+            for b, track_b in enumerate(self.tracks_b):
+                self.assertAlmostEqual(costs[a, b], matcher.track_cost_function(track_a, track_b),
+                                       msg="Vectorized track cost does not match pairwise cost")
+
+    def test_neighbor_matches(self):
+        matcher = TrackMatcher([mean_minimum_centroid_distance, start_time_distance], np.array([0.5, 0.5]),
+                               np.array([60000, 2]))
+        costs = matcher.track_cost_matrix(self.tracks_a, self.tracks_b)
+        neighbors = matcher.neighbor_matches(self.tracks_a, self.tracks_b)
+        self.assertEqual([n[0] for n in neighbors], list(np.where(np.any(costs < 1, axis=1))[0]),
+                         "Tracks with neighbors are wrong")
+        for i, track_neighbors in neighbors:
+            self.assertEqual(sorted(track_neighbors), list(np.where(costs[i] < 1)[0]), "Neighbors are wrong")
+            self.assertTrue(np.all(np.diff(costs[i, list(track_neighbors)]) >= 0), "Neighbors are not sorted")
+        pool = Pool(1)
+        daemon_neighbors = pool.apply(matcher.neighbor_matches, (self.tracks_a, self.tracks_b, 2))
+        pool.close()
+        pool.join()
+        self.assertEqual(daemon_neighbors, neighbors, "Neighbors differ in a daemonic worker")
+
+    def test_match_tracks(self):
+        matcher = TrackMatcher([start_centroid_distance, start_time_distance], np.array([0.5, 0.5]),
+                               np.array([60000, 3]))
+        costs = matcher.track_cost_matrix(self.tracks_a, self.tracks_b)
+        assignments = matcher.match_tracks(self.tracks_a, self.tracks_b)
+        self.assertGreater(len(assignments), 0, "No tracks matched")
+        self.assertEqual(len(set([a[1] for a in assignments])), len(assignments), "Matches are not unique")
+        self.assertTrue(all([costs[a[0], a[1]] < 1 for a in assignments]), "Match cost above maximum")
+        closest = matcher.match_tracks(self.tracks_a, self.tracks_b, closest_matches=True)
+        for a, b in closest:
+            self.assertEqual(costs[a, b], costs[a][costs.min(axis=0) < 1].min(), "Match is not the closest")
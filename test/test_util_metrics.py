@@ -0,0 +1,54 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from hagelslag.util.metrics import StageMetrics, MetricsCollector, read_metrics
+from hagelslag.util.task_scheduler import TaskScheduler
+
+
+def sleep_task(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.metrics_file = os.path.join(self.path, "metrics.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_stages(self):
+        metrics = StageMetrics("member_20160501-0000", {"ensemble_member": "member"})
+        for i in range(2):
+            with metrics.stage("segmentation"):
+                time.sleep(0.01)
+            metrics.count("model_objects", 3)
+        with metrics.stage("output"):
+            with open(self.metrics_file, "w") as out_file:
+                out_file.write("x" * 100)
+        self.assertEqual(list(metrics.timers.keys()), ["segmentation", "output"], "Wrong stages")
+        self.assertGreaterEqual(metrics.timers["segmentation"], 0.02, "Stage times not added")
+        self.assertEqual(metrics.counters["model_objects"], 6, "Counter not added")
+        self.assertGreater(metrics.peak_memory_mb, 0, "Memory not sampled")
+        os.remove(self.metrics_file)
+        metrics.save(self.metrics_file)
+        metrics.save(self.metrics_file)
+        table = read_metrics(self.metrics_file)
+        self.assertEqual(table.shape[0], 2, "Wrong number of records")
+        self.assertEqual(table.loc[0, "ensemble_member"], "member", "Labels not saved")
+        self.assertEqual(table.loc[0, "count_model_objects"], 6, "Counters not saved")
+        self.assertTrue("time_output" in table.columns, "Timers not saved")
+
+    def test_scheduler(self):
+        collector = MetricsCollector(self.metrics_file)
+        scheduler = TaskScheduler(2, metrics=collector)
+        scheduler.add_task("a", sleep_task, (0.05,))
+        scheduler.add_task("b", sleep_task, (0.0,), depends_on=["a"])
+        scheduler.run()
+        self.assertEqual([record["name"] for record in collector.records], ["a", "b"], "Tasks not recorded")
+        self.assertGreaterEqual(collector.records[0]["total_time"], 0.05, "Task time not recorded")
+        table = read_metrics(self.metrics_file)
+        self.assertEqual(list(table["status"]), ["done", "done"], "Task status not saved")
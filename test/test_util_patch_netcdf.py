@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+import os
+import shutil
+import tempfile
+from netCDF4 import Dataset
+from hagelslag.util.patch_netcdf import patch_chunk_sizes, create_patch_variable, patch_batches
+
+
+class TestPatchNetCDF(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_chunk_sizes(self):
+        self.assertEqual(patch_chunk_sizes([1000, 64, 64]), [16, 64, 64], "Wrong automatic chunk size")
+        self.assertEqual(patch_chunk_sizes([10, 64, 64]), [10, 64, 64], "Chunk larger than dimension")
+        self.assertEqual(patch_chunk_sizes([1000, 32, 32], chunk_patches=4), [4, 32, 32], "Chunk size not used")
+        self.assertEqual(patch_chunk_sizes([0, 32, 32]), [1, 32, 32], "Empty dimension not handled")
+
+    def test_batches(self):
+        self.assertEqual(patch_batches([3, 1, 4, 2, 2], 4), [(0, 2, 0, 4), (2, 3, 4, 8), (3, 5, 8, 12)],
+                         "Wrong batches")
+        self.assertEqual(patch_batches([], 4), [], "Batches found without items")
+
+    def test_write(self):
+        values = np.random.RandomState(3).normal(size=(50, 8, 8)).astype(np.float32)
+        filename = os.path.join(self.path, "patches.nc")
+        with Dataset(filename, "w") as out_file:
+            for dimension, size in zip(["p", "row", "col"], values.shape):
+                out_file.createDimension(dimension, size)
+            patch_var = create_patch_variable(out_file, "uh_curr", "f4", ("p", "row", "col"), complevel=2,
+                                              chunk_patches=8)
+            for _, _, start, end in patch_batches([1] * values.shape[0], 16):
+                patch_var[start:end] = values[start:end]
+        with Dataset(filename) as in_file:
+            self.assertEqual(in_file.variables["uh_curr"].chunking(), [8, 8, 8], "Chunks not set")
+            self.assertEqual(in_file.variables["uh_curr"].filters()["complevel"], 2, "Compression not set")
+            self.assertTrue(np.all(in_file.variables["uh_curr"][:] == values), "Values written incorrectly")
@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+import os
+import shutil
+import tempfile
+from multiprocessing import Pool
+from netCDF4 import Dataset
+from hagelslag.util.shared_grids import SharedGridRegistry, grid_registry, attach_shared_grids, publish_netcdf_grid, \
+    shared_netcdf_grid
+
+
+def shared_grid_sum(name):
+    return grid_registry.get(name).sum()
+
+
+class TestSharedGrids(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.grid = np.arange(12, dtype=np.float32).reshape(3, 4)
+
+    def tearDown(self):
+        grid_registry.close()
+        shutil.rmtree(self.path)
+
+    def test_publish(self):
+        registry = SharedGridRegistry()
+        view = registry.publish("grid", self.grid)
+        self.assertTrue("grid" in registry, "Grid not published")
+        self.assertTrue(np.all(view == self.grid), "Shared values are wrong")
+        self.assertFalse(view.flags.writeable, "Shared grid is writeable")
+        self.assertIsNone(registry.get("missing"), "Missing grid found")
+        other = SharedGridRegistry()
+        other.set_descriptors(registry.descriptors)
+        self.assertTrue(np.all(other.get("grid") == self.grid), "Grid not found from descriptors")
+        other.close()
+        registry.close()
+        self.assertFalse("grid" in registry, "Grid not removed when closed")
+
+    def test_workers(self):
+        grid_registry.publish("grid", self.grid)
+        pool = Pool(2, initializer=attach_shared_grids, initargs=(grid_registry.descriptors,))
+        sums = pool.map(shared_grid_sum, ["grid"] * 4)
+        pool.close()
+        pool.join()
+        self.assertEqual(sums, [self.grid.sum()] * 4, "Workers read wrong values")
+
+    def test_netcdf(self):
+        filename = os.path.join(self.path, "mask.nc")
+        with Dataset(filename, "w") as out_file:
+            out_file.createDimension("y", 3)
+            out_file.createDimension("x", 4)
+            out_file.createVariable("usa_mask", "i4", ("y", "x"))[:] = self.grid.astype(np.int32)
+        loaded = shared_netcdf_grid(filename, "usa_mask", np.float32)
+        self.assertTrue(loaded.flags.writeable, "Unpublished grid not loaded from file")
+        publish_netcdf_grid(filename, "usa_mask", np.float32)
+        shared = shared_netcdf_grid(filename, "usa_mask", "float32")
+        self.assertFalse(shared.flags.writeable, "Published grid not used")
+        self.assertEqual(shared.dtype, np.float32, "Wrong data type")
+        self.assertTrue(np.all(shared == loaded), "Shared values are wrong")
@@ -0,0 +1,37 @@
+import unittest
+import numpy as np
+from hagelslag.util.synthetic_storms import SyntheticStormGenerator
+from hagelslag.processing.tracker import label_storm_objects, extract_storm_objects
+
+
+class TestSyntheticStorms(unittest.TestCase):
+    def setUp(self):
+        self.generator = SyntheticStormGenerator(num_storms=8, grid_shape=(80, 100), dx=3000.0, num_times=6,
+                                                 seed=4)
+
+    def test_fields(self):
+        data = self.generator.fields()
+        self.assertEqual(data.shape, (6, 80, 100), "Wrong field shape")
+        self.assertEqual(data.dtype, np.float32, "Wrong data type")
+        self.assertTrue(np.all(data >= 0), "Negative intensities")
+        self.assertLessEqual(data.max(), self.generator.intensity_range[1], "Intensity above the maximum")
+        self.assertTrue(np.all(data == SyntheticStormGenerator(num_storms=8, grid_shape=(80, 100), dx=3000.0,
+                                                               num_times=6, seed=4).fields()),
+                        "Fields differ with the same seed")
+        perturbed = self.generator.fields(position_error=6000.0, intensity_error=0.2, seed=1)
+        self.assertFalse(np.all(perturbed == data), "Errors not added")
+        x_grid, y_grid = self.generator.coordinates()
+        self.assertEqual(x_grid.shape, data.shape[1:], "Wrong coordinate shape")
+        self.assertEqual(x_grid[0, 1] - x_grid[0, 0], self.generator.dx, "Wrong grid spacing")
+
+    def test_objects(self):
+        data = self.generator.fields()
+        labels = label_storm_objects(data, "hyst", 10, 20, min_area=4)
+        x_grid, y_grid = self.generator.coordinates()
+        objects = extract_storm_objects(labels, data, x_grid, y_grid, np.arange(data.shape[0]), dx=self.generator.dx)
+        active = [(self.generator.storms["start_time"] <= t) &
+                  (self.generator.storms["start_time"] + self.generator.storms["lifetime"] > t)
+                  for t in range(data.shape[0])]
+        self.assertGreater(sum([len(o) for o in objects]), 0, "No storms found")
+        for t in range(data.shape[0]):
+            self.assertLessEqual(len(objects[t]), active[t].sum(), "More objects than storms")
@@ -0,0 +1,88 @@
+import unittest
+import os
+import shutil
+import tempfile
+from hagelslag.util.task_scheduler import TaskScheduler, TaskManifest
+
+
+def write_value(filename, value):
+    with open(filename, "w") as out_file:
+        out_file.write(str(value))
+    return value
+
+
+def add_file_values(in_files, out_file):
+    total = 0
+    for in_file in in_files:
+        with open(in_file) as in_obj:
+            total += int(in_obj.read())
+    return write_value(out_file, total)
+
+
+def fail():
+    raise ValueError("Task failed on purpose")
+
+
+class TestTaskScheduler(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def make_scheduler(self, num_procs, manifest=None):
+        scheduler = TaskScheduler(num_procs, manifest=manifest)
+        self.results = []
+        files = [os.path.join(self.path, "{0}_{1:d}.txt".format(name, num_procs)) for name in ["a", "b", "c"]]
+        # Added downstream first so that the order comes from the declared files
+        scheduler.add_task("sum", add_file_values, (files[:2], files[2]), inputs=files[:2], outputs=files[2:],
+                           callback=self.results.append)
+        for f, name in enumerate(["a", "b"]):
+            scheduler.add_task(name, write_value, (files[f], f + 2), outputs=[files[f]])
+        scheduler.add_task("fail", fail)
+        scheduler.add_task("after_fail", write_value, (files[0], 10), depends_on=["fail"])
+        scheduler.add_task("missing", add_file_values, ([], files[0]), inputs=[os.path.join(self.path, "x.txt")])
+        return scheduler
+
+    def test_run(self):
+        expected = {"sum": "done", "a": "done", "b": "done", "fail": "failed", "after_fail": "skipped",
+                    "missing": "skipped"}
+        for num_procs in [1, 2]:
+            status = self.make_scheduler(num_procs).run()
+            self.assertEqual(dict(status), expected, "Task status is wrong")
+            self.assertEqual(self.results, [5], "Downstream task did not receive inputs")
+
+    def test_dependencies(self):
+        scheduler = self.make_scheduler(1)
+        dependencies = scheduler.dependencies()
+        self.assertEqual(dependencies["sum"], {"a", "b"}, "File dependencies not found")
+        self.assertEqual(dependencies["after_fail"], {"fail"}, "Named dependency not found")
+        self.assertRaises(ValueError, scheduler.add_task, "a", fail)
+        scheduler.add_task("unknown", fail, depends_on=["z"])
+        self.assertRaises(ValueError, scheduler.dependencies)
+
+    def test_resume(self):
+        manifest_file = os.path.join(self.path, "manifest.json")
+        self.make_scheduler(2, TaskManifest(manifest_file)).run()
+        status = self.make_scheduler(2, TaskManifest(manifest_file)).run()
+        self.assertEqual([status[name] for name in ["sum", "a", "b", "fail"]],
+                         ["complete", "complete", "complete", "failed"], "Completed tasks were not skipped")
+        self.assertEqual(self.results, [], "Completed task ran again")
+        write_value(os.path.join(self.path, "a_2.txt"), 12)
+        status = self.make_scheduler(2, TaskManifest(manifest_file)).run()
+        self.assertEqual([status[name] for name in ["sum", "a", "b"]], ["done", "done", "complete"],
+                         "Changed files did not invalidate tasks")
+        self.assertEqual(self.results, [5], "Downstream task did not run again")
+
+    def test_resume_args(self):
+        manifest_file = os.path.join(self.path, "manifest.json")
+        out_file = os.path.join(self.path, "out.txt")
+        log_file = os.path.join(self.path, "log.txt")
+        for value, expected in [(2, "done"), (2, "complete"), (3, "done")]:
+            scheduler = TaskScheduler(1, manifest=TaskManifest(manifest_file))
+            scheduler.add_task("write", write_value, (out_file, {"value": value, "values": [value] * 2}),
+                               outputs=[out_file])
+            scheduler.add_task("log", write_value, (log_file, 1))
+            status = scheduler.run()
+            self.assertEqual(status["write"], expected, "Changed arguments did not invalidate the task")
+            self.assertEqual(status["log"], "done", "Task without outputs was treated as complete")
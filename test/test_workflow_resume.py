@@ -0,0 +1,193 @@
+import unittest
+import os
+import shutil
+import tempfile
+import pandas as pd
+import pytest
+from datetime import datetime
+from importlib.machinery import SourceFileLoader
+from importlib.util import spec_from_loader, module_from_spec
+from hagelslag.data.TrackDataCatalog import TrackDataCatalog
+from hagelslag.processing.TrackModeler import read_track_table
+from hagelslag.util.task_scheduler import TaskScheduler, TaskManifest
+
+bin_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin")
+
+
+def load_script(name):
+    loader = SourceFileLoader(name + "_script", os.path.join(bin_path, name))
+    script = module_from_spec(spec_from_loader(loader.name, loader))
+    loader.exec_module(script)
+    return script
+
+
+class WorkflowConfig(object):
+    def __init__(self, **options):
+        for option, value in options.items():
+            setattr(self, option, value)
+
+
+class TestHsdataResume(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+        self.hsdata = load_script("hsdata")
+        self.config = WorkflowConfig(dates=[datetime(2016, 5, 1)], ensemble_members=["wrf-s3cn_arw"],
+                                     ensemble_name="NCAR", run_date_format="%Y%m%d-%H%M", csv_path=self.path,
+                                     nc_path=self.path, table_format="csv")
+        self.runs = []
+        self.hsdata.process_observed_tracks = self.write_obs_tables
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write_obs_tables(self, run_date, member, config):
+        # Same names as the tables written by process_observed_tracks
+        self.runs.append(member)
+        for table_name in ["track_total", "track_step"]:
+            pd.DataFrame({"Track_ID": [1]}).to_csv(self.path + "{0}_obs_{1}_{2}.csv".format(
+                table_name, member, run_date.strftime("%Y%m%d")), index=False)
+
+    def run_tasks(self):
+        scheduler = TaskScheduler(1, manifest=TaskManifest(self.path + "manifest.json"))
+        self.hsdata.add_run_tasks(scheduler, self.config, "obs_tracks")
+        return scheduler.run()
+
+    def test_obs_resume(self):
+        task_name = "obs_tracks_wrf-s3cn_arw_20160501-0000"
+        self.assertEqual(self.run_tasks()[task_name], "done", "Task did not run")
+        self.assertEqual(self.run_tasks()[task_name], "complete", "Completed task ran again")
+        os.remove(self.path + "track_step_obs_wrf-s3cn_arw_20160501.csv")
+        self.assertEqual(self.run_tasks()[task_name], "done", "Deleted table did not invalidate the task")
+        self.assertEqual(len(self.runs), 2, "Wrong number of task runs")
+
+    def test_parquet_tables(self):
+        pytest.importorskip("pyarrow")
+        self.config.table_format = "parquet"
+        # Unmatched forecast tracks have no observed track
+        table = pd.DataFrame({"Track_ID": ["NCAR_wrf-s3cn_arw_{0:d}".format(t) for t in range(4)],
+                              "Obs_Track_ID": [None, "obs_0", None, "obs_1"],
+                              "uh_max": [12.123456, 30.5, 55.25, 71.0]})
+        table_file = self.hsdata.write_track_table(table, "track_total", "NCAR", "wrf-s3cn_arw", "20160501-0000",
+                                                   self.config)
+        self.assertTrue(table_file.endswith(".parquet"), "Table not written as parquet")
+        self.assertTrue(read_track_table(table_file).equals(table), "Table changed in the round trip")
+        columns = read_track_table(table_file, columns=["Obs_Track_ID", "uh_max"])
+        self.assertEqual(list(columns.columns), ["Obs_Track_ID", "uh_max"], "Wrong columns read")
+        self.assertEqual(columns["Obs_Track_ID"].tolist(), table["Obs_Track_ID"].tolist(),
+                         "Missing observed track IDs not kept")
+        catalog = TrackDataCatalog(self.path, "NCAR", data_format="parquet", catalog_file=self.path + "catalog.json")
+        catalog_table = catalog.load(catalog.select("total"), columns=["Track_ID", "Obs_Track_ID", "missing"])
+        self.assertTrue(catalog_table.equals(table[["Obs_Track_ID", "Track_ID"]]), "Catalog read the wrong columns")
+
+
+class TestHsevalResume(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+        self.hseval = load_script("hseval")
+        self.config = WorkflowConfig(start_date="2016-05-01", end_date="2016-05-02", ensemble_name="NCAR",
+                                     ensemble_members=["wrf-s3cn_arw", "wrf-s3m3_arw"], window_sizes=[1],
+                                     start_hour=12, end_hour=36, model_names=["Random Forest"],
+                                     forecast_sample_path=self.path + "samples/", mrms_path=self.path + "mrms/",
+                                     mrms_variable="MESH", obs_mask=False, mask_variable="RadarQuality",
+                                     out_path=self.path + "scores/", grid_scores_file="grid_scores.csv")
+        for run_date in ["20160501", "20160502"]:
+            os.makedirs(self.config.forecast_sample_path + run_date)
+            for member in self.config.ensemble_members:
+                self.write_file(self.config.forecast_sample_path + run_date +
+                                "/Random-Forest_hailprobs_{0}_{1}.nc".format(member, run_date))
+        os.makedirs(self.config.mrms_path + "MESH")
+        for day in ["20160501", "20160502", "20160503"]:
+            self.write_file(self.config.mrms_path + "MESH/MESH_{0}-000000_conus.nc".format(day))
+        os.makedirs(self.config.out_path)
+        self.runs = []
+        self.hseval.evaluate_grid_run = self.grid_scores
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @staticmethod
+    def write_file(filename, text="x"):
+        with open(filename, "w") as out_file:
+            out_file.write(text)
+
+    def grid_scores(self, run_date, member, window_size, config, score_columns):
+        self.runs.append((run_date, member))
+        index = "{0}_{1}".format(run_date.strftime("%Y%m%d"), member)
+        return pd.DataFrame({"Run_Date": [run_date], "Ensemble_Member": [member]}, index=[index])
+
+    def run_tasks(self):
+        scheduler = TaskScheduler(1, manifest=TaskManifest(self.path + "manifest.json"))
+        score_parts = self.hseval.evaluate_grids(self.config, scheduler)
+        status = scheduler.run()
+        for score_file, part_files in score_parts.items():
+            self.hseval.combine_score_files(part_files, score_file)
+        return status
+
+    def test_grid_resume(self):
+        score_file = self.config.out_path + self.config.grid_scores_file
+        self.assertTrue(all([s == "done" for s in self.run_tasks().values()]), "Tasks did not run")
+        scores = pd.read_csv(score_file, index_col="Index")
+        self.assertEqual(scores.shape[0], 4, "Wrong number of score rows")
+        self.assertTrue(all([s == "complete" for s in self.run_tasks().values()]), "Completed tasks ran again")
+        self.assertEqual(len(self.runs), 4, "Completed tasks ran again")
+        self.assertTrue(pd.read_csv(score_file, index_col="Index").equals(scores), "Scores changed on resume")
+        os.remove(self.hseval.score_part_file(score_file, "grid_wrf-s3cn_arw_20160501_1"))
+        self.write_file(self.config.forecast_sample_path + "20160502/Random-Forest_hailprobs_wrf-s3m3_arw_20160502.nc",
+                        "changed")
+        status = self.run_tasks()
+        self.assertEqual(sorted([name for name, s in status.items() if s == "done"]),
+                         ["grid_wrf-s3cn_arw_20160501_1", "grid_wrf-s3m3_arw_20160502_1"],
+                         "Deleted scores and changed forecasts did not invalidate tasks")
+        resumed_scores = pd.read_csv(score_file, index_col="Index")
+        self.assertEqual(sorted(resumed_scores.index), sorted(scores.index), "Scores duplicated or lost on resume")
+
+
+class TestHsforecastResume(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+        self.hsforecast = load_script("hsforecast")
+        self.config = WorkflowConfig(ensemble_name="NCAR", ensemble_members=["wrf-s3cn_arw"],
+                                     start_dates={"forecast": "2016-05-01"}, end_dates={"forecast": "2016-05-01"},
+                                     start_hour=12, end_hour=14, size_distribution_model_names=["Random Forest"],
+                                     size_dis_training_path=self.path, watershed_variable="hail",
+                                     forecast_csv_path=self.path, grib_path=self.path, run_date_format="%Y%m%d-%H%M",
+                                     single_step=True, neighbor_condition_model="Random Forest",
+                                     netcdf_path=self.path, model_map_file=None)
+        self.write_file(self.path + "hail_forecasts_NCAR_wrf-s3cn_arw_20160501-0000.csv")
+        self.write_file(self.path + "NCAR_hail_Size_Distribution.csv")
+        os.makedirs(self.path + "20160501")
+        self.runs = []
+        self.hsforecast.generate_ml_member_grid = self.write_grib_files
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @staticmethod
+    def write_file(filename):
+        with open(filename, "w") as out_file:
+            out_file.write("x")
+
+    def write_grib_files(self, ensemble_name, model_names, member, run_date, variable, start_date, end_date, *args):
+        # Same names as the files written by EnsembleMemberProduct.write_grib2_files
+        self.runs.append(member)
+        for hour in range(self.config.start_hour, self.config.end_hour + 1):
+            self.write_file(self.path + "20160501/NCAR_{0}_Random-Forest_hail_2016050100f{1:02d}.grib2".format(
+                member, hour))
+
+    def run_tasks(self):
+        scheduler = TaskScheduler(1, manifest=TaskManifest(self.path + "manifest.json"))
+        self.hsforecast.generate_ml_grids(self.config, scheduler)
+        return scheduler.run()
+
+    def test_grid_resume(self):
+        task_name = "grid_wrf-s3cn_arw_20160501"
+        self.assertEqual(self.run_tasks()[task_name], "done", "Task did not run")
+        self.assertEqual(self.run_tasks()[task_name], "complete", "Completed task ran again")
+        os.remove(self.path + "20160501/NCAR_wrf-s3cn_arw_Random-Forest_hail_2016050100f13.grib2")
+        self.assertEqual(self.run_tasks()[task_name], "done", "Deleted grib file did not invalidate the task")
+        with open(self.path + "NCAR_hail_Size_Distribution.csv", "a") as size_file:
+            size_file.write("x")
+        self.assertEqual(self.run_tasks()[task_name], "done", "Changed size distribution did not invalidate the task")
+        self.config.neighbor_condition_model = "Gradient Boosting"
+        self.assertEqual(self.run_tasks()[task_name], "done", "Changed config did not invalidate the task")
+        self.assertEqual(len(self.runs), 4, "Wrong number of task runs")